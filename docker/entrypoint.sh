@@ -44,6 +44,6 @@ fi
 
 cd /app
 
-echo "Starting application..."
+echo "Starting application with ${APP_WORKERS:-1} worker(s)..."
 export POSTGRES_PASSWORD="$ENCODED_PASSWORD"
-exec uvicorn main:app --host 0.0.0.0 --port 8000
+exec gunicorn -c gunicorn_conf.py main:app
@@ -0,0 +1,67 @@
+"""
+Chunking throughput: LegalTextChunker vs langchain's RecursiveCharacterTextSplitter.
+
+    python benchmarks/chunker_benchmark.py --size-mb 20 --chunk-size 500 --overlap-size 50
+
+Run from src/ so the app packages are importable.
+"""
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+import argparse
+import random
+import time
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.chunker import LegalTextChunker
+from stores.llm.LLMTokenizer import get_tokenizer
+from load_generator import make_document
+
+def make_pages(size_mb: float, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    pages, total = [], 0
+    while total < size_mb * 1024 * 1024:
+        page = make_document(rng, articles=5)
+        pages.append(page)
+        total += len(page.encode("utf-8"))
+    return pages
+
+def run(name: str, splitter, pages: list, repeat: int):
+    size_mb = sum(len(page.encode("utf-8")) for page in pages) / (1024 * 1024)
+    metadatas = [ { "page": idx } for idx in range(len(pages)) ]
+
+    best = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        chunks = splitter.create_documents(pages, metadatas=metadatas)
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+
+    print(f"{name:<24} {size_mb / best:8.2f} MB/s  {len(chunks):8d} chunks  {best:7.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare chunker throughput")
+    parser.add_argument("--size-mb", type=float, default=10)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--model-id", default=None, help="tokenizer used for the token-sized run")
+    args = parser.parse_args()
+
+    pages = make_pages(size_mb=args.size_mb)
+
+    run("langchain recursive", RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size, chunk_overlap=args.overlap_size, length_function=len,
+    ), pages, args.repeat)
+
+    run("legal (chars)", LegalTextChunker(
+        chunk_size=args.chunk_size, overlap_size=args.overlap_size,
+    ), pages, args.repeat)
+
+    # a token is ~4 chars, keep the chunks comparable
+    run("legal (tokens)", LegalTextChunker(
+        chunk_size=args.chunk_size // 4, overlap_size=args.overlap_size // 4,
+        tokenizer=get_tokenizer(args.model_id),
+    ), pages, args.repeat)
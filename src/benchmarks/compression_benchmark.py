@@ -0,0 +1,100 @@
+"""
+Chunk text compression: ratio without / with a trained dictionary, (de)compression
+cost per chunk, and how that cost compares to the I/O it saves.
+
+    python benchmarks/compression_benchmark.py --chunks 20000 --chunk-size 500
+    python benchmarks/compression_benchmark.py --corpus-dir /data/laws --read-mb-s 200
+
+Decompression pays off when chunks are read from storage rather than from the
+buffer cache, and by fitting more chunks in the cache (pages/1k chunks).
+
+Run from src/ so the app packages are importable. Chunks are made with the legal
+chunker from the .txt files of --corpus-dir, or from generated documents.
+"""
+
+import argparse
+import random
+import time
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.chunker import LegalTextChunker, TextChunk
+from helpers.compression import TextCompressor
+from load_generator import make_document
+
+def load_pages(corpus_dir: str, seed: int = 0):
+    if not corpus_dir:
+        rng = random.Random(seed)
+        while True:
+            yield TextChunk(page_content=make_document(rng), metadata={})
+
+    for file_name in sorted(os.listdir(corpus_dir)):
+        if file_name.endswith(".txt"):
+            with open(os.path.join(corpus_dir, file_name), encoding="utf-8") as f:
+                yield TextChunk(page_content=f.read(), metadata={})
+
+def make_chunks(args) -> list:
+    chunker = LegalTextChunker(chunk_size=args.chunk_size, overlap_size=args.overlap_size)
+    chunks = []
+    for chunk in chunker.chunk_documents(load_pages(args.corpus_dir, seed=args.seed)):
+        chunks.append(chunk.page_content)
+        if len(chunks) >= args.chunks:
+            break
+    return chunks
+
+# Postgres heap page
+PAGE_SIZE = 8192
+
+def run(name: str, compressor: TextCompressor, chunks: list, read_mb_s: float, page_read_us: float):
+    raw_size = sum(len(chunk.encode("utf-8")) for chunk in chunks)
+
+    started_at = time.perf_counter()
+    frames = [ compressor.compress(chunk) for chunk in chunks ]
+    compress_us = (time.perf_counter() - started_at) / len(chunks) * 1e6
+
+    started_at = time.perf_counter()
+    for frame in frames:
+        compressor.decompress(frame)
+    decompress_us = (time.perf_counter() - started_at) / len(chunks) * 1e6
+
+    compressed_size = sum(len(frame) for frame in frames)
+    saved_bytes = (raw_size - compressed_size) / len(chunks)
+    # time to read the bytes saved per chunk, sequentially and as random page reads
+    seq_saved_us = saved_bytes / (read_mb_s * 1024 * 1024) * 1e6
+    random_saved_us = saved_bytes / PAGE_SIZE * page_read_us
+
+    print(
+        f"{name:<16} ratio {raw_size / compressed_size:5.2f}  "
+        f"{raw_size / len(chunks):7.0f} -> {compressed_size / len(chunks):6.0f} B/chunk  "
+        f"compress {compress_us:6.1f} us  decompress {decompress_us:5.1f} us  "
+        f"read saved {seq_saved_us:5.1f} us seq / {random_saved_us:5.1f} us random  "
+        f"{compressed_size / PAGE_SIZE * 1000 / len(chunks):5.1f} pages/1k chunks"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure chunk text compression")
+    parser.add_argument("--corpus-dir", default=None, help="directory of .txt files, generated text otherwise")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap-size", type=int, default=50)
+    parser.add_argument("--train-fraction", type=float, default=0.2, help="chunks held out to train the dictionary")
+    parser.add_argument("--dictionary-size", type=int, default=112640)
+    parser.add_argument("--level", type=int, default=9)
+    parser.add_argument("--read-mb-s", type=float, default=200, help="storage read throughput for cold reads")
+    parser.add_argument("--page-read-us", type=float, default=100, help="latency of an uncached 8KB page read")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    chunks = make_chunks(args)
+    random.Random(args.seed).shuffle(chunks)
+    split = int(len(chunks) * args.train_fraction)
+    train_chunks, test_chunks = chunks[:split], chunks[split:]
+    print(f"{len(test_chunks)} chunks, dictionary trained on {len(train_chunks)}")
+
+    run("zstd", TextCompressor(level=args.level), test_chunks, args.read_mb_s, args.page_read_us)
+
+    compressor = TextCompressor(level=args.level)
+    compressor.train(samples=train_chunks, dictionary_size=args.dictionary_size)
+    run("zstd + dict", compressor, test_chunks, args.read_mb_s, args.page_read_us)
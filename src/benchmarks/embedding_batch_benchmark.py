@@ -0,0 +1,65 @@
+"""
+Query embedding at high concurrency, with and without the EmbeddingBatcher.
+
+    python benchmarks/embedding_batch_benchmark.py --threads 64 --queries 5000 --latency-ms 50
+
+Uses the fake provider, run from src/ so the app packages are importable.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import time
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stores.llm.providers.FakeProvider import FakeProvider
+from stores.llm.EmbeddingBatcher import EmbeddingBatcher
+from stores.llm.LLMEnums import DocumentTypeEnum
+from load_generator import percentile
+
+class CountingProvider(FakeProvider):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    def embed_text(self, texts, document_type: str = None):
+        self.calls += 1
+        return super().embed_text(texts=texts, document_type=document_type)
+
+def run(name: str, client, provider: CountingProvider, threads: int, queries: int):
+    provider.calls = 0
+
+    def embed(idx: int):
+        started_at = time.perf_counter()
+        client.embed_text(texts=[f"query {idx}"], document_type=DocumentTypeEnum.QUERY.value)
+        return time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(embed, range(queries)))
+    elapsed = time.perf_counter() - started_at
+
+    print(f"{name:<12} {queries / elapsed:8.1f} q/s  {provider.calls:6d} provider calls  "
+          f"p50 {percentile(latencies, 50) * 1000:6.1f}ms  p99 {percentile(latencies, 99) * 1000:6.1f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare query embedding with and without micro-batching")
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    provider = CountingProvider(embedding_latency_ms=args.latency_ms, latency_jitter=0)
+    provider.set_embedding_model(model_id="fake", embedding_size=384)
+
+    run("direct", provider, provider, args.threads, args.queries)
+
+    batcher = EmbeddingBatcher(embedding_client=provider, max_batch_size=args.max_batch_size,
+                               max_wait_ms=args.max_wait_ms)
+    run("batched", batcher, provider, args.threads, args.queries)
+    batcher.close()
@@ -0,0 +1,50 @@
+"""
+Import-time profile of the app: which modules `import main` spends its time in.
+
+    python benchmarks/import_profile.py --top 25
+
+Run from src/. Wraps `python -X importtime`, times are cumulative (a module
+includes everything it imports) and only the first import of a module counts.
+"""
+
+import subprocess
+import argparse
+import sys
+import os
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def profile_imports(module: str) -> list:
+    """(cumulative us, self us, depth, module) of every module imported"""
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        records.append((int(cumulative_us), int(self_us), depth, name.strip()))
+
+    return records
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the import time of the app")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--max-depth", type=int, default=3, help="only modules imported this close to the root")
+    args = parser.parse_args()
+
+    records = profile_imports(args.module)
+    total_us = max(cumulative_us for cumulative_us, _, _, _ in records)
+    print(f"import {args.module}: {total_us / 1000:.0f} ms, {len(records)} modules")
+
+    records = [ record for record in records if record[2] <= args.max_depth ]
+    for cumulative_us, self_us, depth, name in sorted(records, reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:9.1f} ms  {self_us / 1000:7.1f} ms self  {'  ' * depth}{name}")
@@ -0,0 +1,193 @@
+"""
+Open-loop load generator for the upload -> process -> index push -> search -> answer pipeline.
+
+Runs fully offline when the server uses the fake providers and Qdrant local mode, e.g.
+
+    GENERATION_BACKEND=FAKE EMBEDDING_BACKEND=FAKE EMBEDDING_MODEL_ID=fake EMBEDDING_MODEL_SIZE=384 \
+    GENERATION_MODEL_ID=fake VECTOR_DB_BACKEND=QDRANT VECTOR_DB_PATH=qdrant_db \
+    uvicorn main:app --port 5000
+
+    python benchmarks/load_generator.py --base-url http://localhost:5000 --project-id 900 \
+        --stages upload,process,push,search,answer --rps 20 --duration 30
+
+Stages run one after another (process needs uploads, search needs an index).
+Requests are sent on a fixed schedule regardless of how fast the server answers,
+and latency is measured from the scheduled send time, so a slow server cannot
+hide its queueing delay (coordinated omission).
+"""
+
+from collections import Counter
+import argparse
+import asyncio
+import random
+import time
+import json
+import httpx
+
+WORDS = [
+    "contract", "party", "obligation", "termination", "liability", "confidentiality",
+    "payment", "notice", "agreement", "law", "court", "article", "clause", "breach",
+    "العقد", "الطرف", "الالتزام", "إنهاء", "المسؤولية", "السرية", "الدفع", "إخطار",
+    "القانون", "المحكمة", "مادة", "بند", "الإخلال", "التعويض", "الشركة", "العامل",
+]
+
+def make_document(rng: random.Random, articles: int = 40) -> str:
+    lines = []
+    for idx in range(1, articles + 1):
+        lines.append(f"مادة ({idx})")
+        for _ in range(rng.randint(2, 5)):
+            lines.append(" ".join(rng.choices(WORDS, k=rng.randint(8, 25))) + ".")
+        lines.append("")
+    return "\n".join(lines)
+
+def make_query(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(3, 8))) + "?"
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, int(len(values) * pct / 100))
+    return values[idx]
+
+
+class StageResult:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = []
+        self.status_codes = Counter()
+        self.started_at = None
+        self.finished_at = None
+
+    def record(self, latency: float, status_code):
+        self.latencies.append(latency)
+        self.status_codes[status_code] += 1
+
+    def report(self) -> dict:
+        elapsed = max(self.finished_at - self.started_at, 1e-9)
+        ok = sum(count for code, count in self.status_codes.items() if code == 200)
+        return {
+            "stage": self.name,
+            "requests": len(self.latencies),
+            "ok": ok,
+            "errors": len(self.latencies) - ok,
+            "status_codes": { str(code): count for code, count in self.status_codes.items() },
+            "throughput_rps": round(len(self.latencies) / elapsed, 2),
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 1),
+            "p90_ms": round(percentile(self.latencies, 90) * 1000, 1),
+            "p95_ms": round(percentile(self.latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 1),
+            "max_ms": round(max(self.latencies, default=0) * 1000, 1),
+        }
+
+
+class LoadGenerator:
+
+    def __init__(self, client: httpx.AsyncClient, project_id: int, seed: int = 0,
+                       chunk_size: int = 500, overlap_size: int = 50):
+        self.client = client
+        self.project_id = project_id
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.overlap_size = overlap_size
+        self.file_ids = []
+
+    async def upload(self):
+        content = make_document(self.rng).encode("utf-8")
+        response = await self.client.post(
+            f"/api/v1/data/upload/{self.project_id}",
+            files={ "file": (f"load_{self.rng.getrandbits(32)}.txt", content, "text/plain") },
+        )
+        if response.status_code == 200:
+            self.file_ids.append(response.json()["file_id"])
+        return response
+
+    async def process(self):
+        payload = { "chunk_size": self.chunk_size, "overlap_size": self.overlap_size }
+        if self.file_ids:
+            payload["file_id"] = self.rng.choice(self.file_ids)
+        return await self.client.post(f"/api/v1/data/process/{self.project_id}", json=payload)
+
+    async def push(self):
+        return await self.client.post(f"/api/v1/nlp/index/push/{self.project_id}", json={ "do_reset": 0 })
+
+    async def search(self):
+        return await self.client.post(
+            f"/api/v1/nlp/index/search/{self.project_id}",
+            json={ "text": make_query(self.rng), "limit": 5 },
+        )
+
+    async def answer(self):
+        return await self.client.post(
+            f"/api/v1/nlp/index/answer/{self.project_id}",
+            json={ "text": make_query(self.rng), "limit": 5 },
+        )
+
+    async def send(self, name: str, scheduled_at: float, result: StageResult, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                response = await getattr(self, name)()
+                status_code = response.status_code
+            except httpx.HTTPError as e:
+                status_code = type(e).__name__
+        result.record(latency=time.perf_counter() - scheduled_at, status_code=status_code)
+
+    async def run_stage(self, name: str, rps: float, duration: float, max_in_flight: int) -> StageResult:
+        result = StageResult(name=name)
+        semaphore = asyncio.Semaphore(max_in_flight)
+        tasks = []
+
+        result.started_at = time.perf_counter()
+        total = max(1, int(rps * duration))
+        for idx in range(total):
+            scheduled_at = result.started_at + idx / rps
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.send(name, scheduled_at, result, semaphore)))
+
+        await asyncio.gather(*tasks)
+        result.finished_at = time.perf_counter()
+        return result
+
+
+async def main(args):
+    stages = [ stage.strip() for stage in args.stages.split(",") if stage.strip() ]
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout,
+                                 limits=httpx.Limits(max_connections=args.max_in_flight)) as client:
+        generator = LoadGenerator(client=client, project_id=args.project_id, seed=args.seed,
+                                  chunk_size=args.chunk_size, overlap_size=args.overlap_size)
+
+        reports = []
+        for stage in stages:
+            # index building stages are heavy, drive them at their own rate
+            rps = args.setup_rps if stage in ("process", "push") else args.rps
+            result = await generator.run_stage(name=stage, rps=rps, duration=args.duration,
+                                               max_in_flight=args.max_in_flight)
+            report = result.report()
+            reports.append(report)
+            print(json.dumps(report, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the RAG API at a target request rate")
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--project-id", type=int, default=900)
+    parser.add_argument("--stages", default="upload,process,push,search,answer")
+    parser.add_argument("--rps", type=float, default=10, help="target requests/sec for upload, search and answer")
+    parser.add_argument("--setup-rps", type=float, default=1, help="target requests/sec for process and push")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per stage")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap-size", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write the stage reports as JSON")
+
+    asyncio.run(main(parser.parse_args()))
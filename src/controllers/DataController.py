@@ -2,9 +2,19 @@ from .BaseController import BaseController
 from .ProjectController import ProjectController
 from fastapi import UploadFile
 from models import ResponseSignal
+import mimetypes
+import tarfile
+import zipfile
+import hashlib
 import re
 import os
 
+ZIP_SUFFIXES = (".zip",)
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+TAR_CONTENT_TYPES = ("application/x-tar", "application/gzip", "application/x-gzip",
+                     "application/x-bzip2", "application/x-xz")
+
 class DataController(BaseController):
     
     def __init__(self):
@@ -54,4 +64,105 @@ class DataController(BaseController):
 
         return cleaned_file_name
 
+    def get_archive_type(self, file: UploadFile):
+        """"zip", "tar" or None for a plain document"""
+
+        file_name = (file.filename or "").lower()
+        if file_name.endswith(ZIP_SUFFIXES) or file.content_type in ZIP_CONTENT_TYPES:
+            return "zip"
+        if file_name.endswith(TAR_SUFFIXES) or file.content_type in TAR_CONTENT_TYPES:
+            return "tar"
+        return None
+
+    def get_entry_file_name(self, entry_name: str):
+        """Base name of an archive entry, None for entries that aren't documents"""
+
+        entry_name = entry_name.replace("\\", "/")
+        file_name = os.path.basename(entry_name)
+
+        # macOS resource forks and folder metadata
+        if not file_name or file_name.startswith("._") or entry_name.startswith("__MACOSX/"):
+            return None
+
+        return file_name
+
+    def validate_entry(self, file_name: str, file_size: int):
+
+        content_type, _ = mimetypes.guess_type(file_name)
+        if content_type not in self.app_settings.FILE_ALLOWED_TYPES:
+            return False, ResponseSignal.FILE_TYPE_NOT_SUPPORTED.value
+
+        if file_size > self.app_settings.FILE_MAX_SIZE * self.size_scale:
+            return False, ResponseSignal.FILE_SIZE_EXCEEDED.value
+
+        return True, ResponseSignal.FILE_VALIDATED_SUCCESS.value
+
+    def read_entry(self, file_name: str, file_size: int, fileobj):
+        """(file name, content, sha256, signal), content is None when the entry is rejected"""
+
+        is_valid, signal = self.validate_entry(file_name=file_name, file_size=file_size)
+        if not is_valid:
+            return file_name, None, None, signal
+
+        # archive headers can lie about sizes, never read past the limit
+        max_size = self.app_settings.FILE_MAX_SIZE * self.size_scale
+        content = fileobj.read(max_size + 1)
+        if len(content) > max_size:
+            return file_name, None, None, ResponseSignal.FILE_SIZE_EXCEEDED.value
+
+        return file_name, content, hashlib.sha256(content).hexdigest(), signal
+
+    def iter_zip_entries(self, file: UploadFile):
+
+        # the upload is spooled to a seekable temporary file, entries are read one by one
+        with zipfile.ZipFile(file.file) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+
+                file_name = self.get_entry_file_name(info.filename)
+                if file_name is None:
+                    continue
+
+                with archive.open(info) as fileobj:
+                    yield self.read_entry(file_name=file_name, file_size=info.file_size, fileobj=fileobj)
+
+    def iter_tar_entries(self, file: UploadFile):
+
+        # stream mode over the spooled upload, each member is read before moving to the next one
+        with tarfile.open(fileobj=file.file, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+
+                file_name = self.get_entry_file_name(member.name)
+                if file_name is None:
+                    continue
+
+                yield self.read_entry(file_name=file_name, file_size=member.size,
+                                      fileobj=archive.extractfile(member))
+
+    def iter_upload_entries(self, file: UploadFile):
+        """
+        Yields (file name, content, sha256, signal) of the documents of an upload,
+        the entries of ZIP / TAR archives or the uploaded file itself. Blocking,
+        step through it off the event loop.
+        """
+
+        archive_type = self.get_archive_type(file=file)
+
+        if archive_type is None:
+            is_valid, signal = self.validate_uploaded_file(file=file)
+            if not is_valid:
+                yield file.filename, None, None, signal
+                return
+            yield self.read_entry(file_name=file.filename, file_size=file.size, fileobj=file.file)
+            return
+
+        entries = self.iter_zip_entries(file=file) if archive_type == "zip" else self.iter_tar_entries(file=file)
+        try:
+            yield from entries
+        except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError):
+            yield file.filename, None, None, ResponseSignal.ARCHIVE_INVALID.value
+
 
@@ -2,19 +2,45 @@ import time
 from .BaseController import BaseController
 from models.db_schemes import Project, DataChunk
 from stores.llm.LLMEnums import DocumentTypeEnum
+from stores.llm.LLMTokenizer import get_tokenizer
+from stores.llm.ContextPacker import ContextPacker
+from stores.llm.ContextCompressor import ContextCompressor
+from helpers.cache import LRUCache
+from helpers import metrics
+from helpers.concurrency import submit, run_on_event_loop
+from helpers.tracing import traced
 from typing import List
+import logging
+import math
 import json
+import uuid
+import re
 
 class NLPController(BaseController):
 
+    # shared by all requests, see get_context_compressor
+    sentence_vectors_cache = None
+
     def __init__(self, vectordb_client, generation_client, 
-                 embedding_client, template_parser):
+                 embedding_client, template_parser,
+                 generation_hedger=None, chunk_hydrator=None):
         super().__init__()
 
         self.vectordb_client = vectordb_client
         self.generation_client = generation_client
         self.embedding_client = embedding_client
         self.template_parser = template_parser
+        self.generation_hedger = generation_hedger
+        # fills in texts of lean vector payloads, see VECTOR_DB_LEAN_PAYLOAD
+        self.chunk_hydrator = chunk_hydrator
+
+        # tokens of retrieved context sent with the last answer prompt
+        self.context_tokens = 0
+
+        # query vectors of this request, reused by the compression stage
+        self.query_vectors = {}
+
+        self.logger = logging.getLogger(__name__)
 
     def create_collection_name(self, project_id: str):
         return f"collection_{project_id}".strip()
@@ -23,6 +49,25 @@ class NLPController(BaseController):
         collection_name = self.create_collection_name(project_id=project.project_id)
         return self.vectordb_client.delete_collection(collection_name=collection_name)
     
+    def is_vector_db_collection_existed(self, project: Project) -> bool:
+        collection_name = self.create_collection_name(project_id=project.project_id)
+        return self.vectordb_client.is_collection_existed(collection_name=collection_name)
+
+    def delete_vector_db_assets(self, project: Project, asset_ids: List[int]):
+        collection_name = self.create_collection_name(project_id=project.project_id)
+        return self.vectordb_client.delete_by_asset_ids(collection_name=collection_name, asset_ids=asset_ids)
+
+    def get_chunks_point_ids(self, chunks: List[DataChunk], tags: List[str] = None) -> list:
+        """
+        Stable point ids, so pushing a chunk again replaces its point. A chunk can be
+        pushed to the main collection under several tag sets, one point for each.
+        """
+        if tags is None:
+            return [ str(c.chunk_uuid) for c in chunks ]
+
+        tags_key = "|".join(sorted(tags))
+        return [ str(uuid.uuid5(c.chunk_uuid, tags_key)) for c in chunks ]
+
     def get_vector_db_collection_info(self, project: Project):
         collection_name = self.create_collection_name(project_id=project.project_id)
         collection_info = self.vectordb_client.get_collection_info(collection_name=collection_name)
@@ -31,12 +76,21 @@ class NLPController(BaseController):
             json.dumps(collection_info, default=lambda x: x.__dict__)
         )
     
+    def get_chunks_payloads(self, chunks: List[DataChunk]) -> list:
+        """Fields stored with each vector so neighbouring hits can be stitched back together"""
+        return [
+            { "chunk_id": c.chunk_id, "asset_id": c.chunk_asset_id, "chunk_order": c.chunk_order }
+            for c in chunks
+        ]
+
     def index_into_vector_db(self, project: Project, chunks: List[DataChunk],
-                                   chunks_ids: List[int], 
+                                   chunks_ids: list = None,
                                    do_reset: bool = False):
         
         # step1: get collection name
         collection_name = self.create_collection_name(project_id=project.project_id)
+        if chunks_ids is None:
+            chunks_ids = self.get_chunks_point_ids(chunks)
 
         # step2: manage items
         texts = [ c.chunk_text for c in chunks ]
@@ -62,18 +116,48 @@ class NLPController(BaseController):
             metadata=metadata,
             vectors=vectors,
             record_ids=chunks_ids,
+            extra_payloads=self.get_chunks_payloads(chunks),
         )
 
         return True
 
-    def search_vector_db_collection(self, project: Project, text: str, limit: int = 10):
+    def fit_vector_db_compact_projection(self, project: Project, method: str, sample_size: int = 20000):
+        collection_name = self.create_collection_name(project_id=project.project_id)
+        return self.vectordb_client.fit_compact_projection(collection_name=collection_name,
+                                                           method=method, sample_size=sample_size)
+
+    def evaluate_vector_db_search(self, project: Project, num_queries: int = 100, limit: int = 10):
+        collection_name = self.create_collection_name(project_id=project.project_id)
+        return self.vectordb_client.evaluate_search(collection_name=collection_name,
+                                                    num_queries=num_queries, limit=limit)
+
+    def hydrate_documents(self, documents: list) -> list:
+        if self.chunk_hydrator is None:
+            return documents
+        return self.chunk_hydrator.hydrate(documents=documents) or False
+
+    def embed_query(self, text: str):
+        if text in self.query_vectors:
+            return self.query_vectors[text]
+
+        vectors = self.embedding_client.embed_text(texts=[text], 
+                                                  document_type=DocumentTypeEnum.QUERY.value)
+        if not vectors:
+            return None
+
+        self.query_vectors[text] = vectors[0]
+        return vectors[0]
+
+    @traced("retrieve")
+    def search_vector_db_collection(self, project: Project, text: str, limit: int = 10,
+                                    vector: list = None):
 
         # step1: get collection name
         collection_name = self.create_collection_name(project_id=project.project_id)
 
         # step2: get text embedding vector
-        vector = self.embedding_client.embed_text(texts=[text], 
-                                                 document_type=DocumentTypeEnum.QUERY.value)[0]
+        if vector is None:
+            vector = self.embed_query(text=text)
 
         if not vector or len(vector) == 0:
             return False
@@ -88,8 +172,150 @@ class NLPController(BaseController):
         if not results:
             return False
 
-        return results
+        return self.hydrate_documents(results)
     
+    def stitch_texts(self, text: str, next_text: str, max_overlap: int = 2000,
+                     min_overlap: int = 10) -> str:
+        """Joins two consecutive chunks, dropping the overlap the splitter repeated"""
+
+        max_overlap = min(len(text), len(next_text), max_overlap)
+        for size in range(max_overlap, min_overlap - 1, -1):
+            if text.endswith(next_text[:size]):
+                return text + next_text[size:]
+
+        return text + "\n" + next_text
+
+    def merge_adjacent_documents(self, documents: list) -> list:
+        """
+        Coalesces hits from the same asset with consecutive chunk_order into one
+        passage scored by its best hit. Hits without asset info are kept as they are.
+        """
+
+        merged_documents = []
+        asset_documents = {}
+        for doc in documents:
+            if doc.asset_id is None or doc.chunk_order is None:
+                merged_documents.append(doc)
+                continue
+            asset_documents.setdefault(doc.asset_id, []).append(doc)
+
+        for docs in asset_documents.values():
+            docs = sorted(docs, key=lambda doc: doc.chunk_order)
+
+            passage = docs[0].model_copy()
+            last_order = passage.chunk_order
+            for doc in docs[1:]:
+                if doc.chunk_order == last_order:
+                    # same chunk indexed twice
+                    passage.score = max(passage.score, doc.score)
+                    continue
+
+                if doc.chunk_order == last_order + 1:
+                    passage.text = self.stitch_texts(passage.text, doc.text)
+                    passage.score = max(passage.score, doc.score)
+                else:
+                    merged_documents.append(passage)
+                    passage = doc.model_copy()
+
+                last_order = doc.chunk_order
+
+            merged_documents.append(passage)
+
+        return sorted(merged_documents, key=lambda doc: doc.score, reverse=True)
+
+    def get_context_compressor(self) -> ContextCompressor:
+        if NLPController.sentence_vectors_cache is None:
+            NLPController.sentence_vectors_cache = LRUCache(
+                max_size=self.app_settings.RAG_COMPRESSION_CACHE_SIZE,
+                name="sentence_vectors",
+            )
+
+        return ContextCompressor(
+            embedding_client=self.embedding_client,
+            vectors_cache=NLPController.sentence_vectors_cache,
+            max_sentences=self.app_settings.RAG_COMPRESSION_MAX_SENTENCES,
+            min_similarity=self.app_settings.RAG_COMPRESSION_MIN_SIMILARITY,
+        )
+
+    @traced("compress")
+    def compress_documents(self, query: str, documents: list) -> list:
+        """Extractive compression: keeps the sentences closest to the query"""
+
+        query_vector = self.embed_query(text=query)
+        if not query_vector:
+            return documents
+
+        try:
+            return self.get_context_compressor().compress(
+                documents=documents,
+                query_vector=query_vector,
+            )
+        except Exception as e:
+            self.logger.error(f"Error while compressing retrieved documents: {e}")
+            return documents
+
+    @traced("prompt_build")
+    def build_documents_prompt(self, documents: list, query: str = None) -> str:
+        """Renders retrieved documents, packed into RAG_CONTEXT_TOKEN_BUDGET tokens when set"""
+
+        if self.app_settings.RAG_MERGE_ADJACENT_CHUNKS:
+            documents = self.merge_adjacent_documents(documents)
+
+        if self.app_settings.RAG_COMPRESSION_ENABLED and query:
+            documents = self.compress_documents(query=query, documents=documents)
+
+        token_budget = self.app_settings.RAG_CONTEXT_TOKEN_BUDGET
+        if not token_budget:
+            return "\n".join([
+                self.template_parser.get("rag", "document_prompt", {
+                        "doc_num": idx + 1,
+                        "chunk_text": self.generation_client.process_text(doc.text),
+                })
+                for idx, doc in enumerate(documents)
+            ])
+
+        tokenizer = get_tokenizer(self.generation_client.generation_model_id)
+        context_packer = ContextPacker(
+            tokenizer=tokenizer,
+            token_budget=token_budget,
+            min_document_tokens=self.app_settings.RAG_CONTEXT_MIN_DOCUMENT_TOKENS,
+        )
+
+        overhead_tokens = tokenizer.count(
+            self.template_parser.get("rag", "document_prompt", {
+                "doc_num": len(documents),
+                "chunk_text": "",
+            })
+        ) + 1
+
+        packed_documents, self.context_tokens = context_packer.pack(
+            documents=documents,
+            overhead_tokens=overhead_tokens,
+        )
+        metrics.rag_context_tokens.observe(self.context_tokens)
+
+        return "\n".join([
+            self.template_parser.get("rag", "document_prompt", {
+                    "doc_num": idx + 1,
+                    "chunk_text": text,
+            })
+            for idx, (_, text) in enumerate(packed_documents)
+        ])
+
+    def generate_answer(self, prompt: str, chat_history: list):
+        """Final answer generation, hedged when a GenerationHedger is configured"""
+
+        if self.generation_hedger:
+            return self.generation_hedger.generate_text(
+                prompt=prompt,
+                chat_history=chat_history
+            )
+
+        return self.generation_client.generate_text(
+            prompt=prompt,
+            chat_history=chat_history
+        )
+
     def answer_rag_question(self, project: Project, query: str, limit: int = 10):
         
         answer, full_prompt, chat_history = None, None, None
@@ -107,13 +333,7 @@ class NLPController(BaseController):
         # step2: Construct LLM prompt
         system_prompt = self.template_parser.get("rag", "system_prompt")
 
-        documents_prompts = "\n".join([
-            self.template_parser.get("rag", "document_prompt", {
-                    "doc_num": idx + 1,
-                    "chunk_text": self.generation_client.process_text(doc.text),
-            })
-            for idx, doc in enumerate(retrieved_documents)
-        ])
+        documents_prompts = self.build_documents_prompt(retrieved_documents, query=query)
 
         footer_prompt = self.template_parser.get("rag", "footer_prompt", {
             "query": query
@@ -130,7 +350,7 @@ class NLPController(BaseController):
         full_prompt = "\n\n".join([ documents_prompts,  footer_prompt])
 
         # step4: Retrieve the Answer
-        answer = self.generation_client.generate_text(
+        answer = self.generate_answer(
             prompt=full_prompt,
             chat_history=chat_history
         )
@@ -142,10 +362,13 @@ class NLPController(BaseController):
     MAIN_COLLECTION_NAME = "main_collection"
 
     def index_into_vector_db_with_tags(self, chunks: List[DataChunk],
-                                        chunks_ids: List[int],
                                         tags: List[str],
+                                        chunks_ids: list = None,
                                         do_reset: bool = False):
         """Index chunks into single collection with tags in metadata"""
+
+        if chunks_ids is None:
+            chunks_ids = self.get_chunks_point_ids(chunks, tags=tags)
         
         # step1: create collection if not exists
         _ = self.vectordb_client.create_collection(
@@ -178,18 +401,28 @@ class NLPController(BaseController):
             metadata=metadata,
             vectors=vectors,
             record_ids=chunks_ids,
+            extra_payloads=self.get_chunks_payloads(chunks),
         )
 
         return True
 
-    def search_vector_db_with_tags(self, text: str, tags: List[str] = None, limit: int = 10):
+    def get_vector_db_assets_tags(self, asset_ids: List[int]) -> list:
+        """Tag sets the given assets were pushed to the main collection with"""
+        return self.vectordb_client.get_tags_by_asset_ids(collection_name=self.MAIN_COLLECTION_NAME,
+                                                          asset_ids=asset_ids)
+
+    def delete_vector_db_tagged_assets(self, asset_ids: List[int]):
+        return self.vectordb_client.delete_by_asset_ids(collection_name=self.MAIN_COLLECTION_NAME,
+                                                        asset_ids=asset_ids)
+
+    @traced("retrieve")
+    def search_vector_db_with_tags(self, text: str, tags: List[str] = None, limit: int = 10,
+                                   vector: list = None):
         """Search in single collection with optional tags filter"""
         
         # step1: get text embedding vector
-        vector = self.embedding_client.embed_text(
-            texts=[text],
-            document_type=DocumentTypeEnum.QUERY.value
-        )[0]
+        if vector is None:
+            vector = self.embed_query(text=text)
 
         if not vector or len(vector) == 0:
             return False
@@ -205,7 +438,7 @@ class NLPController(BaseController):
         if not results:
             return False
 
-        return results
+        return self.hydrate_documents(results)
 
     def answer_rag_question_with_tags(self, query: str, tags: List[str] = None, limit: int = 10):
         """RAG answer using single collection with optional tags filter"""
@@ -225,13 +458,7 @@ class NLPController(BaseController):
         # step2: Construct LLM prompt
         system_prompt = self.template_parser.get("rag", "system_prompt")
 
-        documents_prompts = "\n".join([
-            self.template_parser.get("rag", "document_prompt", {
-                    "doc_num": idx + 1,
-                    "chunk_text": self.generation_client.process_text(doc.text),
-            })
-            for idx, doc in enumerate(retrieved_documents)
-        ])
+        documents_prompts = self.build_documents_prompt(retrieved_documents, query=query)
 
         footer_prompt = self.template_parser.get("rag", "footer_prompt", {
             "query": query
@@ -248,7 +475,7 @@ class NLPController(BaseController):
         full_prompt = "\n\n".join([documents_prompts, footer_prompt])
 
         # step4: Retrieve the Answer
-        answer = self.generation_client.generate_text(
+        answer = self.generate_answer(
             prompt=full_prompt,
             chat_history=chat_history
         )
@@ -274,6 +501,7 @@ class NLPController(BaseController):
         
         return "\n".join(formatted)
 
+    @traced("rewrite")
     def rewrite_query_with_context(self, query: str, chat_history: list,
                                     session_entities: list = None) -> str:
         """Rewrites the query to include context from chat history"""
@@ -316,6 +544,78 @@ class NLPController(BaseController):
 
         return rewritten_query.strip()
 
+    def is_similar_query(self, query: str, other_query: str) -> bool:
+        """Token-set Jaccard similarity between two queries"""
+
+        query_tokens = set(re.findall(r"\w+", query.lower()))
+        other_tokens = set(re.findall(r"\w+", other_query.lower()))
+        if not query_tokens or not other_tokens:
+            return query.strip() == other_query.strip()
+
+        similarity = len(query_tokens & other_tokens) / len(query_tokens | other_tokens)
+        return similarity >= self.app_settings.SPECULATIVE_RETRIEVAL_TEXT_SIMILARITY
+
+    def get_vectors_similarity(self, vector: list, other_vector: list) -> float:
+        dot = sum(a * b for a, b in zip(vector, other_vector))
+        norm = math.sqrt(sum(a * a for a in vector)) * math.sqrt(sum(b * b for b in other_vector))
+        return dot / norm if norm else 0.0
+
+    def speculative_search(self, query: str, search):
+        vector = self.embed_query(text=query)
+        if not vector:
+            return None, False
+
+        return vector, search(text=query, vector=vector)
+
+    def rewrite_and_retrieve(self, query: str, chat_history: list,
+                             session_entities: list, search):
+        """
+        Rewrites the query with chat history context and retrieves documents for it.
+        In speculative mode the raw query is embedded and searched while the rewrite
+        is running, and those results are reused if the rewrite barely changed it.
+        """
+
+        if not chat_history or len(chat_history) == 0:
+            return query, search(text=query)
+
+        if not self.app_settings.SPECULATIVE_RETRIEVAL_ENABLED:
+            rewritten_query = self.rewrite_query_with_context(
+                query=query,
+                chat_history=chat_history,
+                session_entities=session_entities
+            )
+            return rewritten_query, search(text=rewritten_query)
+
+        speculative_future = submit(self.speculative_search, query=query, search=search)
+
+        rewritten_query = self.rewrite_query_with_context(
+            query=query,
+            chat_history=chat_history,
+            session_entities=session_entities
+        )
+
+        try:
+            speculative_vector, speculative_documents = speculative_future.result()
+        except Exception as e:
+            self.logger.error(f"Error while running speculative retrieval: {e}")
+            speculative_vector, speculative_documents = None, False
+
+        if speculative_vector and self.is_similar_query(query, rewritten_query):
+            metrics.rag_speculative_retrieval_total.labels(outcome="reused_text").inc()
+            return rewritten_query, speculative_documents
+
+        rewritten_vector = self.embed_query(text=rewritten_query)
+
+        if speculative_vector and rewritten_vector and self.get_vectors_similarity(
+            speculative_vector, rewritten_vector
+        ) >= self.app_settings.SPECULATIVE_RETRIEVAL_VECTOR_SIMILARITY:
+            metrics.rag_speculative_retrieval_total.labels(outcome="reused_vector").inc()
+            return rewritten_query, speculative_documents
+
+        metrics.rag_speculative_retrieval_total.labels(outcome="miss").inc()
+        return rewritten_query, search(text=rewritten_query, vector=rewritten_vector)
+
+    @traced("entity_extraction")
     def extract_session_entities(self, query: str, answer: str,
                                   existing_entities: list = None) -> list:
         """Extracts important entities from the conversation"""
@@ -370,29 +670,41 @@ class NLPController(BaseController):
 
         return existing_entities or []
 
+    def refresh_session_entities(self, session_store, session_id: str, query: str,
+                                 answer: str, existing_entities: list = None):
+        """Extracts entities off the response path and keeps them server-side for the next turn"""
+
+        try:
+            updated_entities = self.extract_session_entities(
+                query=query,
+                answer=answer,
+                existing_entities=existing_entities
+            )
+        except Exception as e:
+            self.logger.error(f"Error while extracting session entities: {e}")
+            return
+
+        session_store.set_entities(session_id=session_id, entities=updated_entities)
+        run_on_event_loop(session_store.save_session(session_id=session_id))
+
     def answer_rag_question_with_history(self, project, query: str,
                                           chat_history: list = None,
                                           session_entities: list = None,
-                                          limit: int = 10):
+                                          limit: int = 10,
+                                          extract_entities: bool = True):
         """RAG answer with chat history support using query rewriting"""
         
         answer, full_prompt, llm_chat_history = None, None, None
-        rewritten_query = query
         updated_entities = session_entities or []
 
-        # Step 1: Rewrite query if chat history exists
-        if chat_history and len(chat_history) > 0:
-            rewritten_query = self.rewrite_query_with_context(
-                query=query,
-                chat_history=chat_history,
-                session_entities=session_entities
-            )
-
-        # Step 2: Retrieve related documents using rewritten query
-        retrieved_documents = self.search_vector_db_collection(
-            project=project,
-            text=rewritten_query,
-            limit=limit,
+        # Step 1+2: Rewrite query if chat history exists and retrieve related documents
+        rewritten_query, retrieved_documents = self.rewrite_and_retrieve(
+            query=query,
+            chat_history=chat_history,
+            session_entities=session_entities,
+            search=lambda text, vector=None: self.search_vector_db_collection(
+                project=project, text=text, limit=limit, vector=vector
+            ),
         )
 
         if not retrieved_documents or len(retrieved_documents) == 0:
@@ -401,13 +713,7 @@ class NLPController(BaseController):
         # Step 3: Construct LLM prompt
         system_prompt = self.template_parser.get("rag", "system_prompt")
 
-        documents_prompts = "\n".join([
-            self.template_parser.get("rag", "document_prompt", {
-                    "doc_num": idx + 1,
-                    "chunk_text": self.generation_client.process_text(doc.text),
-            })
-            for idx, doc in enumerate(retrieved_documents)
-        ])
+        documents_prompts = self.build_documents_prompt(retrieved_documents, query=rewritten_query)
 
         footer_prompt = self.template_parser.get("rag", "footer_prompt", {
             "query": rewritten_query
@@ -435,13 +741,14 @@ class NLPController(BaseController):
         full_prompt = "\n\n".join([documents_prompts, footer_prompt])
 
         # Step 5: Retrieve the Answer
-        answer = self.generation_client.generate_text(
+        answer = self.generate_answer(
             prompt=full_prompt,
             chat_history=llm_chat_history
         )
 
         # Step 6: Extract session entities from new conversation
-        if answer:
+        # (skipped when the caller runs refresh_session_entities in the background)
+        if answer and extract_entities:
             updated_entities = self.extract_session_entities(
                 query=query,
                 answer=answer,
@@ -454,26 +761,21 @@ class NLPController(BaseController):
                                                    tags: list = None,
                                                    chat_history: list = None,
                                                    session_entities: list = None,
-                                                   limit: int = 10):
+                                                   limit: int = 10,
+                                                   extract_entities: bool = True):
         """RAG answer with tags and chat history support"""
         
         answer, full_prompt, llm_chat_history = None, None, None
-        rewritten_query = query
         updated_entities = session_entities or []
 
-        # Step 1: Rewrite query if chat history exists
-        if chat_history and len(chat_history) > 0:
-            rewritten_query = self.rewrite_query_with_context(
-                query=query,
-                chat_history=chat_history,
-                session_entities=session_entities
-            )
-
-        # Step 2: Retrieve related documents with tags filter using rewritten query
-        retrieved_documents = self.search_vector_db_with_tags(
-            text=rewritten_query,
-            tags=tags,
-            limit=limit,
+        # Step 1+2: Rewrite query if chat history exists and retrieve with tags filter
+        rewritten_query, retrieved_documents = self.rewrite_and_retrieve(
+            query=query,
+            chat_history=chat_history,
+            session_entities=session_entities,
+            search=lambda text, vector=None: self.search_vector_db_with_tags(
+                text=text, tags=tags, limit=limit, vector=vector
+            ),
         )
 
         if not retrieved_documents or len(retrieved_documents) == 0:
@@ -482,13 +784,7 @@ class NLPController(BaseController):
         # Step 3: Construct LLM prompt
         system_prompt = self.template_parser.get("rag", "system_prompt")
 
-        documents_prompts = "\n".join([
-            self.template_parser.get("rag", "document_prompt", {
-                    "doc_num": idx + 1,
-                    "chunk_text": self.generation_client.process_text(doc.text),
-            })
-            for idx, doc in enumerate(retrieved_documents)
-        ])
+        documents_prompts = self.build_documents_prompt(retrieved_documents, query=rewritten_query)
 
         footer_prompt = self.template_parser.get("rag", "footer_prompt", {
             "query": rewritten_query
@@ -516,13 +812,14 @@ class NLPController(BaseController):
         full_prompt = "\n\n".join([documents_prompts, footer_prompt])
 
         # Step 5: Retrieve the Answer
-        answer = self.generation_client.generate_text(
+        answer = self.generate_answer(
             prompt=full_prompt,
             chat_history=llm_chat_history
         )
 
         # Step 6: Extract session entities from new conversation
-        if answer:
+        # (skipped when the caller runs refresh_session_entities in the background)
+        if answer and extract_entities:
             updated_entities = self.extract_session_entities(
                 query=query,
                 answer=answer,
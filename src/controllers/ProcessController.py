@@ -1,10 +1,40 @@
 from .BaseController import BaseController
 from .ProjectController import ProjectController
 import os
-from langchain_community.document_loaders import TextLoader
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from models import ProcessingEnum
+from models import ProcessingEnum, ChunkerEnum, ChunkUnitEnum
+from models.db_schemes import DataChunk
+from helpers.chunker import LegalTextChunker, TextChunk
+from helpers.dedup import ChunkDeduplicator
+from helpers import metrics
+import numpy as np
+from stores.llm.LLMTokenizer import get_tokenizer
+from functools import lru_cache
+import hashlib
+import uuid
+
+# splitters hold no per-file state, reuse them across files and requests
+@lru_cache(maxsize=32)
+def get_text_splitter(chunker: str, chunk_size: int, overlap_size: int,
+                      chunk_unit: str, model_id: str = None):
+
+    if chunker == ChunkerEnum.RECURSIVE.value:
+        # langchain is slow to import, only load it when asked for
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=overlap_size,
+            length_function=len,
+        )
+
+    tokenizer = None
+    if chunk_unit == ChunkUnitEnum.TOKENS.value:
+        tokenizer = get_tokenizer(model_id)
+
+    return LegalTextChunker(
+        chunk_size=chunk_size,
+        overlap_size=overlap_size,
+        tokenizer=tokenizer,
+    )
 
 class ProcessController(BaseController):
 
@@ -29,47 +59,189 @@ class ProcessController(BaseController):
             return None
 
         if file_ext == ProcessingEnum.TXT.value:
+            from langchain_community.document_loaders import TextLoader
             return TextLoader(file_path, encoding="utf-8")
 
         if file_ext == ProcessingEnum.PDF.value:
+            from langchain_community.document_loaders import PyMuPDFLoader
             return PyMuPDFLoader(file_path)
         
         return None
 
-    def get_file_content(self, file_id: str):
+    def iter_pdf_pages(self, file_path: str):
+        """One page at a time, PyMuPDFLoader.load() keeps every page in memory"""
+
+        import fitz
+
+        with fitz.open(file_path) as doc:
+            doc_metadata = {
+                key: value
+                for key, value in doc.metadata.items()
+                if type(value) in [str, int]
+            }
+
+            for page in doc:
+                yield TextChunk(
+                    page_content=page.get_text(),
+                    metadata={
+                        "source": file_path,
+                        "file_path": file_path,
+                        "page": page.number,
+                        "total_pages": len(doc),
+                        **doc_metadata,
+                    },
+                )
+
+    def iter_file_content(self, file_id: str):
+
+        file_path = os.path.join(self.project_path, file_id)
+        if not os.path.exists(file_path):
+            return None
+
+        if self.get_file_extension(file_id=file_id) == ProcessingEnum.PDF.value:
+            return self.iter_pdf_pages(file_path=file_path)
 
         loader = self.get_file_loader(file_id=file_id)
         if loader:
-            return loader.load()
+            return loader.lazy_load()
 
         return None
 
-    def process_file_content(self, file_content: list, file_id: str,
-                            chunk_size: int=200, overlap_size: int=20):
+    def get_file_digest(self, file_id: str):
+        """sha256 of a project file, None if it is missing"""
+
+        file_path = os.path.join(self.project_path, file_id)
+        if not os.path.exists(file_path):
+            return None
 
-        text_splitter = RecursiveCharacterTextSplitter(
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while data := f.read(self.app_settings.FILE_DEFAULT_CHUNK_SIZE):
+                digest.update(data)
+
+        return digest.hexdigest()
+
+    def get_processing_config(self, digest: str, chunk_size: int, overlap_size: int,
+                              chunker: str=None, chunk_unit: str=None) -> dict:
+        """What the chunks of an asset are derived from, stored in asset_config["processing"]"""
+
+        processing_config = {
+            "digest": digest,
+            "chunk_size": chunk_size,
+            "overlap_size": overlap_size,
+            "chunker": chunker or self.app_settings.PROCESSING_CHUNKER,
+            "chunk_unit": chunk_unit or self.app_settings.PROCESSING_CHUNK_UNIT,
+        }
+
+        # token sized chunks depend on the tokenizer
+        if processing_config["chunk_unit"] == ChunkUnitEnum.TOKENS.value:
+            processing_config["model_id"] = self.app_settings.EMBEDDING_MODEL_ID
+
+        return processing_config
+
+    def is_asset_processed(self, asset_config: dict, processing_config: dict) -> bool:
+        return (asset_config or {}).get("processing") == processing_config
+
+    def iter_chunk_batches(self, file_chunks, project_id: int, asset_id: int,
+                           deduplicator: ChunkDeduplicator = None, batch_size: int = 500):
+        """DataChunk records of a file's chunks, in lists of batch_size"""
+
+        batch = []
+        chunk_order = 0
+        for chunk in file_chunks:
+            chunk_uuid = uuid.uuid4()
+            fingerprint, minhash, duplicate_of = self.dedupe_chunk(
+                deduplicator=deduplicator, chunk_uuid=chunk_uuid, text=chunk.page_content
+            )
+
+            chunk_order += 1
+            batch.append(
+                DataChunk(
+                    chunk_uuid=chunk_uuid,
+                    chunk_text=chunk.page_content,
+                    chunk_metadata=chunk.metadata,
+                    chunk_order=chunk_order,
+                    chunk_project_id=project_id,
+                    chunk_asset_id=asset_id,
+                    chunk_fingerprint=fingerprint,
+                    chunk_minhash=minhash,
+                    chunk_duplicate_of=duplicate_of,
+                )
+            )
+
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    def get_text_splitter(self, chunk_size: int, overlap_size: int,
+                          chunker: str=None, chunk_unit: str=None):
+        return get_text_splitter(
+            chunker=chunker or self.app_settings.PROCESSING_CHUNKER,
             chunk_size=chunk_size,
-            chunk_overlap=overlap_size,
-            length_function=len,
+            overlap_size=overlap_size,
+            chunk_unit=chunk_unit or self.app_settings.PROCESSING_CHUNK_UNIT,
+            model_id=self.app_settings.EMBEDDING_MODEL_ID,
         )
 
-        file_content_texts = [
-            rec.page_content
-            for rec in file_content
-        ]
+    def iter_file_chunks(self, file_id: str, chunk_size: int=200, overlap_size: int=20,
+                         chunker: str=None, chunk_unit: str=None):
+        """Streams the chunks of a file while its pages are read, None if it can't be loaded"""
+
+        pages = self.iter_file_content(file_id=file_id)
+        if pages is None:
+            return None
+
+        text_splitter = self.get_text_splitter(chunk_size=chunk_size, overlap_size=overlap_size,
+                                               chunker=chunker, chunk_unit=chunk_unit)
 
-        file_content_metadata = [
-            rec.metadata
-            for rec in file_content
-        ]
+        if isinstance(text_splitter, LegalTextChunker):
+            return text_splitter.chunk_documents(pages)
 
-        chunks = text_splitter.create_documents(
-            file_content_texts,
-            metadatas=file_content_metadata
+        # langchain splitters can't carry text over, split page by page
+        return (
+            chunk
+            for page in pages
+            for chunk in text_splitter.create_documents([page.page_content], metadatas=[page.metadata])
         )
 
-        return chunks
+    def create_deduplicator(self, signatures: list):
+        """Deduplicator primed with the (chunk_uuid, fingerprint, minhash) of existing chunks"""
+
+        if not self.app_settings.CHUNK_DEDUP_ENABLED:
+            return None
+
+        deduplicator = ChunkDeduplicator(
+            num_perm=self.app_settings.CHUNK_DEDUP_NUM_PERM,
+            bands=self.app_settings.CHUNK_DEDUP_BANDS,
+            threshold=self.app_settings.CHUNK_DEDUP_THRESHOLD,
+            shingle_size=self.app_settings.CHUNK_DEDUP_SHINGLE_SIZE,
+        )
+
+        for chunk_uuid, fingerprint, minhash in signatures:
+            signature = np.frombuffer(minhash, dtype=np.uint32) if minhash else None
+            if signature is not None and len(signature) != self.app_settings.CHUNK_DEDUP_NUM_PERM:
+                # computed with other settings, exact matches only
+                signature = None
+            deduplicator.add(key=chunk_uuid, fingerprint=fingerprint, signature=signature)
+
+        return deduplicator
+
+    def dedupe_chunk(self, deduplicator: ChunkDeduplicator, chunk_uuid, text: str):
+        """Returns (fingerprint, minhash bytes, chunk_uuid of the duplicated chunk)"""
+
+        if deduplicator is None:
+            return None, None, None
+
+        fingerprint, signature, duplicate_of = deduplicator.check(text=text)
 
+        if duplicate_of is None:
+            deduplicator.add(key=chunk_uuid, fingerprint=fingerprint, signature=signature)
+            metrics.ingested_chunks_total.labels(result="unique").inc()
+        else:
+            metrics.ingested_chunks_total.labels(result="exact_duplicate" if signature is None else "near_duplicate").inc()
 
-    
+        return fingerprint, signature.tobytes() if signature is not None else None, duplicate_of
 
@@ -0,0 +1,275 @@
+from .BaseController import BaseController
+from models import ResponseSignal
+import mimetypes
+import hashlib
+import secrets
+import shutil
+import string
+import json
+import time
+import re
+import os
+
+CONTENT_RANGE_REGEX = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+UPLOAD_ID_REGEX = re.compile(r"^[a-z0-9]+$")
+PART_NAME_REGEX = re.compile(r"^(\d+)-(\d+)$")
+SHA256_REGEX = re.compile(r"^[0-9a-fA-F]{64}$")
+UPLOAD_ID_ALPHABET = string.ascii_lowercase + string.digits
+
+# seconds between two sweeps of expired uploads, per process
+CLEANUP_INTERVAL = 600
+_last_cleanup_at = 0.0
+
+class UploadController(BaseController):
+    """
+    Resumable uploads. Each upload lives in its own directory: state.json and
+    one file per received byte range, parts/<start>-<end>. A part is written to
+    a temporary file and renamed once it arrived in full, so parts can be sent
+    in any order, in parallel and retried, even on other workers, and a cut-off
+    request never touches bytes already received. Finalize assembles the data
+    file and checks it against the sha256 given on create. Uploads idle for
+    RESUMABLE_UPLOAD_EXPIRE_HOURS are deleted, see delete_expired_uploads.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.size_scale = 1048576 # convert MB to bytes
+        self.uploads_dir = os.path.join(
+            self.base_dir,
+            "assets/uploads"
+        )
+        self.expire_seconds = self.app_settings.RESUMABLE_UPLOAD_EXPIRE_HOURS * 3600
+
+    def get_upload_path(self, project_id: str, upload_id: str):
+        if not UPLOAD_ID_REGEX.match(upload_id):
+            return None
+        return os.path.join(self.uploads_dir, str(project_id), upload_id)
+
+    def get_data_path(self, upload_path: str):
+        return os.path.join(upload_path, "data")
+
+    def get_parts_path(self, upload_path: str):
+        return os.path.join(upload_path, "parts")
+
+    def get_part_path(self, upload_path: str, start: int, end: int):
+        return os.path.join(self.get_parts_path(upload_path), f"{start}-{end}")
+
+    def get_part_tmp_path(self, project_id: str, upload_id: str, start: int, end: int):
+        # unique per request, parallel retries of a range don't share it
+        upload_path = self.get_upload_path(project_id=project_id, upload_id=upload_id)
+        return self.get_part_path(upload_path, start, end) + f".{secrets.token_hex(8)}.tmp"
+
+    def validate_upload(self, file_name: str, file_size: int, sha256: str):
+
+        if not SHA256_REGEX.match(sha256 or ""):
+            return False, ResponseSignal.UPLOAD_CHECKSUM_INVALID.value
+
+        content_type, _ = mimetypes.guess_type(file_name)
+        if content_type not in self.app_settings.FILE_ALLOWED_TYPES:
+            return False, ResponseSignal.FILE_TYPE_NOT_SUPPORTED.value
+
+        if file_size <= 0 or file_size > self.app_settings.RESUMABLE_UPLOAD_MAX_SIZE * self.size_scale:
+            return False, ResponseSignal.FILE_SIZE_EXCEEDED.value
+
+        return True, ResponseSignal.FILE_VALIDATED_SUCCESS.value
+
+    def generate_upload_id(self, length: int = 24):
+        # the id is all it takes to write to an upload, it must not be guessable
+        return ''.join(secrets.choice(UPLOAD_ID_ALPHABET) for _ in range(length))
+
+    def create_upload(self, project_id: str, file_name: str, file_size: int, sha256: str):
+
+        upload_id = self.generate_upload_id()
+        upload_path = self.get_upload_path(project_id=project_id, upload_id=upload_id)
+        while os.path.exists(upload_path):
+            upload_id = self.generate_upload_id()
+            upload_path = self.get_upload_path(project_id=project_id, upload_id=upload_id)
+
+        os.makedirs(self.get_parts_path(upload_path))
+
+        state = {
+            "file_name": file_name,
+            "file_size": file_size,
+            "sha256": sha256.lower(),
+            "created_at": time.time(),
+        }
+
+        # state.json appearing marks the upload as ready
+        tmp_path = os.path.join(upload_path, "state.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, os.path.join(upload_path, "state.json"))
+
+        return upload_id
+
+    def get_upload_state(self, project_id: str, upload_id: str):
+        """state.json of an upload, None if it does not exist"""
+
+        upload_path = self.get_upload_path(project_id=project_id, upload_id=upload_id)
+        if upload_path is None:
+            return None
+
+        try:
+            with open(os.path.join(upload_path, "state.json"), encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        if self.is_upload_expired(upload_path=upload_path, created_at=state["created_at"]):
+            return None
+
+        return state
+
+    def get_last_activity(self, upload_path: str, created_at: float = None):
+        """created_at, or when the last part was received (a marker added to parts/)"""
+
+        last_activity = created_at or 0.0
+        for path in (upload_path, self.get_parts_path(upload_path)):
+            try:
+                last_activity = max(last_activity, os.path.getmtime(path))
+            except FileNotFoundError:
+                pass
+
+        return last_activity
+
+    def is_upload_expired(self, upload_path: str, created_at: float = None):
+        return time.time() - self.get_last_activity(upload_path, created_at=created_at) > self.expire_seconds
+
+    def delete_expired_uploads(self, force: bool = False):
+        """
+        Deletes the uploads of all projects that are idle for longer than the expiry,
+        including ones whose creation never completed. At most once per CLEANUP_INTERVAL
+        unless force. Returns the number of deleted uploads.
+        """
+        global _last_cleanup_at
+
+        now = time.time()
+        if not force and now - _last_cleanup_at < CLEANUP_INTERVAL:
+            return 0
+        _last_cleanup_at = now
+
+        if not os.path.isdir(self.uploads_dir):
+            return 0
+
+        deleted = 0
+        for project_id in os.listdir(self.uploads_dir):
+            project_path = os.path.join(self.uploads_dir, project_id)
+            if not os.path.isdir(project_path):
+                continue
+
+            for upload_id in os.listdir(project_path):
+                upload_path = os.path.join(project_path, upload_id)
+
+                try:
+                    with open(os.path.join(upload_path, "state.json"), encoding="utf-8") as f:
+                        created_at = json.load(f)["created_at"]
+                except (FileNotFoundError, NotADirectoryError, ValueError, KeyError):
+                    created_at = None
+
+                if self.is_upload_expired(upload_path=upload_path, created_at=created_at):
+                    shutil.rmtree(upload_path, ignore_errors=True)
+                    deleted += 1
+
+        return deleted
+
+    def parse_content_range(self, content_range: str, file_size: int):
+        """[start, end) of a "bytes start-end/total" header, None if it doesn't fit the upload"""
+
+        match = CONTENT_RANGE_REGEX.match((content_range or "").strip())
+        if not match:
+            return None
+
+        start, last, total = (int(value) for value in match.groups())
+        if total != file_size or start > last or last >= file_size:
+            return None
+
+        return start, last + 1
+
+    def record_part(self, project_id: str, upload_id: str, start: int, end: int, tmp_path: str):
+        """Publishes a part received in full, a retried range replaces it as a whole"""
+        upload_path = self.get_upload_path(project_id=project_id, upload_id=upload_id)
+        os.replace(tmp_path, self.get_part_path(upload_path, start, end))
+
+    def remove_part_tmp(self, tmp_path: str):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    def get_parts(self, project_id: str, upload_id: str):
+        """Sorted (start, end) of the received parts"""
+
+        upload_path = self.get_upload_path(project_id=project_id, upload_id=upload_id)
+
+        parts = []
+        for part_name in os.listdir(self.get_parts_path(upload_path)):
+            match = PART_NAME_REGEX.match(part_name)
+            if match:
+                parts.append(tuple(int(value) for value in match.groups()))
+
+        return sorted(parts)
+
+    def get_received_ranges(self, project_id: str, upload_id: str):
+        """Merged [start, end) byte ranges received so far"""
+
+        parts = self.get_parts(project_id=project_id, upload_id=upload_id)
+
+        ranges = []
+        for start, end in parts:
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], end)
+            else:
+                ranges.append([start, end])
+
+        return ranges
+
+    def get_missing_ranges(self, ranges: list, file_size: int):
+
+        missing = []
+        offset = 0
+        for start, end in ranges:
+            if start > offset:
+                missing.append([offset, start])
+            offset = max(offset, end)
+
+        if offset < file_size:
+            missing.append([offset, file_size])
+
+        return missing
+
+    def assemble_upload(self, project_id: str, upload_id: str):
+        """
+        Writes the parts into the data file, overlapping bytes are taken from the
+        first part that holds them. Returns the sha256 of the assembled file.
+        """
+
+        upload_path = self.get_upload_path(project_id=project_id, upload_id=upload_id)
+        chunk_size = self.app_settings.FILE_DEFAULT_CHUNK_SIZE
+
+        digest = hashlib.sha256()
+        # a concurrent finalize assembles its own copy
+        tmp_path = self.get_data_path(upload_path) + f".{secrets.token_hex(8)}.tmp"
+        with open(tmp_path, "wb") as data_file:
+            offset = 0
+            for start, end in self.get_parts(project_id=project_id, upload_id=upload_id):
+                if end <= offset:
+                    continue
+
+                with open(self.get_part_path(upload_path, start, end), "rb") as part_file:
+                    part_file.seek(max(0, offset - start))
+                    while data := part_file.read(chunk_size):
+                        data_file.write(data)
+                        digest.update(data)
+                offset = end
+
+        os.replace(tmp_path, self.get_data_path(upload_path))
+        return digest.hexdigest()
+
+    def move_upload(self, project_id: str, upload_id: str, file_path: str):
+        """Moves the received file to its project path and drops the upload"""
+
+        upload_path = self.get_upload_path(project_id=project_id, upload_id=upload_id)
+        os.replace(self.get_data_path(upload_path), file_path)
+        shutil.rmtree(upload_path, ignore_errors=True)
+
+    def delete_upload(self, project_id: str, upload_id: str):
+        upload_path = self.get_upload_path(project_id=project_id, upload_id=upload_id)
+        shutil.rmtree(upload_path, ignore_errors=True)
@@ -0,0 +1,45 @@
+"""
+Multi-worker server: gunicorn -c gunicorn_conf.py main:app
+
+The app is imported once in the master (preload_app) so the libraries, templates
+and tokenizers it loads are shared copy-on-write by the workers. Connections,
+clients and caches are created per worker by the startup event, after the fork.
+"""
+
+from helpers.config import get_settings
+import shutil
+import os
+
+settings = get_settings()
+
+bind = "0.0.0.0:8000"
+workers = settings.APP_WORKERS
+worker_class = "helpers.server.UvloopWorker"
+preload_app = True
+# generation calls may take a while
+timeout = 300
+graceful_timeout = 30
+keepalive = 5
+
+if workers > 1 and not settings.VECTOR_DB_URL:
+    raise RuntimeError("APP_WORKERS > 1 needs a Qdrant server (VECTOR_DB_URL), local mode locks VECTOR_DB_PATH to one process")
+
+if workers > 1 and not settings.SESSION_STORE_PERSISTENCE:
+    raise RuntimeError("APP_WORKERS > 1 needs SESSION_STORE_PERSISTENCE, chat sessions would otherwise stay in one worker")
+
+if workers > 1:
+    # must be set before prometheus_client is imported by the app
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+def when_ready(server):
+    # loaded in the master, before the workers are forked
+    from stores.llm.LLMTokenizer import get_tokenizer
+    get_tokenizer(settings.GENERATION_MODEL_ID)
+    get_tokenizer(settings.EMBEDDING_MODEL_ID)
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
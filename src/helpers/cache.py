@@ -0,0 +1,33 @@
+from collections import OrderedDict
+from . import metrics
+import threading
+
+class LRUCache:
+    """Small thread-safe LRU map"""
+
+    def __init__(self, max_size: int = 10000, name: str = None):
+        self.max_size = max_size
+        self.name = name
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                if self.name:
+                    metrics.cache_requests_total.labels(cache=self.name, result="miss").inc()
+                return default
+            self.items.move_to_end(key)
+            if self.name:
+                metrics.cache_requests_total.labels(cache=self.name, result="hit").inc()
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,255 @@
+import re
+
+# break priorities, lower is better
+ARTICLE, CLAUSE, PARAGRAPH, LINE, SENTENCE, SPACE = range(6)
+
+ARABIC_DIGITS = "0-9٠-٩۰-۹"
+
+ARTICLE_HEADING = (
+    rf"(?:(?:ال)?مادة|(?:ال)?فصل|(?:ال)?باب|Article|ARTICLE|Chapter|CHAPTER)"
+    rf"\s*[\(\[]?\s*(?:[{ARABIC_DIGITS}]+|(?:ال)?[ء-ي]+)"
+)
+
+CLAUSE_START = (
+    rf"(?:[\(\[]?(?:[{ARABIC_DIGITS}]{{1,3}}|[a-zA-Zء-ي])[\)\]\.\-–]\s"
+    r"|(?:أولا|ثانيا|ثالثا|رابعا|خامسا|سادسا|سابعا|ثامنا|تاسعا|عاشرا)ً?\s*[:\-–])"
+)
+
+# line and sentence breaks, the text is scanned once; breaks fall after the separator.
+# Line breaks are then promoted to article / clause breaks by what follows them.
+BREAK_REGEX = re.compile(r"\n(?:[ \t]*\n)*[ \t]*|[.!?؟؛:][ \t]+")
+ARTICLE_START_REGEX = re.compile(ARTICLE_HEADING)
+CLAUSE_START_REGEX = re.compile(CLAUSE_START)
+
+# word breaks, only scanned inside pieces too long for a single chunk
+SPACE_REGEX = re.compile(r"[ \t]+")
+
+ARTICLE_HEADING_REGEX = re.compile(rf"\s*({ARTICLE_HEADING}\s*[\)\]]?)")
+
+class TextChunk:
+    """Same shape as a langchain Document, without the pydantic overhead"""
+
+    __slots__ = ("page_content", "metadata")
+
+    def __init__(self, page_content: str, metadata: dict):
+        self.page_content = page_content
+        self.metadata = metadata
+
+
+class LegalTextChunker:
+    """
+    Linear-time chunker aware of legal structure. Chunks are cut at the best
+    boundary available (article heading > numbered clause > paragraph > line >
+    sentence > word), a new article starts a new chunk once the current one is
+    at least min_fill full, and sizes are measured in characters or tokens.
+    """
+
+    def __init__(self, chunk_size: int = 200, overlap_size: int = 20,
+                       tokenizer=None, min_fill: float = 0.5):
+        self.chunk_size = chunk_size
+        self.overlap_size = overlap_size
+        # counts tokens when given, characters otherwise
+        self.tokenizer = tokenizer
+        self.min_fill_size = chunk_size * min_fill
+
+    def measure(self, text: str, start: int, end: int) -> int:
+        if self.tokenizer:
+            return self.tokenizer.count(text[start:end])
+        return end - start
+
+    def iter_breaks(self, text: str):
+        for match in BREAK_REGEX.finditer(text):
+            pos = match.end()
+
+            if text[match.start()] != "\n":
+                yield pos, SENTENCE
+            elif ARTICLE_START_REGEX.match(text, pos):
+                yield pos, ARTICLE
+            elif CLAUSE_START_REGEX.match(text, pos):
+                yield pos, CLAUSE
+            elif text.count("\n", match.start(), pos) > 1:
+                yield pos, PARAGRAPH
+            else:
+                yield pos, LINE
+
+        yield len(text), PARAGRAPH
+
+    def iter_pieces(self, text: str):
+        """Yields (end, break level, size) of the pieces between breaks"""
+
+        prev = 0
+        for pos, level in self.iter_breaks(text):
+            if pos <= prev:
+                continue
+
+            piece_size = self.measure(text, prev, pos)
+            if piece_size > self.chunk_size:
+                for match in SPACE_REGEX.finditer(text, prev, pos):
+                    yield match.end(), SPACE, self.measure(text, prev, match.end())
+                    prev = match.end()
+                piece_size = self.measure(text, prev, pos)
+
+            yield pos, level, piece_size
+            prev = pos
+
+    def select_cut(self, bounds: list, carried: int = 0):
+        """Best-priority boundary past min_fill and the carried overlap, the latest one on ties"""
+
+        best = None
+        for pos, level, size in bounds:
+            if size < self.min_fill_size or size <= carried:
+                continue
+            if best is None or level <= best[1]:
+                best = (pos, level, size)
+
+        return best or bounds[-1]
+
+    def split_text(self, text: str, headings: list = None):
+        """
+        Yields (start, end) offsets of the chunks of text. Offsets of article
+        headings seen so far are appended to headings when given.
+        """
+
+        start = 0
+        size = 0
+        # size of the overlap carried over from the previous chunk
+        carried = 0
+        # (pos, level, size of text[start:pos]) of the breaks inside the current chunk
+        bounds = []
+
+        for pos, level, piece_size in self.iter_pieces(text):
+            while size + piece_size > self.chunk_size and bounds:
+                if size <= carried:
+                    # no room for the overlap next to this piece, drop it
+                    start, size, carried, bounds = bounds[-1][0], 0, 0, []
+                    break
+
+                cut_pos, _, cut_size = self.select_cut(bounds, carried=carried)
+                yield start, cut_pos
+
+                # carry trailing breaks, up to overlap_size, into the next chunk
+                new_start, base = cut_pos, cut_size
+                for b_pos, _, b_size in reversed(bounds):
+                    if b_pos >= cut_pos:
+                        continue
+                    if cut_size - b_size > self.overlap_size:
+                        break
+                    new_start, base = b_pos, b_size
+
+                start = new_start
+                bounds = [ (b_pos, b_level, b_size - base) for b_pos, b_level, b_size in bounds if b_pos > start ]
+                size -= base
+                carried = cut_size - base
+
+            size += piece_size
+
+            if level == ARTICLE and headings is not None:
+                headings.append(pos)
+
+            if level == ARTICLE and size >= self.min_fill_size:
+                yield start, pos
+                start, size, carried, bounds = pos, 0, 0, []
+                continue
+
+            bounds.append((pos, level, size))
+
+        if start < len(text):
+            yield start, len(text)
+
+    def create_documents(self, texts: list, metadatas: list = None) -> list:
+        """Drop-in for TextSplitter.create_documents"""
+
+        metadatas = metadatas or [ {} for _ in texts ]
+
+        chunks = []
+        for text, metadata in zip(texts, metadatas):
+            chunks.extend(self.chunk_text(text=text, metadata=metadata))
+
+        return chunks
+
+    def get_heading(self, text: str, pos: int) -> str:
+        heading = ARTICLE_HEADING_REGEX.match(text, pos)
+        return heading.group(1).strip() if heading else None
+
+    def iter_spans(self, text: str, article: str = None):
+        """
+        Yields (start, end, article at start, chunk article). The chunk article
+        falls back to the first heading inside the chunk.
+        """
+
+        headings = [0] if self.get_heading(text, 0) else []
+        next_heading = 0
+
+        for start, end in self.split_text(text, headings=headings):
+            while next_heading < len(headings) and headings[next_heading] <= start:
+                article = self.get_heading(text, headings[next_heading])
+                next_heading += 1
+
+            chunk_article = article
+            if chunk_article is None and next_heading < len(headings) and headings[next_heading] < end:
+                chunk_article = self.get_heading(text, headings[next_heading])
+
+            yield start, end, article, chunk_article
+
+    def make_chunk(self, text: str, metadata: dict, article: str):
+        page_content = text.strip()
+        if not page_content:
+            return None
+
+        chunk_metadata = dict(metadata or {})
+        if article:
+            chunk_metadata["article"] = article
+
+        return TextChunk(page_content=page_content, metadata=chunk_metadata)
+
+    def chunk_text(self, text: str, metadata: dict = None):
+        """Yields TextChunks, tagged with the article they belong to"""
+
+        for start, end, _, chunk_article in self.iter_spans(text):
+            chunk = self.make_chunk(text=text[start:end], metadata=metadata, article=chunk_article)
+            if chunk:
+                yield chunk
+
+    def chunk_documents(self, documents):
+        """
+        Streams TextChunks over an iterable of documents (e.g. lazily loaded pages).
+        Chunks may span documents and take the metadata of the one they start in.
+        Only the unfinished last chunk is carried over, so memory stays bounded.
+        """
+
+        carry_text, carry_metadata, carry_article = "", None, None
+
+        for document in documents:
+            if carry_text and not carry_text[-1].isspace():
+                carry_text += "\n"
+
+            text = carry_text + document.page_content
+            carry_length = len(carry_text)
+
+            pending = None
+            for span in self.iter_spans(text, article=carry_article):
+                if pending:
+                    start, end, _, chunk_article = pending
+                    chunk = self.make_chunk(
+                        text=text[start:end],
+                        metadata=carry_metadata if start < carry_length else document.metadata,
+                        article=chunk_article,
+                    )
+                    if chunk:
+                        yield chunk
+                pending = span
+
+            if pending is None:
+                continue
+
+            # the next document may continue the last chunk
+            start, _, carry_article, _ = pending
+            carry_text = text[start:]
+            if start >= carry_length:
+                carry_metadata = document.metadata
+
+        if carry_text:
+            for chunk in self.chunk_text(text=carry_text, metadata=carry_metadata):
+                if carry_article and "article" not in chunk.metadata:
+                    chunk.metadata["article"] = carry_article
+                yield chunk
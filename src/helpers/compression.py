@@ -0,0 +1,134 @@
+from .config import get_settings
+from .concurrency import run_on_event_loop
+import zstandard as zstd
+import threading
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TextCompressor:
+    """
+    zstd text compression with dictionaries trained on our corpus. Every trained
+    dictionary is kept in Postgres keyed by its dict_id; frames record the id of the
+    dictionary they were written with, so older rows stay readable after retraining.
+    Dictionaries are loaded at warmup and refreshed periodically, see load_dictionaries.
+    """
+
+    def __init__(self, level: int = 9, dictionary_id: int = None, enabled: bool = True):
+        self.level = level
+        # when disabled, existing frames are still decompressed
+        self.enabled = enabled
+        # pinned by settings, otherwise the newest dictionary
+        self.dictionary_id = dictionary_id
+
+        self.dictionaries = {}
+        self.active_dictionary_id = None
+        self.dictionary_model = None
+
+        # zstd (de)compressor objects are not thread-safe
+        self.local = threading.local()
+
+    def add_dictionary(self, dict_data: bytes) -> int:
+        dictionary = zstd.ZstdCompressionDict(dict_data)
+        self.dictionaries[dictionary.dict_id()] = dictionary
+        return dictionary.dict_id()
+
+    def set_active_dictionary(self, newest_dictionary_id: int = None):
+        active_dictionary_id = self.dictionary_id or newest_dictionary_id
+        if active_dictionary_id and active_dictionary_id not in self.dictionaries:
+            logger.warning(f"zstd dictionary {active_dictionary_id} not found, compressing without one")
+            active_dictionary_id = None
+        self.active_dictionary_id = active_dictionary_id
+
+    async def load_dictionaries(self, dictionary_model):
+        """Adds the dictionaries stored in Postgres (oldest first) that are not loaded yet"""
+
+        self.dictionary_model = dictionary_model
+
+        dictionary_ids = await dictionary_model.get_dictionary_ids()
+        for dict_id in dictionary_ids:
+            if dict_id not in self.dictionaries:
+                record = await dictionary_model.get_dictionary(dict_id=dict_id)
+                self.add_dictionary(record.dict_data)
+
+        self.set_active_dictionary(newest_dictionary_id=dictionary_ids[-1] if dictionary_ids else None)
+
+    async def run_refresh(self, dictionary_model, interval: float):
+        """Picks up dictionaries trained by other processes, see scripts/compress_chunks.py"""
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.load_dictionaries(dictionary_model)
+            except Exception as e:
+                logger.error(f"Error while refreshing zstd dictionaries: {e}")
+
+    def fetch_dictionary(self, dict_id: int):
+        """Loads one dictionary from Postgres, only possible off the event loop"""
+
+        if self.dictionary_model is None:
+            return
+
+        try:
+            record = run_on_event_loop(self.dictionary_model.get_dictionary(dict_id=dict_id))
+        except RuntimeError:
+            # on the event loop, the periodic refresh will pick it up
+            return
+
+        if record is not None:
+            self.add_dictionary(record.dict_data)
+
+    def get_compressor(self) -> zstd.ZstdCompressor:
+        compressors = self.local.__dict__.setdefault("compressors", {})
+        if self.active_dictionary_id not in compressors:
+            compressors[self.active_dictionary_id] = zstd.ZstdCompressor(
+                level=self.level,
+                dict_data=self.dictionaries.get(self.active_dictionary_id),
+            )
+        return compressors[self.active_dictionary_id]
+
+    def get_decompressor(self, dict_id: int) -> zstd.ZstdDecompressor:
+        decompressors = self.local.__dict__.setdefault("decompressors", {})
+        if dict_id not in decompressors:
+            if dict_id and dict_id not in self.dictionaries:
+                self.fetch_dictionary(dict_id=dict_id)
+            if dict_id and dict_id not in self.dictionaries:
+                raise ValueError(f"zstd dictionary {dict_id} is not loaded")
+            decompressors[dict_id] = zstd.ZstdDecompressor(dict_data=self.dictionaries.get(dict_id))
+        return decompressors[dict_id]
+
+    def compress(self, text: str) -> bytes:
+        return self.get_compressor().compress(text.encode("utf-8"))
+
+    def decompress(self, data: bytes) -> str:
+        dict_id = zstd.get_frame_parameters(data).dict_id
+        return self.get_decompressor(dict_id).decompress(data).decode("utf-8")
+
+    def train(self, samples: list, dictionary_size: int = 112640):
+        """Trains a dictionary on sample texts and makes it the active one, (dict_id, dict_data)"""
+
+        dictionary = zstd.train_dictionary(dictionary_size, [ text.encode("utf-8") for text in samples ])
+        dict_id = dictionary.dict_id()
+
+        self.dictionaries[dict_id] = dictionary
+        self.active_dictionary_id = dict_id
+        return dict_id, dictionary.as_bytes()
+
+
+_text_compressor = None
+_text_compressor_lock = threading.Lock()
+
+def get_text_compressor() -> TextCompressor:
+    global _text_compressor
+
+    with _text_compressor_lock:
+        if _text_compressor is None:
+            settings = get_settings()
+            _text_compressor = TextCompressor(
+                level=settings.CHUNK_TEXT_COMPRESSION_LEVEL,
+                dictionary_id=settings.CHUNK_TEXT_DICTIONARY_ID,
+                enabled=settings.CHUNK_TEXT_COMPRESSION_ENABLED,
+            )
+
+    return _text_compressor
@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+from .config import get_settings
+from . import metrics
+import contextvars
+import threading
+import asyncio
+
+_executor = None
+_executor_lock = threading.Lock()
+_event_loop = None
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_settings().BACKGROUND_MAX_WORKERS,
+                thread_name_prefix="karofa-worker",
+            )
+
+    return _executor
+
+def update_queue_depth():
+    # set explicitly, callback gauges are not shared with the multiprocess /metrics
+    metrics.worker_pool_queue_depth.set(_executor._work_queue.qsize())
+
+def run_task(context, func, *args, **kwargs):
+    update_queue_depth()
+    try:
+        return context.run(func, *args, **kwargs)
+    finally:
+        update_queue_depth()
+
+def submit(func, *args, **kwargs):
+    """Runs func on the shared worker pool, keeping the caller's contextvars"""
+    context = contextvars.copy_context()
+    future = get_executor().submit(run_task, context, func, *args, **kwargs)
+    update_queue_depth()
+    return future
+
+def set_event_loop(loop):
+    """Remembers the app's event loop, called once at startup"""
+    global _event_loop
+    _event_loop = loop
+
+def run_on_event_loop(coro, timeout: float = None):
+    """Runs a coroutine on the app's event loop from a worker thread and waits for its result"""
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run_coroutine_threadsafe(coro, _event_loop).result(timeout=timeout)
+
+    coro.close()
+    raise RuntimeError("run_on_event_loop() would block the event loop it runs on")
+
@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Optional
 
 class Settings(BaseSettings):
 
@@ -9,12 +10,26 @@ class Settings(BaseSettings):
     FILE_ALLOWED_TYPES: list
     FILE_MAX_SIZE: int
     FILE_DEFAULT_CHUNK_SIZE: int
+    BULK_UPLOAD_CONCURRENCY: int = 16
+    BULK_UPLOAD_MAX_FILES: int = 20000
+    RESUMABLE_UPLOAD_MAX_SIZE: int = 1024
+    RESUMABLE_UPLOAD_PART_SIZE: int = 8
+    RESUMABLE_UPLOAD_EXPIRE_HOURS: float = 24
 
     POSTGRES_USERNAME: str
     POSTGRES_PASSWORD: str
     POSTGRES_HOST: str
     POSTGRES_PORT: int
     POSTGRES_MAIN_DATABASE: str
+    POSTGRES_POOL_SIZE: int = 5
+    POSTGRES_MAX_OVERFLOW: int = 10
+    POSTGRES_POOL_TIMEOUT: float = 30.0
+    POSTGRES_POOL_RECYCLE: int = 1800
+    POSTGRES_POOL_PRE_PING: bool = True
+    POSTGRES_STATEMENT_CACHE_SIZE: int = 100
+    POSTGRES_PGBOUNCER: bool = False
+    POSTGRES_READ_HOST: Optional[str] = None
+    POSTGRES_READ_PORT: Optional[int] = None
 
     GENERATION_BACKEND: str
     EMBEDDING_BACKEND: str
@@ -23,6 +38,14 @@ class Settings(BaseSettings):
     OPENAI_API_URL: str = None
     COHERE_API_KEY: str = None
 
+    # FAKE backend, offline load testing
+    FAKE_LLM_GENERATION_LATENCY_MS: float = 800
+    FAKE_LLM_EMBEDDING_LATENCY_MS: float = 50
+    FAKE_LLM_LATENCY_JITTER: float = 0.3
+    FAKE_LLM_ERROR_RATE: float = 0.0
+    FAKE_LLM_THROTTLE_RATE: float = 0.0
+    FAKE_LLM_SEED: int = 0
+
     GENERATION_MODEL_ID: str = None
     EMBEDDING_MODEL_ID: str = None
     EMBEDDING_MODEL_SIZE: int = None
@@ -30,9 +53,93 @@ class Settings(BaseSettings):
     GENERATION_DAFAULT_MAX_TOKENS: int = None
     GENERATION_DAFAULT_TEMPERATURE: float = None
 
+    PROCESSING_CHUNKER: str = "recursive"
+    PROCESSING_CHUNK_UNIT: str = "chars"
+    PROCESSING_INSERT_BATCH_SIZE: int = 500
+
+    CHUNK_DEDUP_ENABLED: bool = True
+    CHUNK_DEDUP_THRESHOLD: float = 0.85
+    CHUNK_DEDUP_NUM_PERM: int = 128
+    CHUNK_DEDUP_BANDS: int = 32
+    CHUNK_DEDUP_SHINGLE_SIZE: int = 5
+
+    RAG_CONTEXT_TOKEN_BUDGET: int = 3000
+    RAG_CONTEXT_MIN_DOCUMENT_TOKENS: int = 32
+    RAG_MERGE_ADJACENT_CHUNKS: bool = True
+    RAG_COMPRESSION_ENABLED: bool = False
+    RAG_COMPRESSION_MAX_SENTENCES: int = 3
+    RAG_COMPRESSION_MIN_SIMILARITY: float = 0.3
+    RAG_COMPRESSION_CACHE_SIZE: int = 50000
+
+    LLM_RATE_LIMIT_ENABLED: bool = True
+    LLM_REQUESTS_PER_MINUTE: int = 500
+    LLM_TOKENS_PER_MINUTE: int = 200000
+    LLM_INITIAL_CONCURRENCY: int = 4
+    LLM_MIN_CONCURRENCY: int = 1
+    LLM_MAX_CONCURRENCY: int = 32
+    LLM_MAX_RETRIES: int = 5
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    LLM_RETRY_MAX_DELAY: float = 30.0
+
+    GENERATION_HEDGE_ENABLED: bool = False
+    GENERATION_HEDGE_BACKEND: Optional[str] = None
+    GENERATION_HEDGE_MODEL_ID: Optional[str] = None
+    GENERATION_HEDGE_PERCENTILE: float = 95
+    GENERATION_HEDGE_MIN_SAMPLES: int = 20
+    GENERATION_HEDGE_DEFAULT_DELAY: float = 3.0
+
+    EMBEDDING_BATCH_ENABLED: bool = False
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+    EMBEDDING_BATCH_MAX_CONCURRENCY: int = 4
+    EMBEDDING_BATCH_TIMEOUT: float = 30.0
+
+    SINGLEFLIGHT_ENABLED: bool = True
+
+    SPECULATIVE_RETRIEVAL_ENABLED: bool = False
+    SPECULATIVE_RETRIEVAL_TEXT_SIMILARITY: float = 0.8
+    SPECULATIVE_RETRIEVAL_VECTOR_SIMILARITY: float = 0.95
+
+    ENTITY_EXTRACTION_MODE: str = "sync"
+    SESSION_STORE_MAX_SESSIONS: int = 10000
+    SESSION_STORE_TTL_SECONDS: int = 86400
+    SESSION_STORE_PERSISTENCE: bool = False
+    SESSION_STORE_FLUSH_INTERVAL: float = 5.0
+    SESSION_STORE_WRITE_THROUGH: bool = False
+
+    BACKGROUND_MAX_WORKERS: int = 16
+
+    # server processes started by gunicorn_conf.py
+    APP_WORKERS: int = 1
+
+    WARMUP_EMBEDDING_ENABLED: bool = False
+    WARMUP_RETRY_INTERVAL: float = 5.0
+
+    TRACING_ENABLED: bool = True
+    TRACING_EXPORT_PATH: Optional[str] = None
+    TRACING_OTLP_ENDPOINT: Optional[str] = None
+    TRACING_PROFILING_ENABLED: bool = False
+    TRACING_PROFILE_INTERVAL_MS: float = 5.0
+    TRACING_PROFILE_MAX_STORED: int = 100
+
     VECTOR_DB_BACKEND : str
     VECTOR_DB_PATH : str
+    VECTOR_DB_URL: Optional[str] = None
+    VECTOR_DB_API_KEY: Optional[str] = None
     VECTOR_DB_DISTANCE_METHOD: str = None
+    VECTOR_DB_LEAN_PAYLOAD: bool = False
+    VECTOR_DB_TWO_STAGE_ENABLED: bool = False
+    VECTOR_DB_COMPACT_SIZE: int = 256
+    VECTOR_DB_RESCORE_OVERSAMPLING: float = 4.0
+    VECTOR_DB_PROJECTION_REFRESH_INTERVAL: float = 60.0
+    CHUNK_TEXT_CACHE_SIZE: int = 20000
+
+    CHUNK_TEXT_COMPRESSION_ENABLED: bool = False
+    CHUNK_TEXT_COMPRESSION_LEVEL: int = 9
+    CHUNK_TEXT_DICTIONARY_DIR: str = "assets/zstd"
+    CHUNK_TEXT_DICTIONARY_ID: Optional[int] = None
+    CHUNK_TEXT_DICTIONARY_SIZE: int = 112640
+    CHUNK_TEXT_DICTIONARY_REFRESH_INTERVAL: float = 60.0
 
     PRIMARY_LANG: str = "en"
     DEFAULT_LANG: str = "en"
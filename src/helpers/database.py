@@ -0,0 +1,55 @@
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+from .config import Settings
+from .metrics import instrument_engine, instrument_pool
+import asyncio
+import uuid
+
+def get_postgres_url(settings: Settings, host: str = None, port: int = None) -> str:
+    return (
+        f"postgresql+asyncpg://{settings.POSTGRES_USERNAME}:{settings.POSTGRES_PASSWORD}"
+        f"@{host or settings.POSTGRES_HOST}:{port or settings.POSTGRES_PORT}/{settings.POSTGRES_MAIN_DATABASE}"
+    )
+
+def get_connect_args(settings: Settings) -> dict:
+    if not settings.POSTGRES_PGBOUNCER:
+        return { "statement_cache_size": settings.POSTGRES_STATEMENT_CACHE_SIZE }
+
+    # PgBouncer in transaction mode hands each transaction any server connection,
+    # named prepared statements must neither be cached nor reused across them
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+    }
+
+def create_db_engine(settings: Settings, host: str = None, port: int = None, pool_name: str = "primary"):
+    engine = create_async_engine(
+        get_postgres_url(settings, host=host, port=port),
+        pool_size=settings.POSTGRES_POOL_SIZE,
+        max_overflow=settings.POSTGRES_MAX_OVERFLOW,
+        pool_timeout=settings.POSTGRES_POOL_TIMEOUT,
+        pool_recycle=settings.POSTGRES_POOL_RECYCLE,
+        pool_pre_ping=settings.POSTGRES_POOL_PRE_PING,
+        connect_args=get_connect_args(settings),
+    )
+
+    instrument_engine(engine)
+    instrument_pool(engine, capacity=settings.POSTGRES_POOL_SIZE + settings.POSTGRES_MAX_OVERFLOW,
+                    pool_name=pool_name)
+    return engine
+
+def create_db_client(engine):
+    return sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+async def warm_db_engine(engine, connections: int):
+    """Opens up to `connections` pooled connections, so first requests don't pay for them"""
+
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*[ ping() for _ in range(max(connections, 1)) ])
@@ -0,0 +1,126 @@
+from collections import defaultdict
+import numpy as np
+import hashlib
+import re
+
+ARABIC_DIACRITICS_REGEX = re.compile(r"[ً-ٰٟـ]")
+WHITESPACE_REGEX = re.compile(r"\s+")
+ARABIC_LETTER_FORMS = str.maketrans({ "أ": "ا", "إ": "ا", "آ": "ا", "ى": "ي", "ة": "ه" })
+
+# largest prime below 2**32, keeps (a * h + b) inside uint64
+HASH_PRIME = np.uint64(4294967291)
+
+def normalize_text(text: str) -> str:
+    """Case, diacritics, letter-form and whitespace insensitive form of text"""
+    text = ARABIC_DIACRITICS_REGEX.sub("", text.lower())
+    text = text.translate(ARABIC_LETTER_FORMS)
+    return WHITESPACE_REGEX.sub(" ", text).strip()
+
+def get_fingerprint(normalized_text: str) -> str:
+    return hashlib.sha1(normalized_text.encode("utf-8")).hexdigest()
+
+
+class MinHasher:
+    """MinHash signatures over word shingles"""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 2**31, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 2**31, size=num_perm).astype(np.uint64)
+
+    def get_shingles(self, normalized_text: str) -> set:
+        words = normalized_text.split(" ")
+        if len(words) <= self.shingle_size:
+            return { normalized_text }
+
+        return {
+            " ".join(words[i:i + self.shingle_size])
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def get_signature(self, normalized_text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (
+                int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+                for shingle in self.get_shingles(normalized_text)
+            ),
+            dtype=np.uint64,
+        )
+
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % HASH_PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+
+class MinHashLSH:
+    """Banded LSH over MinHash signatures, candidates are verified against the threshold"""
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, threshold: float = 0.85):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+
+        self.buckets = defaultdict(list)
+        self.signatures = {}
+
+    def get_band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, key, signature: np.ndarray):
+        self.signatures[key] = signature
+        for band_key in self.get_band_keys(signature):
+            self.buckets[band_key].append(key)
+
+    def query(self, signature: np.ndarray):
+        """Most similar indexed key at or above the threshold, None otherwise"""
+
+        best_key, best_similarity = None, self.threshold
+        seen = set()
+
+        for band_key in self.get_band_keys(signature):
+            for key in self.buckets.get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+
+                similarity = float(np.mean(self.signatures[key] == signature))
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+
+        return best_key
+
+
+class ChunkDeduplicator:
+    """
+    Finds exact (normalized text hash) and near (MinHash LSH) duplicates among
+    the chunks it has seen. Keys are whatever identifies the canonical chunk.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32,
+                       threshold: float = 0.85, shingle_size: int = 5):
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self.lsh = MinHashLSH(num_perm=num_perm, bands=bands, threshold=threshold)
+        self.fingerprints = {}
+
+    def add(self, key, fingerprint: str, signature: np.ndarray = None):
+        self.fingerprints.setdefault(fingerprint, key)
+        if signature is not None:
+            self.lsh.add(key=key, signature=signature)
+
+    def check(self, text: str):
+        """Returns (fingerprint, signature, key of the chunk it duplicates or None)"""
+
+        normalized_text = normalize_text(text)
+        fingerprint = get_fingerprint(normalized_text)
+
+        if fingerprint in self.fingerprints:
+            return fingerprint, None, self.fingerprints[fingerprint]
+
+        signature = self.hasher.get_signature(normalized_text)
+        return fingerprint, signature, self.lsh.query(signature)
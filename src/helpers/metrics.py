@@ -0,0 +1,288 @@
+from prometheus_client import Counter, Gauge, Histogram
+from contextlib import contextmanager
+from contextvars import ContextVar
+from starlette.routing import Match
+from .tracing import span, current_trace
+import time
+
+# (endpoint, project) of the request being handled, set by RequestMetricsMiddleware
+request_labels = ContextVar("request_labels", default=("-", "-"))
+
+#### Requests & Pipeline Stages ####
+
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["endpoint", "method", "status"],
+)
+
+stage_duration_seconds = Histogram(
+    "stage_duration_seconds",
+    "Latency of a pipeline stage (embed, vector_search, vector_upsert, db_query, template_render, generate, ...)",
+    ["stage", "endpoint", "backend", "project"],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+
+llm_tokens_total = Counter(
+    "llm_tokens_total",
+    "Tokens sent to (in) and generated by (out) LLM providers",
+    ["direction", "endpoint", "backend", "project"],
+)
+
+cache_requests_total = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result (hit, miss)",
+    ["cache", "result"],
+)
+
+worker_pool_queue_depth = Gauge(
+    "worker_pool_queue_depth",
+    "Tasks waiting for a thread in the shared worker pool",
+    multiprocess_mode="livesum",
+)
+
+@contextmanager
+def track_stage(stage: str, backend: str = "-"):
+    endpoint, project = request_labels.get()
+    started_at = time.perf_counter()
+    try:
+        with span(stage, backend=backend):
+            yield
+    finally:
+        stage_duration_seconds.labels(
+            stage=stage, endpoint=endpoint, backend=backend, project=project
+        ).observe(time.perf_counter() - started_at)
+
+def count_tokens(tokens_in: int = None, tokens_out: int = None, backend: str = "-"):
+    endpoint, project = request_labels.get()
+    if tokens_in:
+        llm_tokens_total.labels(direction="in", endpoint=endpoint, backend=backend, project=project).inc(tokens_in)
+    if tokens_out:
+        llm_tokens_total.labels(direction="out", endpoint=endpoint, backend=backend, project=project).inc(tokens_out)
+
+def instrument_engine(engine, backend: str = "postgres"):
+    """Times every statement run by a SQLAlchemy (async) engine"""
+
+    from sqlalchemy import event
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        trace = current_trace.get()
+        query_span = trace.start_span(name="db_query", attributes={ "backend": backend }) if trace else None
+        conn.info.setdefault("query_started_at", []).append((time.perf_counter(), query_span))
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started_at, query_span = conn.info["query_started_at"].pop()
+        if query_span:
+            query_span.trace.finish_span(query_span)
+        endpoint, project = request_labels.get()
+        stage_duration_seconds.labels(
+            stage="db_query", endpoint=endpoint, backend=backend, project=project
+        ).observe(time.perf_counter() - started_at)
+
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+
+db_pool_connections = Gauge(
+    "db_pool_connections",
+    "Connections of a database pool by state (checked_out, idle, overflow)",
+    ["pool", "state"],
+    multiprocess_mode="livesum",
+)
+
+db_pool_capacity = Gauge(
+    "db_pool_capacity",
+    "Most connections a database pool may open (pool_size + max_overflow)",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+def instrument_pool(engine, capacity: int, pool_name: str = "primary"):
+    """
+    Tracks the connections of an engine's QueuePool. The pool is saturated once
+    checked_out reaches db_pool_capacity, further checkouts wait up to pool_timeout.
+    """
+
+    from sqlalchemy import event
+    sync_engine = getattr(engine, "sync_engine", engine)
+    pool = sync_engine.pool
+
+    db_pool_capacity.labels(pool=pool_name).set(capacity)
+
+    def update_gauges(*args):
+        db_pool_connections.labels(pool=pool_name, state="checked_out").set(pool.checkedout())
+        db_pool_connections.labels(pool=pool_name, state="idle").set(pool.checkedin())
+        # connections opened beyond pool_size
+        db_pool_connections.labels(pool=pool_name, state="overflow").set(max(pool.overflow(), 0))
+
+    event.listen(pool, "checkout", update_gauges)
+    event.listen(pool, "checkin", update_gauges)
+    event.listen(pool, "close", update_gauges)
+
+
+class RequestMetricsMiddleware:
+    """
+    Pure ASGI middleware: resolves the route template and project_id once per
+    request, exposes them to track_stage() and records request latency.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def resolve_labels(self, scope):
+        router = scope["app"].router
+        for route in router.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                project = child_scope.get("path_params", {}).get("project_id", "-")
+                return getattr(route, "path", scope["path"]), str(project)
+
+        return "unmatched", "-"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        endpoint, project = self.resolve_labels(scope)
+        token = request_labels.set((endpoint, project))
+
+        status_code = [500]
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_request_duration_seconds.labels(
+                endpoint=endpoint, method=scope["method"], status=str(status_code[0])
+            ).observe(time.perf_counter() - started_at)
+            request_labels.reset(token)
+
+#### LLM Rate Limiting ####
+
+llm_rate_limit_requests_per_minute = Gauge(
+    "llm_rate_limit_requests_per_minute",
+    "Configured requests/min bucket size per model",
+    ["model"],
+    multiprocess_mode="livemax",
+)
+
+llm_rate_limit_tokens_per_minute = Gauge(
+    "llm_rate_limit_tokens_per_minute",
+    "Configured tokens/min bucket size per model",
+    ["model"],
+    multiprocess_mode="livemax",
+)
+
+llm_rate_limit_concurrency = Gauge(
+    "llm_rate_limit_concurrency",
+    "Current AIMD concurrency limit per model",
+    ["model"],
+    multiprocess_mode="livesum",
+)
+
+llm_rate_limit_inflight = Gauge(
+    "llm_rate_limit_inflight",
+    "Provider calls currently in flight per model",
+    ["model"],
+    multiprocess_mode="livesum",
+)
+
+llm_rate_limited_total = Counter(
+    "llm_rate_limited_total",
+    "Provider responses rejected with 429 per model",
+    ["model"],
+)
+
+llm_retries_total = Counter(
+    "llm_retries_total",
+    "Provider calls retried after a retryable error per model",
+    ["model"],
+)
+
+#### Generation Hedging ####
+
+llm_hedge_delay_seconds = Gauge(
+    "llm_hedge_delay_seconds",
+    "Current percentile deadline before a hedged generation request is sent",
+    multiprocess_mode="livemax",
+)
+
+llm_hedge_fired_total = Counter(
+    "llm_hedge_fired_total",
+    "Hedged generation requests sent",
+)
+
+llm_hedge_won_total = Counter(
+    "llm_hedge_won_total",
+    "Hedged generation requests that finished before the primary one",
+)
+
+#### Embedding Batching ####
+
+embedding_batch_size = Histogram(
+    "embedding_batch_size",
+    "Concurrent query embeddings sent in one provider call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+#### Request Coalescing ####
+
+singleflight_requests_total = Counter(
+    "singleflight_requests_total",
+    "Requests that started a computation (leader) or joined an identical one in flight (shared)",
+    ["name", "result"],
+)
+
+#### Speculative Retrieval ####
+
+rag_speculative_retrieval_total = Counter(
+    "rag_speculative_retrieval_total",
+    "Speculative raw-query retrievals by outcome (reused_text, reused_vector, miss)",
+    ["outcome"],
+)
+
+#### Ingestion ####
+
+ingested_chunks_total = Counter(
+    "ingested_chunks_total",
+    "Chunks stored by /data/process, by result (unique, exact_duplicate, near_duplicate)",
+    ["result"],
+)
+
+#### Context Packing ####
+
+rag_context_tokens = Histogram(
+    "rag_context_tokens",
+    "Tokens of retrieved context packed into RAG prompts",
+    buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000),
+)
+
+#### Startup ####
+
+startup_phase_seconds = Gauge(
+    "startup_phase_seconds",
+    "Duration of the startup phases of this process (import, db_engines, llm_clients, warmup_*, ...)",
+    ["phase"],
+    multiprocess_mode="liveall",
+)
+
+app_ready = Gauge(
+    "app_ready",
+    "1 once warmup finished and /health/ready reports ready",
+    multiprocess_mode="livemin",
+)
+
+@contextmanager
+def track_startup(phase: str, profile: dict = None):
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started_at
+        startup_phase_seconds.labels(phase=phase).set(elapsed)
+        if profile is not None:
+            profile[phase] = round(elapsed, 4)
@@ -0,0 +1,6 @@
+from uvicorn.workers import UvicornWorker
+
+class UvloopWorker(UvicornWorker):
+    """gunicorn worker running the app on uvloop with the httptools parser"""
+
+    CONFIG_KWARGS = { "loop": "uvloop", "http": "httptools", "lifespan": "on" }
@@ -0,0 +1,44 @@
+from . import metrics
+import asyncio
+import re
+
+WHITESPACE_REGEX = re.compile(r"\s+")
+
+def normalize_query(text: str) -> str:
+    # only whitespace, the shared answer echoes the leader's query in full_prompt
+    return WHITESPACE_REGEX.sub(" ", text or "").strip()
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight computation and
+    all get its result (or exception). Nothing is cached, a call arriving
+    after the computation finished starts a new one. Per process. When
+    disabled, every call runs func on its own.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self.calls = {}
+
+    def forget(self, key, task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+
+    async def do(self, key, func, *args, **kwargs):
+        """Awaits func(*args, **kwargs), or the identical call already in flight"""
+
+        if not self.enabled:
+            return await func(*args, **kwargs)
+
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self.forget(key, done))
+            metrics.singleflight_requests_total.labels(name=self.name, result="leader").inc()
+        else:
+            metrics.singleflight_requests_total.labels(name=self.name, result="shared").inc()
+
+        # a disconnecting caller must not cancel the others' computation
+        return await asyncio.shield(task)
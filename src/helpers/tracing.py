@@ -0,0 +1,327 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import Counter
+from functools import wraps
+from .config import get_settings
+import urllib.request
+import threading
+import logging
+import queue
+import json
+import time
+import sys
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+current_trace = ContextVar("current_trace", default=None)
+current_span = ContextVar("current_span", default=None)
+
+SERVER_TIMING_NAME_REGEX = re.compile(r"[^A-Za-z0-9_\-]")
+
+class Span:
+
+    def __init__(self, trace, name: str, parent=None, attributes: dict = None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes or {}
+        self.thread_id = threading.get_ident()
+        # OTLP SpanKind, 1 = internal, 2 = server
+        self.kind = 1
+
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_otlp(self) -> dict:
+        return {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [
+                { "key": key, "value": { "stringValue": str(value) } }
+                for key, value in self.attributes.items()
+            ],
+        }
+
+
+class Trace:
+
+    def __init__(self, trace_id: str = None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans = []
+        self.thread_ids = { threading.get_ident() }
+        self.lock = threading.Lock()
+
+    def start_span(self, name: str, attributes: dict = None) -> Span:
+        span = Span(trace=self, name=name, parent=current_span.get(), attributes=attributes)
+        with self.lock:
+            self.thread_ids.add(span.thread_id)
+        return span
+
+    def finish_span(self, span: Span):
+        span.end_ns = time.time_ns()
+        with self.lock:
+            self.spans.append(span)
+
+    def get_server_timing(self) -> str:
+        """Server-Timing header value, durations summed per span name"""
+
+        durations = {}
+        with self.lock:
+            for span in self.spans:
+                durations[span.name] = durations.get(span.name, 0.0) + span.duration_ms
+
+        return ", ".join(
+            f"{SERVER_TIMING_NAME_REGEX.sub('_', name)};dur={duration:.1f}"
+            for name, duration in durations.items()
+        )
+
+    def to_otlp(self, service_name: str) -> dict:
+        with self.lock:
+            spans = [ span.to_otlp() for span in self.spans ]
+
+        return {
+            "resourceSpans": [{
+                "resource": {
+                    "attributes": [{ "key": "service.name", "value": { "stringValue": service_name } }],
+                },
+                "scopeSpans": [{
+                    "scope": { "name": "karofa" },
+                    "spans": spans,
+                }],
+            }]
+        }
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Records a span when the current request is traced, no-op otherwise"""
+
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    new_span = trace.start_span(name=name, attributes=attributes)
+    token = current_span.set(new_span)
+    try:
+        yield new_span
+    finally:
+        current_span.reset(token)
+        trace.finish_span(new_span)
+
+def traced(name: str):
+    """Decorator version of span()"""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+class TraceExporter:
+    """Writes finished traces as OTLP/JSON to a file (one trace per line) and/or a collector"""
+
+    def __init__(self, service_name: str, file_path: str = None, otlp_endpoint: str = None):
+        self.service_name = service_name
+        self.file_path = file_path
+        self.otlp_endpoint = otlp_endpoint
+
+        self.queue = queue.Queue(maxsize=10000)
+        self.thread = threading.Thread(target=self.run, name="trace-exporter", daemon=True)
+        self.thread.start()
+
+    def export(self, trace: Trace):
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            logger.warning("Trace export queue is full, dropping trace")
+
+    def run(self):
+        while True:
+            trace = self.queue.get()
+            payload = json.dumps(trace.to_otlp(service_name=self.service_name))
+
+            try:
+                if self.file_path:
+                    with open(self.file_path, "a", encoding="utf-8") as f:
+                        f.write(payload + "\n")
+
+                if self.otlp_endpoint:
+                    request = urllib.request.Request(
+                        url=self.otlp_endpoint.rstrip("/") + "/v1/traces",
+                        data=payload.encode("utf-8"),
+                        headers={ "Content-Type": "application/json" },
+                        method="POST",
+                    )
+                    urllib.request.urlopen(request, timeout=5).close()
+            except Exception as e:
+                logger.error(f"Error while exporting trace: {e}")
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads a trace ran on and aggregates them into
+    folded stacks ("frame;frame;frame count"), ready for flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, trace: Trace, interval: float = 0.005):
+        self.trace = trace
+        self.interval = interval
+        self.samples = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self) -> str:
+        self.stopped.set()
+        self.thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.items())
+
+    def run(self):
+        own_thread_id = threading.get_ident()
+
+        while not self.stopped.wait(self.interval):
+            with self.trace.lock:
+                thread_ids = set(self.trace.thread_ids)
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id or thread_id not in thread_ids:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+
+                self.samples[";".join(reversed(stack))] += 1
+
+
+_exporter = None
+_exporter_configured = False
+_profiles = None
+_lock = threading.Lock()
+
+def get_exporter() -> TraceExporter:
+    """Shared exporter, None when neither a file nor a collector is configured"""
+    global _exporter, _exporter_configured
+
+    # called for every traced request, settings are read once
+    if _exporter_configured:
+        return _exporter
+
+    with _lock:
+        if not _exporter_configured:
+            settings = get_settings()
+            if settings.TRACING_EXPORT_PATH or settings.TRACING_OTLP_ENDPOINT:
+                _exporter = TraceExporter(
+                    service_name=settings.APP_NAME,
+                    file_path=settings.TRACING_EXPORT_PATH,
+                    otlp_endpoint=settings.TRACING_OTLP_ENDPOINT,
+                )
+            _exporter_configured = True
+
+    return _exporter
+
+def get_profiles():
+    """profile_id -> folded stacks of the most recent profiled requests"""
+    global _profiles
+
+    from .cache import LRUCache
+
+    with _lock:
+        if _profiles is None:
+            _profiles = LRUCache(max_size=get_settings().TRACING_PROFILE_MAX_STORED)
+
+    return _profiles
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware: traces each request, adds a Server-Timing header,
+    exports the trace and, when the X-Profile header is set and profiling is
+    enabled, attaches a sampled profile that can be fetched by its X-Profile-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+        settings = get_settings()
+        self.enabled = settings.TRACING_ENABLED
+        self.profiling_enabled = settings.TRACING_PROFILING_ENABLED
+        self.profile_interval = settings.TRACING_PROFILE_INTERVAL_MS / 1000
+
+    def get_trace_id(self, headers: dict):
+        # W3C traceparent: version-traceid-parentid-flags
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1").split("-")
+        if len(traceparent) == 4 and len(traceparent[1]) == 32:
+            return traceparent[1]
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        trace = Trace(trace_id=self.get_trace_id(headers))
+        trace_token = current_trace.set(trace)
+
+        profiler = None
+        if self.profiling_enabled and headers.get(b"x-profile"):
+            profiler = SamplingProfiler(trace=trace, interval=self.profile_interval)
+            profiler.start()
+
+        request_span = trace.start_span(name="total", attributes={
+            "http.method": scope["method"], "http.target": scope["path"],
+        })
+        request_span.kind = 2
+        span_token = current_span.set(request_span)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                trace.finish_span(request_span)
+
+                response_headers = list(message.get("headers", []))
+                response_headers.append((b"server-timing", trace.get_server_timing().encode("latin-1")))
+                response_headers.append((b"x-trace-id", trace.trace_id.encode("latin-1")))
+
+                if profiler:
+                    get_profiles().put(trace.trace_id, profiler.stop())
+                    response_headers.append((b"x-profile-id", trace.trace_id.encode("latin-1")))
+
+                message = { **message, "headers": response_headers }
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if request_span.end_ns is None:
+                trace.finish_span(request_span)
+            if profiler and not profiler.stopped.is_set():
+                profiler.stop()
+
+            current_span.reset(span_token)
+            current_trace.reset(trace_token)
+
+            exporter = get_exporter()
+            if exporter:
+                exporter.export(trace)
@@ -1,24 +1,80 @@
+import time
+IMPORT_STARTED_AT = time.perf_counter()
+
 from fastapi import FastAPI
-from routes import base, data, nlp
+from fastapi.concurrency import run_in_threadpool
+from routes import base, data, nlp, metrics, debug, health
+from routes.health import ReadinessMiddleware
 from helpers.config import get_settings
+from helpers.metrics import RequestMetricsMiddleware, track_startup, startup_phase_seconds, app_ready
+from helpers.database import create_db_engine, create_db_client, warm_db_engine
+from helpers.tracing import TracingMiddleware
 from stores.llm.LLMProviderFactory import LLMProviderFactory
+from stores.llm.GenerationHedger import GenerationHedger
+from stores.llm.EmbeddingBatcher import EmbeddingBatcher
 from stores.vectordb.VectorDBProviderFactory import VectorDBProviderFactory
 from stores.llm.templates.template_parser import TemplateParser
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from stores.session.SessionStore import SessionStore
+from models.ChatSessionModel import ChatSessionModel
+from models.ChunkModel import ChunkModel
+from models.CompressionDictionaryModel import CompressionDictionaryModel
+from stores.vectordb.ChunkHydrator import ChunkHydrator
+from helpers import concurrency
+from helpers.compression import get_text_compressor
+from models.db_schemes import CompressedText
+from stores.llm.LLMEnums import DocumentTypeEnum
+from stores.llm.LLMTokenizer import get_tokenizer
+from controllers import NLPController
+import logging
+import asyncio
+import math
+
+logger = logging.getLogger('uvicorn.error')
 
 app = FastAPI()
+# phase -> seconds, reported by /health/ready
+app.startup_profile = { "import": round(time.perf_counter() - IMPORT_STARTED_AT, 4) }
+startup_phase_seconds.labels(phase="import").set(app.startup_profile["import"])
+app.ready = False
+app.warmup_error = None
+app.warmup_task = None
+# innermost, the 503s sent while warming up are still counted and traced
+app.add_middleware(ReadinessMiddleware, retry_after=math.ceil(get_settings().WARMUP_RETRY_INTERVAL))
+app.add_middleware(RequestMetricsMiddleware)
+# outermost, so the request span covers the metrics middleware too
+app.add_middleware(TracingMiddleware)
 
 async def startup_span():
     settings = get_settings()
+    concurrency.set_event_loop(asyncio.get_running_loop())
 
-    postgres_conn = f"postgresql+asyncpg://{settings.POSTGRES_USERNAME}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_MAIN_DATABASE}"
+    # chunk text columns are (de)compressed with it
+    CompressedText.compressor = get_text_compressor()
+
+    with track_startup("db_engines", app.startup_profile):
+        create_db_engines(settings)
+
+    with track_startup("clients", app.startup_profile):
+        await create_clients(settings)
+
+    # connections and collections are loaded in the background, see /health/ready
+    app.warmup_task = asyncio.create_task(warmup_span())
+
+
+def create_db_engines(settings):
+    app.db_engine = create_db_engine(settings)
+    app.db_client = create_db_client(app.db_engine)
+
+    # read-only model methods go to the replica when one is configured
+    app.db_read_engine = None
+    app.db_read_client = app.db_client
+    if settings.POSTGRES_READ_HOST:
+        app.db_read_engine = create_db_engine(settings, host=settings.POSTGRES_READ_HOST,
+                                              port=settings.POSTGRES_READ_PORT, pool_name="replica")
+        app.db_read_client = create_db_client(app.db_read_engine)
 
-    app.db_engine = create_async_engine(postgres_conn)
-    app.db_client = sessionmaker(
-        app.db_engine, class_=AsyncSession, expire_on_commit=False
-    )
 
+async def create_clients(settings):
     llm_provider_factory = LLMProviderFactory(settings)
     vectordb_provider_factory = VectorDBProviderFactory(settings)
 
@@ -26,25 +82,137 @@ async def startup_span():
     app.generation_client = llm_provider_factory.create(provider=settings.GENERATION_BACKEND)
     app.generation_client.set_generation_model(model_id = settings.GENERATION_MODEL_ID)
 
+    # hedged generation (optional second backend)
+    app.generation_hedger = None
+    if settings.GENERATION_HEDGE_ENABLED:
+        hedge_client = None
+        if settings.GENERATION_HEDGE_BACKEND:
+            hedge_client = llm_provider_factory.create(provider=settings.GENERATION_HEDGE_BACKEND)
+            hedge_client.set_generation_model(
+                model_id=settings.GENERATION_HEDGE_MODEL_ID or settings.GENERATION_MODEL_ID
+            )
+
+        app.generation_hedger = GenerationHedger(
+            primary_client=app.generation_client,
+            secondary_client=hedge_client,
+            percentile=settings.GENERATION_HEDGE_PERCENTILE,
+            min_samples=settings.GENERATION_HEDGE_MIN_SAMPLES,
+            default_delay=settings.GENERATION_HEDGE_DEFAULT_DELAY,
+        )
+
     # embedding client
     app.embedding_client = llm_provider_factory.create(provider=settings.EMBEDDING_BACKEND)
     app.embedding_client.set_embedding_model(model_id=settings.EMBEDDING_MODEL_ID,
                                              embedding_size=settings.EMBEDDING_MODEL_SIZE)
+
+    if settings.EMBEDDING_BATCH_ENABLED:
+        app.embedding_client = EmbeddingBatcher(
+            embedding_client=app.embedding_client,
+            max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+            max_concurrency=settings.EMBEDDING_BATCH_MAX_CONCURRENCY,
+            timeout=settings.EMBEDDING_BATCH_TIMEOUT,
+        )
     
-    # vector db client
+    # vector db client, connected by warmup_span
     app.vectordb_client = vectordb_provider_factory.create(
         provider=settings.VECTOR_DB_BACKEND
     )
-    app.vectordb_client.connect()
+
+    app.chunk_hydrator = ChunkHydrator(
+        chunk_model=await ChunkModel.create_instance(db_client=app.db_client),
+        cache_size=settings.CHUNK_TEXT_CACHE_SIZE,
+    )
 
     app.template_parser = TemplateParser(
         language=settings.PRIMARY_LANG,
         default_language=settings.DEFAULT_LANG,
     )
 
+    # chat sessions (optional Postgres write-behind)
+    session_model = None
+    if settings.SESSION_STORE_PERSISTENCE:
+        session_model = await ChatSessionModel.create_instance(db_client=app.db_client)
+
+    app.session_store = SessionStore(
+        max_sessions=settings.SESSION_STORE_MAX_SESSIONS,
+        max_messages=NLPController.MAX_CHAT_HISTORY_MESSAGES,
+        ttl_seconds=settings.SESSION_STORE_TTL_SECONDS,
+        session_model=session_model,
+        # other workers / replicas change the same sessions
+        write_through=settings.SESSION_STORE_WRITE_THROUGH or settings.APP_WORKERS > 1,
+    )
+
+    app.session_flush_task = None
+    if session_model:
+        app.session_flush_task = asyncio.create_task(
+            app.session_store.run_write_behind(interval=settings.SESSION_STORE_FLUSH_INTERVAL)
+        )
+
+    # zstd dictionaries, loaded by warmup_span and refreshed from Postgres
+    app.dictionary_model = await CompressionDictionaryModel.create_instance(db_client=app.db_client)
+    app.dictionary_refresh_task = asyncio.create_task(
+        CompressedText.compressor.run_refresh(dictionary_model=app.dictionary_model,
+                                              interval=settings.CHUNK_TEXT_DICTIONARY_REFRESH_INTERVAL)
+    )
+
+
+async def warmup_span():
+    """Makes the app ready: vector DB connection, DB pools, tokenizers. Retried until it succeeds"""
+
+    settings = get_settings()
+
+    while not app.ready:
+        try:
+            with track_startup("warmup_vectordb", app.startup_profile):
+                # local mode loads every collection when it opens
+                await run_in_threadpool(app.vectordb_client.connect)
+                await run_in_threadpool(app.vectordb_client.warmup)
+
+            with track_startup("warmup_db", app.startup_profile):
+                await warm_db_engine(app.db_engine, connections=settings.POSTGRES_POOL_SIZE)
+                if app.db_read_engine:
+                    await warm_db_engine(app.db_read_engine, connections=settings.POSTGRES_POOL_SIZE)
+                # compressed chunk texts can't be read without them
+                await CompressedText.compressor.load_dictionaries(app.dictionary_model)
+
+            with track_startup("warmup_tokenizers", app.startup_profile):
+                await run_in_threadpool(get_tokenizer, settings.GENERATION_MODEL_ID)
+                await run_in_threadpool(get_tokenizer, settings.EMBEDDING_MODEL_ID)
+
+            if settings.WARMUP_EMBEDDING_ENABLED:
+                # opens the provider's HTTP connections
+                with track_startup("warmup_embedding", app.startup_profile):
+                    await run_in_threadpool(app.embedding_client.embed_text, texts=["warmup"],
+                                            document_type=DocumentTypeEnum.QUERY.value)
+
+            app.ready = True
+            app.warmup_error = None
+            app_ready.set(1)
+            logger.info(f"App ready, startup profile: {app.startup_profile}")
+
+        except Exception as e:
+            app.warmup_error = f"{type(e).__name__}: {e}"
+            logger.error(f"Warmup failed, retrying in {settings.WARMUP_RETRY_INTERVAL}s: {app.warmup_error}")
+            await asyncio.sleep(settings.WARMUP_RETRY_INTERVAL)
+
 
 async def shutdown_span():
-    app.db_engine.dispose()
+    if app.warmup_task:
+        app.warmup_task.cancel()
+
+    if app.session_flush_task:
+        app.session_flush_task.cancel()
+        await app.session_store.flush()
+
+    app.dictionary_refresh_task.cancel()
+
+    if isinstance(app.embedding_client, EmbeddingBatcher):
+        app.embedding_client.close()
+
+    await app.db_engine.dispose()
+    if app.db_read_engine:
+        await app.db_read_engine.dispose()
     # app.vectordb_client.disconnect()
 
 app.on_event("startup")(startup_span)
@@ -54,3 +222,6 @@ app.include_router(base.base_router)
 app.include_router(data.data_router)
 app.include_router(nlp.nlp_router)
 app.include_router(nlp.nlp_router2)
+app.include_router(metrics.metrics_router)
+app.include_router(debug.debug_router)
+app.include_router(health.health_router)
@@ -1,18 +1,18 @@
 from .BaseDataModel import BaseDataModel
 from .db_schemes import Asset
 from .enums.DataBaseEnum import DataBaseEnum
-from bson import ObjectId
 from sqlalchemy.future import select
+from sqlalchemy import update, insert
 
 class AssetModel(BaseDataModel):
 
-    def __init__(self, db_client: object):
-        super().__init__(db_client=db_client)
+    def __init__(self, db_client: object, db_read_client: object = None):
+        super().__init__(db_client=db_client, db_read_client=db_read_client)
         self.db_client = db_client
 
     @classmethod
-    async def create_instance(cls, db_client: object):
-        instance = cls(db_client)
+    async def create_instance(cls, db_client: object, db_read_client: object = None):
+        instance = cls(db_client, db_read_client)
         return instance
 
     async def create_asset(self, asset: Asset):
@@ -24,8 +24,19 @@ class AssetModel(BaseDataModel):
             await session.refresh(asset)
         return asset
 
+    async def insert_many_assets(self, assets: list):
+        """Inserts asset rows (dicts) in one statement, returns the created Assets"""
+
+        async with self.db_client() as session:
+            async with session.begin():
+                # batched into multi-row INSERT .. RETURNING by SQLAlchemy
+                result = await session.scalars(insert(Asset).returning(Asset), assets)
+                records = result.all()
+        return records
+
     async def get_all_project_assets(self, asset_project_id: str, asset_type: str):
 
+        # /process runs right after /upload, a lagging replica would miss the new assets
         async with self.db_client() as session:
             stmt = select(Asset).where(
                 Asset.asset_project_id == asset_project_id,
@@ -37,14 +48,27 @@ class AssetModel(BaseDataModel):
 
     async def get_asset_record(self, asset_project_id: str, asset_id: int):
 
-        async with self.db_client() as session:
-            stmt = select(Asset).where(
-                Asset.asset_project_id == asset_project_id,
-                Asset.asset_id == asset_id
-            )
+        stmt = select(Asset).where(
+            Asset.asset_project_id == asset_project_id,
+            Asset.asset_id == asset_id
+        )
+
+        async with self.db_read_client() as session:
             result = await session.execute(stmt)
             record = result.scalar_one_or_none()
+
+        if record is None and self.db_read_client is not self.db_client:
+            # just uploaded assets may not have reached the replica yet
+            async with self.db_client() as session:
+                result = await session.execute(stmt)
+                record = result.scalar_one_or_none()
+
         return record
 
+    async def update_asset_config(self, asset_id: int, asset_config: dict):
 
-    
+        async with self.db_client() as session:
+            async with session.begin():
+                await session.execute(
+                    update(Asset).where(Asset.asset_id == asset_id).values(asset_config=asset_config)
+                )
@@ -2,6 +2,8 @@ from helpers.config import get_settings, Settings
 
 class BaseDataModel:
 
-    def __init__(self, db_client: object):
+    def __init__(self, db_client: object, db_read_client: object = None):
         self.db_client = db_client
+        # read-only queries that tolerate replica lag, the primary when no replica is set
+        self.db_read_client = db_read_client or db_client
         self.app_settings = get_settings()
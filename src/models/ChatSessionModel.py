@@ -0,0 +1,57 @@
+from .BaseDataModel import BaseDataModel
+from .db_schemes import ChatSession
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import delete, func
+
+class ChatSessionModel(BaseDataModel):
+
+    def __init__(self, db_client: object):
+        super().__init__(db_client=db_client)
+        self.db_client = db_client
+
+    @classmethod
+    async def create_instance(cls, db_client: object):
+        instance = cls(db_client)
+        return instance
+
+    async def get_session(self, session_id: str):
+
+        async with self.db_client() as session:
+            result = await session.execute(
+                select(ChatSession).where(ChatSession.session_id == session_id)
+            )
+            record = result.scalar_one_or_none()
+        return record
+
+    async def upsert_sessions(self, sessions: dict):
+        """sessions: session_id -> session_data"""
+
+        if not sessions:
+            return 0
+
+        stmt = insert(ChatSession).values([
+            { "session_id": session_id, "session_data": session_data }
+            for session_id, session_data in sessions.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ChatSession.session_id],
+            set_={
+                "session_data": stmt.excluded.session_data,
+                "updated_at": func.now(),
+            }
+        )
+
+        async with self.db_client() as session:
+            async with session.begin():
+                await session.execute(stmt)
+        return len(sessions)
+
+    async def delete_expired_sessions(self, updated_before):
+
+        async with self.db_client() as session:
+            async with session.begin():
+                result = await session.execute(
+                    delete(ChatSession).where(ChatSession.updated_at < updated_before)
+                )
+        return result.rowcount
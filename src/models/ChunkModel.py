@@ -1,20 +1,19 @@
 from .BaseDataModel import BaseDataModel
 from .db_schemes import DataChunk
+from .db_schemes.firmy.schemes.compressed_text import ZSTD_MAGIC
 from .enums.DataBaseEnum import DataBaseEnum
-from bson.objectid import ObjectId
-from pymongo import InsertOne
 from sqlalchemy.future import select
-from sqlalchemy import func, delete
+from sqlalchemy import func, delete, update, type_coerce, literal, LargeBinary, or_
 
 class ChunkModel(BaseDataModel):
 
-    def __init__(self, db_client: object):
-        super().__init__(db_client=db_client)
+    def __init__(self, db_client: object, db_read_client: object = None):
+        super().__init__(db_client=db_client, db_read_client=db_read_client)
         self.db_client = db_client
 
     @classmethod
-    async def create_instance(cls, db_client: object):
-        instance = cls(db_client)
+    async def create_instance(cls, db_client: object, db_read_client: object = None):
+        instance = cls(db_client, db_read_client)
         return instance
 
     async def create_chunk(self, chunk: DataChunk):
@@ -43,17 +42,122 @@ class ChunkModel(BaseDataModel):
             await session.commit()
         return len(chunks)
 
-    async def delete_chunks_by_project_id(self, project_id: ObjectId):
+    async def replace_asset_chunks(self, asset_id: int, chunk_batches):
+        """
+        Swaps the chunks of an asset for the ones in chunk_batches (async iterable of
+        lists of DataChunk), in one transaction. Nothing changes when no chunk is produced. Chunks of other
+        assets that duplicated the old ones become canonical again.
+        Returns (inserted count, chunk_ids of the chunks that became canonical).
+        """
+
+        async with self.db_client() as session:
+            old_chunk_uuids = select(DataChunk.chunk_uuid).where(DataChunk.chunk_asset_id == asset_id)
+            result = await session.execute(
+                update(DataChunk).where(
+                    DataChunk.chunk_duplicate_of.in_(old_chunk_uuids),
+                    DataChunk.chunk_asset_id != asset_id,
+                ).values(chunk_duplicate_of=None).returning(DataChunk.chunk_id)
+            )
+            promoted_chunk_ids = result.scalars().all()
+            await session.execute(delete(DataChunk).where(DataChunk.chunk_asset_id == asset_id))
+
+            inserted_count = 0
+            async for batch in chunk_batches:
+                session.add_all(batch)
+                await session.flush()
+                inserted_count += len(batch)
+
+            if inserted_count == 0:
+                await session.rollback()
+                return 0, []
+
+            await session.commit()
+
+        return inserted_count, promoted_chunk_ids
+
+    async def delete_chunks_by_project_id(self, project_id: int):
         async with self.db_client() as session:
             stmt = delete(DataChunk).where(DataChunk.chunk_project_id == project_id)
             result = await session.execute(stmt)
             await session.commit()
         return result.rowcount
     
-    async def get_poject_chunks(self, project_id: ObjectId, page_no: int=1, page_size: int=50):
+    async def get_poject_chunks(self, project_id: int, page_no: int=1, page_size: int=50,
+                                exclude_duplicates: bool=False):
+        # pushes run right after /process, a lagging replica would give a partial index
         async with self.db_client() as session:
-            stmt = select(DataChunk).where(DataChunk.chunk_project_id == project_id).offset((page_no - 1) * page_size).limit(page_size)
+            stmt = select(DataChunk).where(DataChunk.chunk_project_id == project_id)
+            if exclude_duplicates:
+                stmt = stmt.where(DataChunk.chunk_duplicate_of.is_(None))
+            stmt = stmt.order_by(DataChunk.chunk_id).offset((page_no - 1) * page_size).limit(page_size)
             result = await session.execute(stmt)
             records = result.scalars().all()
         return records
 
+    async def get_canonical_chunks(self, asset_ids: list = None, chunk_ids: list = None,
+                                   after_chunk_id: int = 0, batch_size: int = 500):
+        """Indexable (non duplicate) chunks of the given assets or chunk ids, by chunk_id"""
+        async with self.db_client() as session:
+            stmt = select(DataChunk).where(
+                or_(DataChunk.chunk_asset_id.in_(asset_ids or []), DataChunk.chunk_id.in_(chunk_ids or [])),
+                DataChunk.chunk_duplicate_of.is_(None),
+                DataChunk.chunk_id > after_chunk_id,
+            ).order_by(DataChunk.chunk_id).limit(batch_size)
+            result = await session.execute(stmt)
+            records = result.scalars().all()
+        return records
+
+    async def get_project_chunk_signatures(self, project_id: int, exclude_asset_ids: list = None):
+        """(chunk_uuid, fingerprint, minhash) of the canonical chunks of a project"""
+        async with self.db_client() as session:
+            stmt = select(
+                DataChunk.chunk_uuid, DataChunk.chunk_fingerprint, DataChunk.chunk_minhash
+            ).where(
+                DataChunk.chunk_project_id == project_id,
+                DataChunk.chunk_duplicate_of.is_(None),
+                DataChunk.chunk_fingerprint.is_not(None),
+            )
+            if exclude_asset_ids:
+                stmt = stmt.where(DataChunk.chunk_asset_id.not_in(exclude_asset_ids))
+            result = await session.execute(stmt)
+            records = result.all()
+        return records
+
+    async def get_chunks_texts(self, chunk_ids: list) -> dict:
+        """chunk_id -> chunk_text, in one query"""
+        async with self.db_client() as session:
+            stmt = select(DataChunk.chunk_id, DataChunk.chunk_text).where(DataChunk.chunk_id.in_(chunk_ids))
+            result = await session.execute(stmt)
+            records = result.all()
+        return { chunk_id: chunk_text for chunk_id, chunk_text in records }
+
+    async def sample_chunks_texts(self, sample_size: int) -> list:
+        """Random chunk texts, to train the compression dictionary on"""
+        async with self.db_client() as session:
+            stmt = select(DataChunk.chunk_text).order_by(func.random()).limit(sample_size)
+            result = await session.execute(stmt)
+            records = result.scalars().all()
+        return records
+
+    async def get_chunks_texts_batch(self, after_chunk_id: int = 0, batch_size: int = 1000,
+                                     compressed: bool = False) -> list:
+        """(chunk_id, chunk_text) of rows stored compressed or as plain UTF-8, by chunk_id"""
+        is_compressed = func.substring(type_coerce(DataChunk.chunk_text, LargeBinary), 1, 4) == literal(ZSTD_MAGIC, LargeBinary)
+        async with self.db_client() as session:
+            stmt = select(DataChunk.chunk_id, DataChunk.chunk_text).where(
+                DataChunk.chunk_id > after_chunk_id,
+                is_compressed if compressed else ~is_compressed,
+            ).order_by(DataChunk.chunk_id).limit(batch_size)
+            result = await session.execute(stmt)
+            records = result.all()
+        return records
+
+    async def update_chunks_texts(self, texts: dict) -> int:
+        """Rewrites chunk_id -> chunk_text, compressed by the column type"""
+        async with self.db_client() as session:
+            async with session.begin():
+                for chunk_id, chunk_text in texts.items():
+                    await session.execute(
+                        update(DataChunk).where(DataChunk.chunk_id == chunk_id).values(chunk_text=chunk_text)
+                    )
+        return len(texts)
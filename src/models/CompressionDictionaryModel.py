@@ -0,0 +1,46 @@
+from .BaseDataModel import BaseDataModel
+from .db_schemes import CompressionDictionary
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
+
+class CompressionDictionaryModel(BaseDataModel):
+
+    def __init__(self, db_client: object):
+        super().__init__(db_client=db_client)
+        self.db_client = db_client
+
+    @classmethod
+    async def create_instance(cls, db_client: object):
+        instance = cls(db_client)
+        return instance
+
+    async def get_dictionary_ids(self):
+        """Ids of the stored dictionaries, oldest first"""
+
+        async with self.db_client() as session:
+            result = await session.execute(
+                select(CompressionDictionary.dict_id).order_by(CompressionDictionary.created_at,
+                                                               CompressionDictionary.dict_id)
+            )
+            dictionary_ids = result.scalars().all()
+        return dictionary_ids
+
+    async def get_dictionary(self, dict_id: int):
+
+        async with self.db_client() as session:
+            result = await session.execute(
+                select(CompressionDictionary).where(CompressionDictionary.dict_id == dict_id)
+            )
+            record = result.scalar_one_or_none()
+        return record
+
+    async def insert_dictionary(self, dict_id: int, dict_data: bytes):
+        """Stores a dictionary, a dict_id already stored is left as it is"""
+
+        stmt = insert(CompressionDictionary).values(dict_id=dict_id, dict_data=dict_data)
+        stmt = stmt.on_conflict_do_nothing(index_elements=[CompressionDictionary.dict_id])
+
+        async with self.db_client() as session:
+            async with session.begin():
+                await session.execute(stmt)
+        return dict_id
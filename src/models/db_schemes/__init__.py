@@ -1 +1,2 @@
-from models.db_schemes.firmy.schemes import Project, DataChunk, Asset, RetrievedDocument
+from models.db_schemes.firmy.schemes import Project, DataChunk, Asset, RetrievedDocument, ChatSession, CompressedText, \
+    CompressionDictionary
@@ -0,0 +1,36 @@
+"""Add chat sessions
+
+Revision ID: 7d2f4c1a9b3e
+Revises: 559c5e4b16ab
+Create Date: 2026-10-19 10:12:31.418204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2f4c1a9b3e'
+down_revision: Union[str, None] = '559c5e4b16ab'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'chat_sessions',
+        sa.Column('session_id', sa.String(), nullable=False),
+        sa.Column('session_data', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('session_id')
+    )
+    op.create_index('ix_chat_session_updated_at', 'chat_sessions', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_session_updated_at', table_name='chat_sessions')
+    op.drop_table('chat_sessions')
@@ -0,0 +1,33 @@
+"""Add chunk fingerprints
+
+Revision ID: a41c9e2d7f60
+Revises: 7d2f4c1a9b3e
+Create Date: 2026-10-19 14:03:52.661907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c9e2d7f60'
+down_revision: Union[str, None] = '7d2f4c1a9b3e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chunks', sa.Column('chunk_fingerprint', sa.String(length=40), nullable=True))
+    op.add_column('chunks', sa.Column('chunk_minhash', sa.LargeBinary(), nullable=True))
+    op.add_column('chunks', sa.Column('chunk_duplicate_of', postgresql.UUID(as_uuid=True), nullable=True))
+    op.create_index('ix_chunk_project_fingerprint', 'chunks', ['chunk_project_id', 'chunk_fingerprint'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chunk_project_fingerprint', table_name='chunks')
+    op.drop_column('chunks', 'chunk_duplicate_of')
+    op.drop_column('chunks', 'chunk_minhash')
+    op.drop_column('chunks', 'chunk_fingerprint')
@@ -0,0 +1,41 @@
+"""Store chunk text as bytes
+
+Revision ID: c3e8b52f1d94
+Revises: a41c9e2d7f60
+Create Date: 2026-10-19 16:21:07.318450
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8b52f1d94'
+down_revision: Union[str, None] = 'a41c9e2d7f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # existing rows become plain UTF-8 bytes, which stay readable;
+    # src/scripts/compress_chunks.py compresses them afterwards
+    op.alter_column('chunks', 'chunk_text',
+                    existing_type=sa.String(),
+                    type_=sa.LargeBinary(),
+                    existing_nullable=False,
+                    postgresql_using="convert_to(chunk_text, 'UTF8')")
+    # zstd frames don't compress any further, skip pglz on TOAST
+    op.execute("ALTER TABLE chunks ALTER COLUMN chunk_text SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    # compressed rows must be decompressed (CHUNK_TEXT_COMPRESSION_ENABLED=False and
+    # scripts/compress_chunks.py --decompress) before downgrading
+    op.execute("ALTER TABLE chunks ALTER COLUMN chunk_text SET STORAGE EXTENDED")
+    op.alter_column('chunks', 'chunk_text',
+                    existing_type=sa.LargeBinary(),
+                    type_=sa.String(),
+                    existing_nullable=False,
+                    postgresql_using="convert_from(chunk_text, 'UTF8')")
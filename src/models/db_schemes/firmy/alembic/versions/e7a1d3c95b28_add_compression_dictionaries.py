@@ -0,0 +1,34 @@
+"""Add compression dictionaries
+
+Revision ID: e7a1d3c95b28
+Revises: c3e8b52f1d94
+Create Date: 2026-10-19 18:04:52.731906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a1d3c95b28'
+down_revision: Union[str, None] = 'c3e8b52f1d94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # dictionaries trained before this revision live in CHUNK_TEXT_DICTIONARY_DIR,
+    # src/scripts/compress_chunks.py --import-dictionaries copies them here
+    op.create_table(
+        'compression_dictionaries',
+        sa.Column('dict_id', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('dict_data', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('dict_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('compression_dictionaries')
@@ -2,3 +2,6 @@ from .minirag_base import SQLAlchemyBase
 from .asset import Asset
 from .project import Project
 from .datachunk import DataChunk, RetrievedDocument
+from .chat_session import ChatSession
+from .compressed_text import CompressedText
+from .compression_dictionary import CompressionDictionary
@@ -0,0 +1,18 @@
+from .minirag_base import SQLAlchemyBase
+from sqlalchemy import Column, DateTime, func, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Index
+
+class ChatSession(SQLAlchemyBase):
+
+    __tablename__ = "chat_sessions"
+
+    session_id = Column(String, primary_key=True)
+    session_data = Column(JSONB, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_chat_session_updated_at', updated_at),
+    )
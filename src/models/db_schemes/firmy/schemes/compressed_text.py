@@ -0,0 +1,39 @@
+from sqlalchemy.types import TypeDecorator, LargeBinary
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+class CompressedText(TypeDecorator):
+    """
+    Text stored as zstd frames (bytea). Rows are decompressed only when they are
+    selected, and plain UTF-8 rows (written before compression was enabled) are
+    read as they are. The compressor is set at app startup, see
+    helpers.compression; without it (e.g. under alembic) text is stored uncompressed.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    compressor = None
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+
+        compressor = CompressedText.compressor
+        if compressor is not None and compressor.enabled:
+            return compressor.compress(value)
+
+        return value.encode("utf-8")
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+
+        value = bytes(value)
+        if value[:4] != ZSTD_MAGIC:
+            return value.decode("utf-8")
+
+        if CompressedText.compressor is None:
+            raise ValueError("Compressed text read before a compressor was configured")
+
+        return CompressedText.compressor.decompress(value)
@@ -0,0 +1,12 @@
+from .minirag_base import SQLAlchemyBase
+from sqlalchemy import Column, BigInteger, DateTime, func, LargeBinary
+
+class CompressionDictionary(SQLAlchemyBase):
+
+    __tablename__ = "compression_dictionaries"
+
+    # zstd dict_id, recorded in every frame written with the dictionary
+    dict_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    dict_data = Column(LargeBinary, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
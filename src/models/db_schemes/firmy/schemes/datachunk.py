@@ -1,9 +1,11 @@
 from .minirag_base import SQLAlchemyBase
-from sqlalchemy import Column, Integer, DateTime, func, String, ForeignKey
+from .compressed_text import CompressedText
+from sqlalchemy import Column, Integer, DateTime, func, String, ForeignKey, LargeBinary
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy import Index
 from pydantic import BaseModel
+from typing import Optional
 import uuid
 
 class DataChunk(SQLAlchemyBase):
@@ -13,10 +15,17 @@ class DataChunk(SQLAlchemyBase):
     chunk_id = Column(Integer, primary_key=True, autoincrement=True)
     chunk_uuid = Column(UUID(as_uuid=True), default=uuid.uuid4, unique=True, nullable=False)
 
-    chunk_text = Column(String, nullable=False)
+    # zstd frames when CHUNK_TEXT_COMPRESSION_ENABLED, plain UTF-8 otherwise
+    chunk_text = Column(CompressedText, nullable=False)
     chunk_metadata = Column(JSONB, nullable=True)
     chunk_order = Column(Integer, nullable=False)
 
+    # near-duplicate detection: normalized text hash, MinHash signature (uint32s)
+    # and the chunk_uuid of the canonical chunk this one duplicates
+    chunk_fingerprint = Column(String(40), nullable=True)
+    chunk_minhash = Column(LargeBinary, nullable=True)
+    chunk_duplicate_of = Column(UUID(as_uuid=True), nullable=True)
+
     chunk_project_id = Column(Integer, ForeignKey("projects.project_id"), nullable=False)
     chunk_asset_id = Column(Integer, ForeignKey("assets.asset_id"), nullable=False)
 
@@ -29,11 +38,15 @@ class DataChunk(SQLAlchemyBase):
     __table_args__ = (
         Index('ix_chunk_project_id', chunk_project_id),
         Index('ix_chunk_asset_id', chunk_asset_id),
+        Index('ix_chunk_project_fingerprint', chunk_project_id, chunk_fingerprint),
     )
 
 class RetrievedDocument(BaseModel):
     text: str
     score: float
+    chunk_id: Optional[int] = None
+    asset_id: Optional[int] = None
+    chunk_order: Optional[int] = None
 
 
 
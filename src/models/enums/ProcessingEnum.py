@@ -4,3 +4,13 @@ class ProcessingEnum(Enum):
 
     TXT = ".txt"
     PDF = ".pdf"
+
+class ChunkerEnum(Enum):
+
+    LEGAL = "legal"
+    RECURSIVE = "recursive"
+
+class ChunkUnitEnum(Enum):
+
+    CHARS = "chars"
+    TOKENS = "tokens"
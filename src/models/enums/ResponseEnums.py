@@ -7,6 +7,17 @@ class ResponseSignal(Enum):
     FILE_SIZE_EXCEEDED = "file_size_exceeded"
     FILE_UPLOAD_SUCCESS = "file_upload_success"
     FILE_UPLOAD_FAILED = "file_upload_failed"
+    ARCHIVE_INVALID = "archive_invalid"
+    BULK_UPLOAD_FILES_EXCEEDED = "bulk_upload_files_exceeded"
+    UPLOAD_CREATED = "upload_created"
+    UPLOAD_NOT_FOUND = "upload_not_found"
+    UPLOAD_STATUS_SUCCESS = "upload_status_success"
+    UPLOAD_RANGE_INVALID = "upload_range_invalid"
+    UPLOAD_PART_SUCCESS = "upload_part_success"
+    UPLOAD_INCOMPLETE = "upload_incomplete"
+    UPLOAD_CHECKSUM_MISMATCH = "upload_checksum_mismatch"
+    UPLOAD_CHECKSUM_INVALID = "upload_checksum_invalid"
+    UPLOAD_DELETED = "upload_deleted"
     PROCESSING_SUCCESS = "processing_success"
     PROCESSING_FAILED = "processing_failed"
     NO_FILES_ERROR = "not_found_files"
@@ -17,9 +28,14 @@ class ResponseSignal(Enum):
     VECTORDB_COLLECTION_RETRIEVED = "vectordb_collection_retrieved"
     VECTORDB_SEARCH_ERROR = "vectordb_search_error"
     VECTORDB_SEARCH_SUCCESS = "vectordb_search_success"
+    VECTORDB_COMPACT_ERROR = "vectordb_compact_error"
+    VECTORDB_COMPACT_SUCCESS = "vectordb_compact_success"
+    VECTORDB_EVAL_ERROR = "vectordb_eval_error"
+    VECTORDB_EVAL_SUCCESS = "vectordb_eval_success"
     RAG_ANSWER_ERROR = "rag_answer_error"
     RAG_ANSWER_SUCCESS = "rag_answer_success"
     CHAT_RAG_ANSWER_SUCCESS = "chat_rag_answer_success"
     QUERY_REWRITE_ERROR = "query_rewrite_error"
     ENTITY_EXTRACTION_ERROR = "entity_extraction_error"
+    PROFILE_NOT_FOUND = "profile_not_found"
     
\ No newline at end of file
@@ -1,12 +1,17 @@
-from fastapi import FastAPI, APIRouter, Depends, UploadFile, status, Request
+from fastapi import FastAPI, APIRouter, Depends, UploadFile, status, Request, File, Form, BackgroundTasks
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from typing import List
+import asyncio
+import json
 import os
 from helpers.config import get_settings, Settings
-from controllers import DataController, ProjectController, ProcessController
+from controllers import DataController, ProjectController, ProcessController, UploadController, NLPController
 import aiofiles
+import hashlib
 from models import ResponseSignal
 import logging
-from .schemes.data import ProcessRequest
+from .schemes.data import ProcessRequest, CreateUploadRequest, FinalizeUploadRequest
 from models.ProjectModel import ProjectModel
 from models.ChunkModel import ChunkModel
 from models.AssetModel import AssetModel
@@ -52,9 +57,11 @@ async def upload_data(request: Request, project_id: int, file: UploadFile,
         project_id=project_id
     )
 
+    digest = hashlib.sha256()
     try:
         async with aiofiles.open(file_path, "wb") as f:
             while chunk := await file.read(app_settings.FILE_DEFAULT_CHUNK_SIZE):
+                digest.update(chunk)
                 await f.write(chunk)
     except Exception as e:
 
@@ -76,7 +83,8 @@ async def upload_data(request: Request, project_id: int, file: UploadFile,
         asset_project_id=project.project_id,
         asset_type=AssetTypeEnum.FILE.value,
         asset_name=file_id,
-        asset_size=os.path.getsize(file_path)
+        asset_size=os.path.getsize(file_path),
+        asset_config={ "digest": digest.hexdigest() },
     )
 
     asset_record = await asset_model.create_asset(asset=asset_resource)
@@ -88,12 +96,366 @@ async def upload_data(request: Request, project_id: int, file: UploadFile,
             }
         )
 
-@data_router.post("/process/{project_id}")
-async def process_endpoint(request: Request, project_id: int, process_request: ProcessRequest):
+@data_router.post("/upload-bulk/{project_id}")
+async def upload_bulk_endpoint(request: Request, project_id: int, background_tasks: BackgroundTasks,
+                               files: List[UploadFile] = File(...),
+                               process: int = Form(0), chunk_size: int = Form(100), overlap_size: int = Form(20),
+                               app_settings: Settings = Depends(get_settings)):
+    """
+    Many documents in one request: plain files and / or ZIP / TAR archives.
+    Archive entries are extracted one at a time, written concurrently and
+    registered with a single insert. process=1 chunks them after the response.
+
+    Entries are not extracted while the body is still arriving: Starlette spools
+    the whole multipart body to temporary files before this handler runs (and
+    ZIP needs its central directory, at the end, anyway), so an archive needs
+    its full size in temp space first. Only one entry is held in memory at a time.
+    """
 
-    chunk_size = process_request.chunk_size
-    overlap_size = process_request.overlap_size
-    do_reset = process_request.do_reset
+    project_model = await ProjectModel.create_instance(
+        db_client=request.app.db_client
+    )
+
+    project = await project_model.get_project_or_create_one(
+        project_id=project_id
+    )
+
+    data_controller = DataController()
+
+    # bounds the entries held in memory while they are being written
+    semaphore = asyncio.Semaphore(app_settings.BULK_UPLOAD_CONCURRENCY)
+
+    async def write_entry(file_path: str, content: bytes):
+        try:
+            async with aiofiles.open(file_path, "wb") as f:
+                await f.write(content)
+        finally:
+            semaphore.release()
+
+    write_tasks = []
+    file_paths = []
+    assets = []
+    rejected_files = []
+    files_exceeded = False
+
+    for file in files:
+        entries = data_controller.iter_upload_entries(file=file)
+
+        while True:
+            await semaphore.acquire()
+            entry = await run_in_threadpool(next, entries, None)
+
+            if entry is None:
+                semaphore.release()
+                break
+
+            file_name, content, digest, signal = entry
+            if content is None:
+                semaphore.release()
+                rejected_files.append({ "file_name": file_name, "signal": signal })
+                continue
+
+            if len(assets) >= app_settings.BULK_UPLOAD_MAX_FILES:
+                semaphore.release()
+                files_exceeded = True
+                break
+
+            file_path, file_id = data_controller.generate_unique_filepath(
+                orig_file_name=file_name,
+                project_id=project_id
+            )
+
+            write_tasks.append(asyncio.create_task(write_entry(file_path=file_path, content=content)))
+            file_paths.append(file_path)
+            assets.append({
+                "asset_project_id": project.project_id,
+                "asset_type": AssetTypeEnum.FILE.value,
+                "asset_name": file_id,
+                "asset_size": len(content),
+                "asset_config": { "digest": digest },
+            })
+
+        if files_exceeded:
+            break
+
+    write_results = await asyncio.gather(*write_tasks, return_exceptions=True)
+    write_errors = [ result for result in write_results if isinstance(result, Exception) ]
+
+    if files_exceeded or write_errors:
+        if write_errors:
+            logger.error(f"Error while uploading files: {write_errors[0]}")
+        remove_files(file_paths)
+
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "signal": ResponseSignal.BULK_UPLOAD_FILES_EXCEEDED.value if files_exceeded
+                                else ResponseSignal.FILE_UPLOAD_FAILED.value,
+            }
+        )
+
+    if len(assets) == 0:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "signal": ResponseSignal.NO_FILES_ERROR.value,
+                "rejected_files": rejected_files,
+            }
+        )
+
+    # store the assets into the database
+    asset_model = await AssetModel.create_instance(
+        db_client=request.app.db_client
+    )
+
+    try:
+        asset_records = await asset_model.insert_many_assets(assets=assets)
+    except Exception as e:
+        logger.error(f"Error while storing uploaded assets: {e}")
+        remove_files(file_paths)
+
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "signal": ResponseSignal.FILE_UPLOAD_FAILED.value
+            }
+        )
+
+    if process == 1:
+        background_tasks.add_task(
+            process_in_background,
+            app=request.app,
+            project=project,
+            project_assets=asset_records,
+            process_request=ProcessRequest(chunk_size=chunk_size, overlap_size=overlap_size),
+            app_settings=app_settings,
+        )
+
+    return JSONResponse(
+            content={
+                "signal": ResponseSignal.FILE_UPLOAD_SUCCESS.value,
+                "file_ids": [ asset.asset_id for asset in asset_records ],
+                "uploaded_files": len(asset_records),
+                "rejected_files": rejected_files,
+                "processing": process == 1,
+            }
+        )
+
+@data_router.post("/upload-sessions/{project_id}")
+async def create_upload_endpoint(request: Request, project_id: int, upload_request: CreateUploadRequest,
+                                 app_settings: Settings = Depends(get_settings)):
+    """
+    Starts a resumable upload. Parts are then sent with
+    PATCH /upload-sessions/{project_id}/{upload_id} and a
+    "Content-Range: bytes start-end/total" header, in any order and in parallel,
+    and the file becomes an asset on POST .../{upload_id}/finalize, once it
+    matches the sha256 given here.
+    """
+
+    upload_controller = UploadController()
+
+    is_valid, result_signal = upload_controller.validate_upload(
+        file_name=upload_request.file_name,
+        file_size=upload_request.file_size,
+        sha256=upload_request.sha256,
+    )
+
+    if not is_valid:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "signal": result_signal
+            }
+        )
+
+    # abandoned uploads hold their full file size on disk
+    await run_in_threadpool(upload_controller.delete_expired_uploads)
+
+    upload_id = await run_in_threadpool(
+        upload_controller.create_upload,
+        project_id=project_id,
+        file_name=upload_request.file_name,
+        file_size=upload_request.file_size,
+        sha256=upload_request.sha256,
+    )
+
+    return JSONResponse(
+            content={
+                "signal": ResponseSignal.UPLOAD_CREATED.value,
+                "upload_id": upload_id,
+                "part_size": app_settings.RESUMABLE_UPLOAD_PART_SIZE * upload_controller.size_scale,
+            }
+        )
+
+@data_router.get("/upload-sessions/{project_id}/{upload_id}")
+async def upload_status_endpoint(request: Request, project_id: int, upload_id: str):
+
+    upload_controller = UploadController()
+
+    upload_state = await run_in_threadpool(upload_controller.get_upload_state,
+                                           project_id=project_id, upload_id=upload_id)
+    if upload_state is None:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={
+                "signal": ResponseSignal.UPLOAD_NOT_FOUND.value
+            }
+        )
+
+    received_ranges = await run_in_threadpool(upload_controller.get_received_ranges,
+                                              project_id=project_id, upload_id=upload_id)
+
+    return JSONResponse(
+            content={
+                "signal": ResponseSignal.UPLOAD_STATUS_SUCCESS.value,
+                "file_name": upload_state["file_name"],
+                "file_size": upload_state["file_size"],
+                "received_ranges": received_ranges,
+                "missing_ranges": upload_controller.get_missing_ranges(
+                    ranges=received_ranges, file_size=upload_state["file_size"]
+                ),
+            }
+        )
+
+@data_router.patch("/upload-sessions/{project_id}/{upload_id}")
+async def upload_part_endpoint(request: Request, project_id: int, upload_id: str):
+
+    upload_controller = UploadController()
+
+    upload_state = await run_in_threadpool(upload_controller.get_upload_state,
+                                           project_id=project_id, upload_id=upload_id)
+    if upload_state is None:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={
+                "signal": ResponseSignal.UPLOAD_NOT_FOUND.value
+            }
+        )
+
+    part_range = upload_controller.parse_content_range(
+        content_range=request.headers.get("content-range"),
+        file_size=upload_state["file_size"],
+    )
+
+    if part_range is None:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "signal": ResponseSignal.UPLOAD_RANGE_INVALID.value
+            }
+        )
+
+    start, end = part_range
+    tmp_path = upload_controller.get_part_tmp_path(project_id=project_id, upload_id=upload_id,
+                                                   start=start, end=end)
+
+    # the part only counts, and replaces an earlier copy of the range, once it arrived in full
+    received = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > end - start:
+                    break
+                await f.write(chunk)
+    except Exception as e:
+
+        logger.error(f"Error while receiving upload part: {e}")
+        await run_in_threadpool(upload_controller.remove_part_tmp, tmp_path=tmp_path)
+
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "signal": ResponseSignal.FILE_UPLOAD_FAILED.value
+            }
+        )
+
+    if received != end - start:
+        await run_in_threadpool(upload_controller.remove_part_tmp, tmp_path=tmp_path)
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "signal": ResponseSignal.UPLOAD_RANGE_INVALID.value,
+                "received": received,
+            }
+        )
+
+    try:
+        await run_in_threadpool(upload_controller.record_part, project_id=project_id, upload_id=upload_id,
+                                start=start, end=end, tmp_path=tmp_path)
+    except FileNotFoundError:
+        # finalized or deleted meanwhile
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={
+                "signal": ResponseSignal.UPLOAD_NOT_FOUND.value
+            }
+        )
+
+    return JSONResponse(
+            content={
+                "signal": ResponseSignal.UPLOAD_PART_SUCCESS.value,
+                "range": [start, end],
+            }
+        )
+
+@data_router.post("/upload-sessions/{project_id}/{upload_id}/finalize")
+async def finalize_upload_endpoint(request: Request, project_id: int, upload_id: str,
+                                   finalize_request: FinalizeUploadRequest = None):
+
+    upload_controller = UploadController()
+
+    upload_state = await run_in_threadpool(upload_controller.get_upload_state,
+                                           project_id=project_id, upload_id=upload_id)
+    if upload_state is None:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={
+                "signal": ResponseSignal.UPLOAD_NOT_FOUND.value
+            }
+        )
+
+    received_ranges = await run_in_threadpool(upload_controller.get_received_ranges,
+                                              project_id=project_id, upload_id=upload_id)
+    missing_ranges = upload_controller.get_missing_ranges(
+        ranges=received_ranges,
+        file_size=upload_state["file_size"],
+    )
+
+    if missing_ranges:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "signal": ResponseSignal.UPLOAD_INCOMPLETE.value,
+                "missing_ranges": missing_ranges,
+            }
+        )
+
+    try:
+        digest = await run_in_threadpool(upload_controller.assemble_upload, project_id=project_id,
+                                         upload_id=upload_id)
+    except FileNotFoundError:
+        # finalized by a concurrent request
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={
+                "signal": ResponseSignal.UPLOAD_NOT_FOUND.value
+            }
+        )
+
+    # always set, create requires it
+    expected_digest = (finalize_request.sha256 if finalize_request else None) or upload_state["sha256"]
+    if expected_digest.lower() != digest:
+        # no way to tell which part is corrupt, the upload starts over
+        await run_in_threadpool(upload_controller.delete_upload, project_id=project_id, upload_id=upload_id)
+
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "signal": ResponseSignal.UPLOAD_CHECKSUM_MISMATCH.value,
+                "sha256": digest,
+            }
+        )
 
     project_model = await ProjectModel.create_instance(
         db_client=request.app.db_client
@@ -103,8 +465,83 @@ async def process_endpoint(request: Request, project_id: int, process_request: P
         project_id=project_id
     )
 
+    file_path, file_id = DataController().generate_unique_filepath(
+        orig_file_name=upload_state["file_name"],
+        project_id=project_id
+    )
+
+    try:
+        await run_in_threadpool(upload_controller.move_upload, project_id=project_id,
+                                upload_id=upload_id, file_path=file_path)
+    except FileNotFoundError:
+        # finalized by a concurrent request
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={
+                "signal": ResponseSignal.UPLOAD_NOT_FOUND.value
+            }
+        )
+
+    # store the assets into the database
     asset_model = await AssetModel.create_instance(
-            db_client=request.app.db_client
+        db_client=request.app.db_client
+    )
+
+    asset_resource = Asset(
+        asset_project_id=project.project_id,
+        asset_type=AssetTypeEnum.FILE.value,
+        asset_name=file_id,
+        asset_size=upload_state["file_size"],
+        asset_config={ "digest": digest },
+    )
+
+    asset_record = await asset_model.create_asset(asset=asset_resource)
+
+    return JSONResponse(
+            content={
+                "signal": ResponseSignal.FILE_UPLOAD_SUCCESS.value,
+                "file_id": asset_record.asset_id,
+            }
+        )
+
+@data_router.delete("/upload-sessions/{project_id}/{upload_id}")
+async def delete_upload_endpoint(request: Request, project_id: int, upload_id: str):
+
+    upload_controller = UploadController()
+
+    upload_state = await run_in_threadpool(upload_controller.get_upload_state,
+                                           project_id=project_id, upload_id=upload_id)
+    if upload_state is None:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={
+                "signal": ResponseSignal.UPLOAD_NOT_FOUND.value
+            }
+        )
+
+    await run_in_threadpool(upload_controller.delete_upload, project_id=project_id, upload_id=upload_id)
+
+    return JSONResponse(
+            content={
+                "signal": ResponseSignal.UPLOAD_DELETED.value
+            }
+        )
+
+@data_router.post("/process/{project_id}")
+async def process_endpoint(request: Request, project_id: int, process_request: ProcessRequest,
+                           app_settings: Settings = Depends(get_settings)):
+
+    project_model = await ProjectModel.create_instance(
+        db_client=request.app.db_client
+    )
+
+    project = await project_model.get_project_or_create_one(
+        project_id=project_id
+    )
+
+    asset_model = await AssetModel.create_instance(
+            db_client=request.app.db_client,
+            db_read_client=request.app.db_read_client,
         )
 
     project_files_ids = {}
@@ -122,24 +559,17 @@ async def process_endpoint(request: Request, project_id: int, process_request: P
                 }
             )
 
-        project_files_ids = {
-            asset_record.asset_id: asset_record.asset_name
-        }
+        project_assets = [ asset_record ]
     
     else:
         
 
-        project_files = await asset_model.get_all_project_assets(
+        project_assets = await asset_model.get_all_project_assets(
             asset_project_id=project.project_id,
             asset_type=AssetTypeEnum.FILE.value,
         )
 
-        project_files_ids = {
-            record.asset_id: record.asset_name
-            for record in project_files
-        }
-
-    if len(project_files_ids) == 0:
+    if len(project_assets) == 0:
         return JSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST,
             content={
@@ -147,13 +577,34 @@ async def process_endpoint(request: Request, project_id: int, process_request: P
             }
         )
     
-    process_controller = ProcessController(project_id=project_id)
+    return await process_project_assets(app=request.app, project=project, project_assets=project_assets,
+                                        process_request=process_request, app_settings=app_settings)
+
+async def process_project_assets(app, project, project_assets: list, process_request: ProcessRequest,
+                                 app_settings: Settings, continue_on_error: bool = False) -> JSONResponse:
+    """
+    Chunks and stores the given assets of a project, shared by /process and /upload-bulk.
+    An asset that yields no chunks fails the request, unless continue_on_error,
+    where it is reported in failed_files and the next assets are processed.
+    """
+
+    chunk_size = process_request.chunk_size
+    overlap_size = process_request.overlap_size
+    do_reset = process_request.do_reset
+
+    asset_model = await AssetModel.create_instance(
+            db_client=app.db_client
+        )
+
+    process_controller = ProcessController(project_id=project.project_id)
 
     no_records = 0
     no_files = 0
+    skipped_files = 0
+    failed_files = []
 
     chunk_model = await ChunkModel.create_instance(
-                        db_client=request.app.db_client
+                        db_client=app.db_client
                     )
 
     if do_reset == 1:
@@ -161,22 +612,90 @@ async def process_endpoint(request: Request, project_id: int, process_request: P
             project_id=project.project_id
         )
 
-    for asset_id, file_id in project_files_ids.items():
+    # asset_id -> what its chunks will be derived from
+    processing_configs = {}
+    for asset in project_assets:
+        digest = await run_in_threadpool(process_controller.get_file_digest, file_id=asset.asset_name)
+        processing_configs[asset.asset_id] = process_controller.get_processing_config(
+            digest=digest,
+            chunk_size=chunk_size,
+            overlap_size=overlap_size,
+            chunker=process_request.chunker,
+            chunk_unit=process_request.chunk_unit,
+        )
 
-        file_content = process_controller.get_file_content(file_id=file_id)
+    # reprocess: only assets whose file or chunking parameters changed, their chunks are replaced
+    reprocess = process_request.reprocess == 1 and do_reset != 1
+    if reprocess:
+        assets_to_process = []
+        for asset in project_assets:
+            if process_controller.is_asset_processed(asset.asset_config, processing_configs[asset.asset_id]):
+                skipped_files += 1
+            else:
+                assets_to_process.append(asset)
+    else:
+        assets_to_process = project_assets
+
+    # chunks already stored in the project count as originals
+    existing_signatures = []
+    if app_settings.CHUNK_DEDUP_ENABLED and do_reset != 1:
+        existing_signatures = await chunk_model.get_project_chunk_signatures(
+            project_id=project.project_id,
+            exclude_asset_ids=[ asset.asset_id for asset in assets_to_process ] if reprocess else None,
+        )
+    deduplicator = await run_in_threadpool(process_controller.create_deduplicator, signatures=existing_signatures)
+    dedupe_report = []
+    reprocessed_asset_ids = []
+    promoted_chunk_ids = []
 
-        if file_content is None:
-            logger.error(f"Error while processing file: {file_id}")
-            continue
+    for asset in assets_to_process:
 
-        file_chunks = process_controller.process_file_content(
-            file_content=file_content,
-            file_id=file_id,
+        # pages are read and chunked lazily, chunks are flushed in batches
+        file_chunks = process_controller.iter_file_chunks(
+            file_id=asset.asset_name,
             chunk_size=chunk_size,
-            overlap_size=overlap_size
+            overlap_size=overlap_size,
+            chunker=process_request.chunker,
+            chunk_unit=process_request.chunk_unit,
         )
 
-        if file_chunks is None or len(file_chunks) == 0:
+        if file_chunks is None:
+            logger.error(f"Error while processing file: {asset.asset_name}")
+            failed_files.append(asset.asset_id)
+            continue
+
+        counts = { "duplicates": 0 }
+        # reading, chunking and deduplicating are CPU bound, keep them off the event loop
+        chunk_batches = iterate_in_threadpool(count_duplicates(
+            process_controller.iter_chunk_batches(
+                file_chunks=file_chunks,
+                project_id=project.project_id,
+                asset_id=asset.asset_id,
+                deduplicator=deduplicator,
+                batch_size=app_settings.PROCESSING_INSERT_BATCH_SIZE,
+            ),
+            counts=counts,
+        ))
+
+        if reprocess:
+            file_no_records, file_promoted_chunk_ids = await chunk_model.replace_asset_chunks(
+                asset_id=asset.asset_id,
+                chunk_batches=chunk_batches,
+            )
+            if file_no_records > 0:
+                reprocessed_asset_ids.append(asset.asset_id)
+                promoted_chunk_ids.extend(file_promoted_chunk_ids)
+        else:
+            file_no_records = 0
+            async for batch in chunk_batches:
+                file_no_records += await chunk_model.insert_many_chunks(chunks=batch)
+
+        if file_no_records == 0 and continue_on_error:
+            logger.error(f"No chunks produced for file: {asset.asset_name}")
+            failed_files.append(asset.asset_id)
+            continue
+
+        if file_no_records == 0:
             return JSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
@@ -184,24 +703,121 @@ async def process_endpoint(request: Request, project_id: int, process_request: P
                 }
             )
 
-        file_chunks_records = [
-            DataChunk(
-                chunk_text=chunk.page_content,
-                chunk_metadata=chunk.metadata,
-                chunk_order=i+1,
-                chunk_project_id=project.project_id,
-                chunk_asset_id=asset_id
-            )
-            for i, chunk in enumerate(file_chunks)
-        ]
+        await asset_model.update_asset_config(
+            asset_id=asset.asset_id,
+            asset_config={ **(asset.asset_config or {}), "processing": processing_configs[asset.asset_id] },
+        )
 
-        no_records += await chunk_model.insert_many_chunks(chunks=file_chunks_records)
+        no_records += file_no_records
         no_files += 1
 
+        dedupe_report.append({
+            "asset_id": asset.asset_id,
+            "chunks": file_no_records,
+            "duplicates": counts["duplicates"],
+            "dedupe_ratio": round(counts["duplicates"] / file_no_records, 4),
+        })
+
+    # the replaced chunks are gone, so are their vectors, and the new or promoted ones get indexed
+    reindexed_chunks = 0
+    if reprocessed_asset_ids:
+        reindexed_chunks = await reindex_project_assets(
+            app=app,
+            project=project,
+            chunk_model=chunk_model,
+            asset_ids=reprocessed_asset_ids,
+            chunk_ids=promoted_chunk_ids,
+            batch_size=app_settings.PROCESSING_INSERT_BATCH_SIZE,
+        )
+
     return JSONResponse(
         content={
             "signal": ResponseSignal.PROCESSING_SUCCESS.value,
             "inserted_chunks": no_records,
-            "processed_files": no_files
+            "processed_files": no_files,
+            "skipped_files": skipped_files,
+            "failed_files": failed_files,
+            "reindexed_chunks": reindexed_chunks,
+            "dedupe": dedupe_report,
         }
     )
+
+async def reindex_project_assets(app, project, chunk_model: ChunkModel, asset_ids: list,
+                                 chunk_ids: list, batch_size: int) -> int:
+    """
+    Drops the vectors of the given assets and indexes their canonical chunks and
+    the given chunk ids again, with the same point ids as /index/push, in the project
+    collection (when it was pushed) and in the main collection under every tag set
+    the assets were pushed with. Returns the number of chunks indexed.
+    """
+
+    nlp_controller = NLPController(
+        vectordb_client=app.vectordb_client,
+        generation_client=app.generation_client,
+        embedding_client=app.embedding_client,
+        template_parser=app.template_parser,
+    )
+
+    # promoted chunks belong to the same project, so they were pushed with the same tags
+    project_indexed = await run_in_threadpool(nlp_controller.is_vector_db_collection_existed, project=project)
+    tag_sets = await run_in_threadpool(nlp_controller.get_vector_db_assets_tags, asset_ids=asset_ids)
+    if not project_indexed and not tag_sets:
+        return 0
+
+    if project_indexed:
+        await run_in_threadpool(nlp_controller.delete_vector_db_assets, project=project, asset_ids=asset_ids)
+    if tag_sets:
+        await run_in_threadpool(nlp_controller.delete_vector_db_tagged_assets, asset_ids=asset_ids)
+
+    reindexed_chunks = 0
+    after_chunk_id = 0
+    while True:
+        chunks = await chunk_model.get_canonical_chunks(asset_ids=asset_ids, chunk_ids=chunk_ids,
+                                                        after_chunk_id=after_chunk_id, batch_size=batch_size)
+        if not chunks:
+            break
+
+        is_inserted = True
+        if project_indexed:
+            is_inserted = await run_in_threadpool(
+                nlp_controller.index_into_vector_db,
+                project=project,
+                chunks=chunks,
+            )
+        for tags in tag_sets:
+            is_inserted = is_inserted and await run_in_threadpool(
+                nlp_controller.index_into_vector_db_with_tags,
+                chunks=chunks,
+                tags=tags,
+            )
+
+        if not is_inserted:
+            logger.error(f"Error while re-indexing the chunks of project {project.project_id}")
+            break
+
+        reindexed_chunks += len(chunks)
+        after_chunk_id = chunks[-1].chunk_id
+
+    return reindexed_chunks
+
+
+def count_duplicates(chunk_batches, counts: dict):
+    for batch in chunk_batches:
+        counts["duplicates"] += sum(1 for chunk in batch if chunk.chunk_duplicate_of)
+        yield batch
+
+def remove_files(file_paths: list):
+    for file_path in file_paths:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+async def process_in_background(**kwargs):
+    # one unreadable document (e.g. a scanned PDF) must not stop the rest of the batch
+    response = await process_project_assets(continue_on_error=True, **kwargs)
+    if response.status_code != status.HTTP_200_OK:
+        logger.error(f"Error while processing uploaded files: {response.body.decode()}")
+        return
+
+    result = json.loads(response.body)
+    logger.info(f"Processed {result['processed_files']} uploaded files, {len(result['failed_files'])} failed: "
+                f"{result['failed_files']}")
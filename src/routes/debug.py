@@ -0,0 +1,24 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from helpers.tracing import get_profiles
+from models import ResponseSignal
+
+debug_router = APIRouter(
+    prefix="/api/v1/debug",
+    tags=["api_v1", "debug"],
+)
+
+@debug_router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """Folded stacks of a request sent with an X-Profile header (flamegraph.pl / speedscope)"""
+
+    folded_stacks = get_profiles().get(profile_id)
+    if folded_stacks is None:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={
+                "signal": ResponseSignal.PROFILE_NOT_FOUND.value
+            }
+        )
+
+    return PlainTextResponse(content=folded_stacks)
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Request, status
+from fastapi.responses import JSONResponse
+
+health_router = APIRouter(
+    prefix="/health",
+    tags=["health"],
+)
+
+# served while warming up
+READINESS_EXEMPT_PREFIXES = ("/health", "/metrics", "/docs", "/redoc", "/openapi.json")
+
+class ReadinessMiddleware:
+    """
+    Pure ASGI middleware: 503 for every other route until warmup is done, the
+    clients they use (e.g. the vector DB) are only connected by then. Covers
+    deployments that don't gate traffic on /health/ready.
+    """
+
+    def __init__(self, app, retry_after: int = 5):
+        self.app = app
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["app"].ready or scope["path"].startswith(READINESS_EXEMPT_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        response = JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": "warming_up",
+                "warmup_error": scope["app"].warmup_error,
+            },
+            headers={ "Retry-After": str(self.retry_after) },
+        )
+        await response(scope, receive, send)
+
+@health_router.get("/live")
+async def live():
+    return {"status": "alive"}
+
+@health_router.get("/ready")
+async def ready(request: Request):
+    """503 until warmup has opened the DB pools and loaded clients and collections"""
+
+    if not request.app.ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": "warming_up",
+                "warmup_error": request.app.warmup_error,
+                "startup_profile": request.app.startup_profile,
+            }
+        )
+
+    return {
+        "status": "ready",
+        "startup_profile": request.app.startup_profile,
+    }
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, CollectorRegistry
+from prometheus_client import multiprocess
+import os
+
+metrics_router = APIRouter(
+    tags=["metrics"],
+)
+
+@metrics_router.get("/metrics")
+async def get_metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+    # several workers, aggregate the samples they all write to the shared directory
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,10 +1,15 @@
-from fastapi import FastAPI, APIRouter, status, Request
+from fastapi import FastAPI, APIRouter, status, Request, BackgroundTasks
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from routes.schemes.nlp import PushRequest, SearchRequest, TaggedPushRequest, TaggedSearchRequest, ChatAnswerRequest, TaggedChatAnswerRequest
+from routes.schemes.nlp import CompactIndexRequest, SearchEvalRequest
 from models.ProjectModel import ProjectModel
 from models.ChunkModel import ChunkModel
 from controllers import NLPController
 from models import ResponseSignal
+from helpers.config import get_settings
+from helpers.singleflight import SingleFlight, normalize_query
+from stores.session.SessionEnums import EntityExtractionEnum
 
 import logging
 
@@ -19,6 +24,13 @@ nlp_router2 = APIRouter(
     tags=["api_v2", "nlp"],
 )
 
+answer_flights = SingleFlight(name="answer", enabled=get_settings().SINGLEFLIGHT_ENABLED)
+tagged_answer_flights = SingleFlight(name="answer_tagged", enabled=get_settings().SINGLEFLIGHT_ENABLED)
+
+async def run_answer(nlp_controller: NLPController, func, **kwargs):
+    answer, full_prompt, chat_history = await run_in_threadpool(func, **kwargs)
+    return answer, full_prompt, chat_history, nlp_controller.context_tokens
+
 @nlp_router.post("/index/push/{project_id}")
 async def index_project(request: Request, project_id: int, push_request: PushRequest):
 
@@ -27,7 +39,8 @@ async def index_project(request: Request, project_id: int, push_request: PushReq
     )
 
     chunk_model = await ChunkModel.create_instance(
-        db_client=request.app.db_client
+        db_client=request.app.db_client,
+        db_read_client=request.app.db_read_client,
     )
 
     project = await project_model.get_project_or_create_one(
@@ -52,10 +65,11 @@ async def index_project(request: Request, project_id: int, push_request: PushReq
     has_records = True
     page_no = 1
     inserted_items_count = 0
-    idx = 0
 
     while has_records:
-        page_chunks = await chunk_model.get_poject_chunks(project_id=project.project_id, page_no=page_no)
+        # duplicates point at a canonical chunk that is indexed instead
+        page_chunks = await chunk_model.get_poject_chunks(project_id=project.project_id, page_no=page_no,
+                                                          exclude_duplicates=True)
         if len(page_chunks):
             page_no += 1
         
@@ -63,14 +77,12 @@ async def index_project(request: Request, project_id: int, push_request: PushReq
             has_records = False
             break
 
-        chunks_ids =  list(range(idx, idx + len(page_chunks)))
-        idx += len(page_chunks)
-        
-        is_inserted = nlp_controller.index_into_vector_db(
+        # points are keyed by chunk uuid, pushing again replaces them
+        is_inserted = await run_in_threadpool(
+            nlp_controller.index_into_vector_db,
             project=project,
             chunks=page_chunks,
             do_reset=push_request.do_reset,
-            chunks_ids=chunks_ids
         )
 
         if not is_inserted:
@@ -133,9 +145,11 @@ async def search_index(request: Request, project_id: int, search_request: Search
         generation_client=request.app.generation_client,
         embedding_client=request.app.embedding_client,
         template_parser=request.app.template_parser,
+        chunk_hydrator=request.app.chunk_hydrator,
     )
 
-    results = nlp_controller.search_vector_db_collection(
+    results = await run_in_threadpool(
+        nlp_controller.search_vector_db_collection,
         project=project, text=search_request.text, limit=search_request.limit
     )
 
@@ -154,6 +168,82 @@ async def search_index(request: Request, project_id: int, search_request: Search
         }
     )
 
+@nlp_router.post("/index/compact/{project_id}")
+async def compact_index(request: Request, project_id: int, compact_request: CompactIndexRequest):
+
+    project_model = await ProjectModel.create_instance(
+        db_client=request.app.db_client
+    )
+
+    project = await project_model.get_project_or_create_one(
+        project_id=project_id
+    )
+
+    nlp_controller = NLPController(
+        vectordb_client=request.app.vectordb_client,
+        generation_client=request.app.generation_client,
+        embedding_client=request.app.embedding_client,
+        template_parser=request.app.template_parser,
+    )
+
+    updated_items_count = await run_in_threadpool(
+        nlp_controller.fit_vector_db_compact_projection,
+        project=project, method=compact_request.method, sample_size=compact_request.sample_size
+    )
+
+    if updated_items_count is False:
+        return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={
+                    "signal": ResponseSignal.VECTORDB_COMPACT_ERROR.value
+                }
+            )
+
+    return JSONResponse(
+        content={
+            "signal": ResponseSignal.VECTORDB_COMPACT_SUCCESS.value,
+            "updated_items_count": updated_items_count
+        }
+    )
+
+@nlp_router.post("/index/eval/{project_id}")
+async def evaluate_index(request: Request, project_id: int, eval_request: SearchEvalRequest):
+
+    project_model = await ProjectModel.create_instance(
+        db_client=request.app.db_client
+    )
+
+    project = await project_model.get_project_or_create_one(
+        project_id=project_id
+    )
+
+    nlp_controller = NLPController(
+        vectordb_client=request.app.vectordb_client,
+        generation_client=request.app.generation_client,
+        embedding_client=request.app.embedding_client,
+        template_parser=request.app.template_parser,
+    )
+
+    report = await run_in_threadpool(
+        nlp_controller.evaluate_vector_db_search,
+        project=project, num_queries=eval_request.num_queries, limit=eval_request.limit
+    )
+
+    if not report:
+        return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={
+                    "signal": ResponseSignal.VECTORDB_EVAL_ERROR.value
+                }
+            )
+
+    return JSONResponse(
+        content={
+            "signal": ResponseSignal.VECTORDB_EVAL_SUCCESS.value,
+            "report": report
+        }
+    )
+
 @nlp_router.post("/index/answer/{project_id}")
 async def answer_rag(request: Request, project_id: int, search_request: SearchRequest):
     
@@ -170,14 +260,24 @@ async def answer_rag(request: Request, project_id: int, search_request: SearchRe
         generation_client=request.app.generation_client,
         embedding_client=request.app.embedding_client,
         template_parser=request.app.template_parser,
+        generation_hedger=request.app.generation_hedger,
+        chunk_hydrator=request.app.chunk_hydrator,
     )
 
-    answer, full_prompt, chat_history = nlp_controller.answer_rag_question(
+    answer_kwargs = dict(
+        nlp_controller=nlp_controller,
+        func=nlp_controller.answer_rag_question,
         project=project,
         query=search_request.text,
         limit=search_request.limit,
     )
 
+    flight_key = (project.project_id, normalize_query(search_request.text), search_request.limit,
+                  request.app.generation_client.generation_model_id)
+    answer, full_prompt, chat_history, context_tokens = await answer_flights.do(
+        flight_key, run_answer, **answer_kwargs
+    )
+
     if not answer:
         return JSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -191,6 +291,7 @@ async def answer_rag(request: Request, project_id: int, search_request: SearchRe
             "signal": ResponseSignal.RAG_ANSWER_SUCCESS.value,
             "answer": answer,
             "full_prompt": full_prompt,
+            "context_tokens": context_tokens,
             "chat_history": chat_history
         }
     )
@@ -237,7 +338,8 @@ async def index_project_with_tags(request: Request, push_request: TaggedPushRequ
     )
 
     chunk_model = await ChunkModel.create_instance(
-        db_client=request.app.db_client
+        db_client=request.app.db_client,
+        db_read_client=request.app.db_read_client,
     )
 
     project = await project_model.get_project_or_create_one(
@@ -262,11 +364,10 @@ async def index_project_with_tags(request: Request, push_request: TaggedPushRequ
     has_records = True
     page_no = 1
     inserted_items_count = 0
-    idx = 0
 
     while has_records:
         page_chunks = await chunk_model.get_poject_chunks(
-            project_id=project.project_id, page_no=page_no
+            project_id=project.project_id, page_no=page_no, exclude_duplicates=True
         )
         if len(page_chunks):
             page_no += 1
@@ -275,12 +376,10 @@ async def index_project_with_tags(request: Request, push_request: TaggedPushRequ
             has_records = False
             break
 
-        chunks_ids = list(range(idx, idx + len(page_chunks)))
-        idx += len(page_chunks)
-        
-        is_inserted = nlp_controller.index_into_vector_db_with_tags(
+        # points are keyed by chunk uuid and tag set, pushing again replaces them
+        is_inserted = await run_in_threadpool(
+            nlp_controller.index_into_vector_db_with_tags,
             chunks=page_chunks,
-            chunks_ids=chunks_ids,
             tags=push_request.tags,
             do_reset=push_request.do_reset,
         )
@@ -313,9 +412,11 @@ async def search_index_with_tags(request: Request, search_request: TaggedSearchR
         generation_client=request.app.generation_client,
         embedding_client=request.app.embedding_client,
         template_parser=request.app.template_parser,
+        chunk_hydrator=request.app.chunk_hydrator,
     )
 
-    results = nlp_controller.search_vector_db_with_tags(
+    results = await run_in_threadpool(
+        nlp_controller.search_vector_db_with_tags,
         text=search_request.text,
         tags=search_request.tags,
         limit=search_request.limit
@@ -346,14 +447,24 @@ async def answer_rag_with_tags(request: Request, search_request: TaggedSearchReq
         generation_client=request.app.generation_client,
         embedding_client=request.app.embedding_client,
         template_parser=request.app.template_parser,
+        generation_hedger=request.app.generation_hedger,
+        chunk_hydrator=request.app.chunk_hydrator,
     )
 
-    answer, full_prompt, chat_history = nlp_controller.answer_rag_question_with_tags(
+    answer_kwargs = dict(
+        nlp_controller=nlp_controller,
+        func=nlp_controller.answer_rag_question_with_tags,
         query=search_request.text,
         tags=search_request.tags,
         limit=search_request.limit,
     )
 
+    flight_key = (normalize_query(search_request.text), tuple(sorted(set(search_request.tags or []))),
+                  search_request.limit, request.app.generation_client.generation_model_id)
+    answer, full_prompt, chat_history, context_tokens = await tagged_answer_flights.do(
+        flight_key, run_answer, **answer_kwargs
+    )
+
     if not answer:
         return JSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -367,6 +478,7 @@ async def answer_rag_with_tags(request: Request, search_request: TaggedSearchReq
             "signal": ResponseSignal.RAG_ANSWER_SUCCESS.value,
             "answer": answer,
             "full_prompt": full_prompt,
+            "context_tokens": context_tokens,
             "chat_history": chat_history
         }
     )
@@ -375,7 +487,8 @@ async def answer_rag_with_tags(request: Request, search_request: TaggedSearchReq
 # ============ Chat History Endpoints ============
 
 @nlp_router2.post("/index/answer-with-history/{project_id}")
-async def answer_rag_with_history(request: Request, project_id: int, chat_request: ChatAnswerRequest):
+async def answer_rag_with_history(request: Request, project_id: int, chat_request: ChatAnswerRequest,
+                                  background_tasks: BackgroundTasks):
     """RAG answer with chat history support using query rewriting"""
     
     project_model = await ProjectModel.create_instance(
@@ -399,19 +512,39 @@ async def answer_rag_with_history(request: Request, project_id: int, chat_reques
         generation_client=request.app.generation_client,
         embedding_client=request.app.embedding_client,
         template_parser=request.app.template_parser,
+        generation_hedger=request.app.generation_hedger,
+        chunk_hydrator=request.app.chunk_hydrator,
     )
 
-    # Convert chat history to dict format
+    session_store = request.app.session_store
+    session_id = chat_request.session_id
+
+    background_entities = get_settings().ENTITY_EXTRACTION_MODE == EntityExtractionEnum.BACKGROUND.value
+    if background_entities and not session_id:
+        session_id = session_store.create_session_id()
+
+    if session_id:
+        _ = await session_store.load_session(session_id=session_id)
+
+    # Convert chat history to dict format, server-side session is used when the client doesn't send it
     chat_history_dict = None
     if chat_request.chat_history:
         chat_history_dict = [msg.model_dump() for msg in chat_request.chat_history]
+    elif session_id:
+        chat_history_dict = session_store.get_chat_history(session_id=session_id)
 
-    answer, full_prompt, llm_chat_history, rewritten_query, updated_entities = nlp_controller.answer_rag_question_with_history(
+    session_entities = chat_request.session_entities
+    if session_id and session_entities is None:
+        session_entities = session_store.get_entities(session_id=session_id)
+
+    answer, full_prompt, llm_chat_history, rewritten_query, updated_entities = await run_in_threadpool(
+        nlp_controller.answer_rag_question_with_history,
         project=project,
         query=chat_request.text,
         chat_history=chat_history_dict,
-        session_entities=chat_request.session_entities,
+        session_entities=session_entities,
         limit=chat_request.limit,
+        extract_entities=not background_entities,
     )
 
     if not answer:
@@ -421,21 +554,48 @@ async def answer_rag_with_history(request: Request, project_id: int, chat_reques
                 "signal": ResponseSignal.RAG_ANSWER_ERROR.value
             }
         )
+
+    if session_id:
+        session_store.append_turn(
+            session_id=session_id,
+            query=chat_request.text,
+            answer=answer,
+            rewritten_query=rewritten_query,
+        )
+
+    if background_entities:
+        background_tasks.add_task(
+            nlp_controller.refresh_session_entities,
+            session_store=session_store,
+            session_id=session_id,
+            query=chat_request.text,
+            answer=answer,
+            existing_entities=session_entities,
+        )
+    elif session_id:
+        session_store.set_entities(session_id=session_id, entities=updated_entities)
+
+    if session_id:
+        await session_store.save_session(session_id=session_id)
     
     return JSONResponse(
         content={
             "signal": ResponseSignal.CHAT_RAG_ANSWER_SUCCESS.value,
             "answer": answer,
             "rewritten_query": rewritten_query,
+            "session_id": session_id,
             "session_entities": updated_entities,
+            "entities_pending": background_entities,
             "full_prompt": full_prompt,
+            "context_tokens": nlp_controller.context_tokens,
             "chat_history": llm_chat_history
         }
     )
 
 
 @nlp_router2.post("/index/answer-tagged-with-history")
-async def answer_rag_with_tags_and_history(request: Request, chat_request: TaggedChatAnswerRequest):
+async def answer_rag_with_tags_and_history(request: Request, chat_request: TaggedChatAnswerRequest,
+                                           background_tasks: BackgroundTasks):
     """RAG answer with tags and chat history support"""
     
     nlp_controller = NLPController(
@@ -443,19 +603,39 @@ async def answer_rag_with_tags_and_history(request: Request, chat_request: Tagge
         generation_client=request.app.generation_client,
         embedding_client=request.app.embedding_client,
         template_parser=request.app.template_parser,
+        generation_hedger=request.app.generation_hedger,
+        chunk_hydrator=request.app.chunk_hydrator,
     )
 
-    # Convert chat history to dict format
+    session_store = request.app.session_store
+    session_id = chat_request.session_id
+
+    background_entities = get_settings().ENTITY_EXTRACTION_MODE == EntityExtractionEnum.BACKGROUND.value
+    if background_entities and not session_id:
+        session_id = session_store.create_session_id()
+
+    if session_id:
+        _ = await session_store.load_session(session_id=session_id)
+
+    # Convert chat history to dict format, server-side session is used when the client doesn't send it
     chat_history_dict = None
     if chat_request.chat_history:
         chat_history_dict = [msg.model_dump() for msg in chat_request.chat_history]
+    elif session_id:
+        chat_history_dict = session_store.get_chat_history(session_id=session_id)
+
+    session_entities = chat_request.session_entities
+    if session_id and session_entities is None:
+        session_entities = session_store.get_entities(session_id=session_id)
 
-    answer, full_prompt, llm_chat_history, rewritten_query, updated_entities = nlp_controller.answer_rag_question_with_tags_and_history(
+    answer, full_prompt, llm_chat_history, rewritten_query, updated_entities = await run_in_threadpool(
+        nlp_controller.answer_rag_question_with_tags_and_history,
         query=chat_request.text,
         tags=chat_request.tags,
         chat_history=chat_history_dict,
-        session_entities=chat_request.session_entities,
+        session_entities=session_entities,
         limit=chat_request.limit,
+        extract_entities=not background_entities,
     )
 
     if not answer:
@@ -465,14 +645,40 @@ async def answer_rag_with_tags_and_history(request: Request, chat_request: Tagge
                 "signal": ResponseSignal.RAG_ANSWER_ERROR.value
             }
         )
+
+    if session_id:
+        session_store.append_turn(
+            session_id=session_id,
+            query=chat_request.text,
+            answer=answer,
+            rewritten_query=rewritten_query,
+        )
+
+    if background_entities:
+        background_tasks.add_task(
+            nlp_controller.refresh_session_entities,
+            session_store=session_store,
+            session_id=session_id,
+            query=chat_request.text,
+            answer=answer,
+            existing_entities=session_entities,
+        )
+    elif session_id:
+        session_store.set_entities(session_id=session_id, entities=updated_entities)
+
+    if session_id:
+        await session_store.save_session(session_id=session_id)
     
     return JSONResponse(
         content={
             "signal": ResponseSignal.CHAT_RAG_ANSWER_SUCCESS.value,
             "answer": answer,
             "rewritten_query": rewritten_query,
+            "session_id": session_id,
             "session_entities": updated_entities,
+            "entities_pending": background_entities,
             "full_prompt": full_prompt,
+            "context_tokens": nlp_controller.context_tokens,
             "chat_history": llm_chat_history
         }
     )
@@ -6,3 +6,17 @@ class ProcessRequest(BaseModel):
     chunk_size: Optional[int] = 100
     overlap_size: Optional[int] = 20
     do_reset: Optional[int] = 0
+    # re-chunk only the assets whose file or chunking parameters changed
+    reprocess: Optional[int] = 0
+    chunker: Optional[str] = None
+    chunk_unit: Optional[str] = None
+
+class CreateUploadRequest(BaseModel):
+    file_name: str
+    file_size: int
+    # hex sha256 of the whole file, verified on finalize
+    sha256: str
+
+class FinalizeUploadRequest(BaseModel):
+    # replaces the one given on create
+    sha256: Optional[str] = None
@@ -8,6 +8,15 @@ class SearchRequest(BaseModel):
     text: str
     limit: Optional[int] = 5
 
+# two-stage collections only, see VECTOR_DB_TWO_STAGE_ENABLED
+class CompactIndexRequest(BaseModel):
+    method: Optional[str] = "pca"
+    sample_size: Optional[int] = 20000
+
+class SearchEvalRequest(BaseModel):
+    num_queries: Optional[int] = 100
+    limit: Optional[int] = 10
+
 # New models for tagged single collection
 class TaggedPushRequest(BaseModel):
     project_id: int
@@ -24,15 +33,19 @@ class ChatMessage(BaseModel):
     role: str  # "user" or "assistant"
     content: str
 
+# With session_id set, chat_history and session_entities are kept server-side
+# and may be omitted by the client
 class ChatAnswerRequest(BaseModel):
     text: str
     chat_history: Optional[List[ChatMessage]] = None
     session_entities: Optional[List[str]] = None
+    session_id: Optional[str] = None
     limit: Optional[int] = 5
 
 class TaggedChatAnswerRequest(BaseModel):
     text: str
     chat_history: Optional[List[ChatMessage]] = None
     session_entities: Optional[List[str]] = None
+    session_id: Optional[str] = None
     tags: Optional[List[str]] = None
     limit: Optional[int] = 5
@@ -0,0 +1,95 @@
+"""
+Trains the chunk text zstd dictionary and compresses the existing chunks in place.
+
+    python scripts/compress_chunks.py --train-samples 20000
+    python scripts/compress_chunks.py --skip-training
+    python scripts/compress_chunks.py --decompress
+    python scripts/compress_chunks.py --import-dictionaries --skip-training
+
+Run from src/ after the e7a1d3c95b28 migration. Trained dictionaries are stored in
+Postgres, running apps pick them up within CHUNK_TEXT_DICTIONARY_REFRESH_INTERVAL;
+--import-dictionaries copies the <dict_id>.dict files of CHUNK_TEXT_DICTIONARY_DIR there first.
+Rows are rewritten in batches by chunk_id and already converted rows are skipped, so it
+can be stopped and resumed.
+Set CHUNK_TEXT_COMPRESSION_ENABLED=True (and restart the app) once it is done, then
+re-push the collections to compress the vector payloads too.
+"""
+
+import argparse
+import asyncio
+import time
+import glob
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.config import get_settings
+from helpers.database import create_db_engine, create_db_client
+from helpers.compression import get_text_compressor
+from models.ChunkModel import ChunkModel
+from models.CompressionDictionaryModel import CompressionDictionaryModel
+from models.db_schemes import CompressedText
+
+async def main(args):
+    settings = get_settings()
+
+    db_engine = create_db_engine(settings)
+    db_client = create_db_client(db_engine)
+
+    compressor = get_text_compressor()
+    compressor.enabled = not args.decompress
+    CompressedText.compressor = compressor
+
+    chunk_model = await ChunkModel.create_instance(db_client=db_client)
+    dictionary_model = await CompressionDictionaryModel.create_instance(db_client=db_client)
+
+    if args.import_dictionaries:
+        dictionary_dir = settings.CHUNK_TEXT_DICTIONARY_DIR
+        if not os.path.isabs(dictionary_dir):
+            dictionary_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), dictionary_dir)
+
+        # oldest first, the newest one ends up as the default
+        for file_path in sorted(glob.glob(os.path.join(dictionary_dir, "*.dict")), key=os.path.getmtime):
+            with open(file_path, "rb") as f:
+                dict_id = compressor.add_dictionary(f.read())
+            await dictionary_model.insert_dictionary(dict_id=dict_id,
+                                                     dict_data=compressor.dictionaries[dict_id].as_bytes())
+            print(f"imported dictionary {dict_id} from {file_path}")
+
+    await compressor.load_dictionaries(dictionary_model)
+
+    if not args.decompress and not args.skip_training:
+        samples = await chunk_model.sample_chunks_texts(sample_size=args.train_samples)
+        if samples:
+            dict_id, dict_data = compressor.train(samples=samples, dictionary_size=settings.CHUNK_TEXT_DICTIONARY_SIZE)
+            # stored before any row is written with it
+            await dictionary_model.insert_dictionary(dict_id=dict_id, dict_data=dict_data)
+            print(f"trained dictionary {dict_id} on {len(samples)} chunks")
+
+    converted, after_chunk_id = 0, 0
+    started_at = time.perf_counter()
+    while True:
+        records = await chunk_model.get_chunks_texts_batch(
+            after_chunk_id=after_chunk_id, batch_size=args.batch_size, compressed=args.decompress,
+        )
+        if not records:
+            break
+
+        converted += await chunk_model.update_chunks_texts({ chunk_id: chunk_text for chunk_id, chunk_text in records })
+        after_chunk_id = records[-1][0]
+        print(f"{converted} chunks rewritten ({converted / (time.perf_counter() - started_at):.0f}/s)")
+
+    await db_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress (or decompress) the stored chunk texts")
+    parser.add_argument("--train-samples", type=int, default=20000, help="chunks sampled to train the dictionary")
+    parser.add_argument("--skip-training", action="store_true", help="use the newest existing dictionary")
+    parser.add_argument("--import-dictionaries", action="store_true",
+                        help="store the dictionaries of CHUNK_TEXT_DICTIONARY_DIR in Postgres")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--decompress", action="store_true", help="rewrite compressed rows as plain UTF-8")
+
+    asyncio.run(main(parser.parse_args()))
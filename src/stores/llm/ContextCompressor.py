@@ -0,0 +1,89 @@
+from .LLMEnums import DocumentTypeEnum
+from .ContextPacker import SENTENCE_SPLIT_REGEX
+from helpers.cache import LRUCache
+import numpy as np
+
+class ContextCompressor:
+    """
+    Keeps only the sentences of retrieved documents that are most similar to
+    the query. Sentences are embedded in one batched call and their vectors
+    are cached, since popular chunks are retrieved over and over.
+    """
+
+    def __init__(self, embedding_client, vectors_cache: LRUCache,
+                       max_sentences: int = 3, min_similarity: float = 0.3):
+        self.embedding_client = embedding_client
+        self.vectors_cache = vectors_cache
+        self.max_sentences = max_sentences
+        self.min_similarity = min_similarity
+
+    def split_sentences(self, text: str) -> list:
+        return [ sentence.strip() for sentence in SENTENCE_SPLIT_REGEX.split(text) if sentence.strip() ]
+
+    def embed_sentences(self, sentences: list):
+        model_id = self.embedding_client.embedding_model_id
+
+        vectors = [ self.vectors_cache.get((model_id, sentence)) for sentence in sentences ]
+        missing = list({ sentences[i] for i, vector in enumerate(vectors) if vector is None })
+
+        if missing:
+            missing_vectors = self.embedding_client.embed_text(
+                texts=missing,
+                document_type=DocumentTypeEnum.DOCUMENT.value
+            )
+            if not missing_vectors:
+                return None
+
+            embedded = dict(zip(missing, missing_vectors))
+            for sentence, vector in embedded.items():
+                self.vectors_cache.put((model_id, sentence), vector)
+
+            vectors = [
+                vector if vector is not None else embedded[sentences[i]]
+                for i, vector in enumerate(vectors)
+            ]
+
+        return np.asarray(vectors, dtype=np.float32)
+
+    def compress(self, documents: list, query_vector: list) -> list:
+        documents_sentences = [ self.split_sentences(doc.text) for doc in documents ]
+
+        # flat list of sentences to embed, documents with one sentence are kept as is
+        sentences = []
+        offsets = []
+        for doc_sentences in documents_sentences:
+            offsets.append(len(sentences))
+            if len(doc_sentences) > 1:
+                sentences.extend(doc_sentences)
+
+        if not sentences:
+            return documents
+
+        sentence_vectors = self.embed_sentences(sentences)
+        if sentence_vectors is None:
+            return documents
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        norms = np.linalg.norm(sentence_vectors, axis=1) * np.linalg.norm(query)
+        similarities = (sentence_vectors @ query) / np.where(norms == 0, 1, norms)
+
+        compressed_documents = []
+        for doc, doc_sentences, offset in zip(documents, documents_sentences, offsets):
+            if len(doc_sentences) <= 1:
+                compressed_documents.append(doc)
+                continue
+
+            doc_similarities = similarities[offset:offset + len(doc_sentences)]
+            ranked = np.argsort(-doc_similarities)[:self.max_sentences]
+
+            # always keep the best sentence, the rest only above the threshold
+            keep = sorted(
+                idx for rank, idx in enumerate(ranked)
+                if rank == 0 or doc_similarities[idx] >= self.min_similarity
+            )
+
+            compressed_doc = doc.model_copy()
+            compressed_doc.text = " ".join(doc_sentences[idx] for idx in keep)
+            compressed_documents.append(compressed_doc)
+
+        return compressed_documents
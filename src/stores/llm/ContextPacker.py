@@ -0,0 +1,80 @@
+import re
+
+SENTENCE_SPLIT_REGEX = re.compile(r"(?<=[.!?؟۔\n])\s+")
+
+class ContextPacker:
+    """Fills a token budget with retrieved documents, best score first"""
+
+    def __init__(self, tokenizer, token_budget: int, min_document_tokens: int = 32):
+        self.tokenizer = tokenizer
+        self.token_budget = token_budget
+        self.min_document_tokens = min_document_tokens
+
+    def truncate_to_tokens(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of text that fits into max_tokens, cut at a word boundary when there is one"""
+
+        # token counts grow with the prefix length, binary search on characters
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.tokenizer.count(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+
+        prefix = text[:low]
+        if low < len(text) and not text[low].isspace():
+            word_boundary = prefix.rfind(" ")
+            if word_boundary > 0:
+                prefix = prefix[:word_boundary]
+
+        return prefix.strip()
+
+    def trim_to_sentences(self, text: str, max_tokens: int) -> str:
+        """
+        Longest prefix of whole sentences that fits into max_tokens. When even the
+        first sentence doesn't fit, it is truncated instead of dropping the document.
+        """
+
+        kept = []
+        used = 0
+        for sentence in SENTENCE_SPLIT_REGEX.split(text):
+            sentence_tokens = self.tokenizer.count(sentence + " ")
+            if used + sentence_tokens > max_tokens:
+                break
+
+            kept.append(sentence)
+            used += sentence_tokens
+
+        if not kept:
+            return self.truncate_to_tokens(text, max_tokens=max_tokens)
+
+        return " ".join(kept).strip()
+
+    def pack(self, documents: list, overhead_tokens: int = 0):
+        """
+        Returns ([(document, text)], tokens_used). overhead_tokens is the cost of
+        the per-document prompt template around each text.
+        """
+
+        packed = []
+        tokens_used = 0
+
+        for document in sorted(documents, key=lambda doc: doc.score, reverse=True):
+            remaining = self.token_budget - tokens_used - overhead_tokens
+            if remaining < self.min_document_tokens:
+                break
+
+            text = document.text.strip()
+            text_tokens = self.tokenizer.count(text)
+
+            if text_tokens > remaining:
+                text = self.trim_to_sentences(text, max_tokens=remaining)
+                if not text:
+                    continue
+                text_tokens = self.tokenizer.count(text)
+
+            packed.append((document, text))
+            tokens_used += text_tokens + overhead_tokens
+
+        return packed, tokens_used
@@ -0,0 +1,144 @@
+from .LLMEnums import DocumentTypeEnum
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from helpers import metrics
+from typing import List
+import threading
+import logging
+import queue
+import time
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent query embeddings into one provider call. A query waits
+    at most max_wait_ms for others to join it, and a batch is sent as soon as
+    it holds max_batch_size queries. Document embeddings are already batched by
+    their callers and go straight to the client.
+
+    Batches are sent from the batcher's own threads, never from the shared
+    worker pool, whose threads may be the very callers waiting on them.
+    """
+
+    def __init__(self, embedding_client, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                       max_concurrency: int = 4, timeout: float = 30.0):
+        self.embedding_client = embedding_client
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+
+        self.queue = queue.Queue()
+        self.thread = None
+        self.executor = None
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def __getattr__(self, name):
+        return getattr(self.embedding_client, name)
+
+    def set_generation_model(self, model_id: str):
+        self.embedding_client.set_generation_model(model_id=model_id)
+
+    def set_embedding_model(self, model_id: str, embedding_size: int):
+        self.embedding_client.set_embedding_model(model_id=model_id, embedding_size=embedding_size)
+
+    def start(self):
+        # started on first use, after gunicorn forked the workers
+        with self.lock:
+            if self.thread is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                   thread_name_prefix="embedding-batch")
+                self.thread = threading.Thread(target=self.run, name="embedding-batcher", daemon=True)
+                self.thread.start()
+
+    def close(self):
+        with self.lock:
+            if self.thread is not None:
+                # the collector sends what it holds, then shuts its executor down
+                self.queue.put(None)
+                self.thread = None
+                self.executor = None
+
+    def embed_text(self, texts: List[str], document_type: str = None):
+
+        if document_type != DocumentTypeEnum.QUERY.value or len(texts) >= self.max_batch_size:
+            return self.embedding_client.embed_text(texts=texts, document_type=document_type)
+
+        self.start()
+
+        futures = []
+        for text in texts:
+            future = Future()
+            self.queue.put((text, future))
+            futures.append(future)
+
+        deadline = time.monotonic() + self.timeout
+        try:
+            vectors = [ future.result(timeout=max(0.0, deadline - time.monotonic())) for future in futures ]
+        except FuturesTimeoutError:
+            self.logger.error(f"Query embedding not batched within {self.timeout}s")
+            return None
+
+        if any(vector is None for vector in vectors):
+            return None
+
+        return vectors
+
+    def collect(self, first_item: tuple):
+        """Items arriving within max_wait of the first one, (batch, closed)"""
+
+        batch = [ first_item ]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def run(self):
+        executor = self.executor
+
+        closed = False
+        while not closed:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            batch, closed = self.collect(first_item=item)
+            # up to max_concurrency batches in flight, the next one is collected meanwhile
+            executor.submit(self.embed_batch, batch)
+
+        executor.shutdown(wait=False)
+
+    def embed_batch(self, batch: list):
+        metrics.embedding_batch_size.observe(len(batch))
+
+        # the same query asked concurrently is embedded once
+        texts = list(dict.fromkeys(text for text, _ in batch))
+
+        try:
+            vectors = self.embedding_client.embed_text(texts=texts, document_type=DocumentTypeEnum.QUERY.value)
+        except Exception as e:
+            self.logger.error(f"Error while embedding a batch of {len(texts)} queries: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        if not vectors or len(vectors) != len(texts):
+            for _, future in batch:
+                future.set_result(None)
+            return
+
+        text_vectors = dict(zip(texts, vectors))
+        for text, future in batch:
+            future.set_result(text_vectors[text])
@@ -0,0 +1,141 @@
+from concurrent.futures import TimeoutError as FuturesTimeoutError, wait, FIRST_COMPLETED
+from collections import deque
+from helpers import metrics
+from helpers.concurrency import submit
+import threading
+import logging
+import time
+
+class GenerationHedger:
+    """
+    Sends a second generate_text request when the first one is slower than
+    the configured percentile of recent latencies, and returns whichever
+    finishes first with a usable answer.
+    """
+
+    def __init__(self, primary_client, secondary_client=None,
+                       percentile: float = 95, min_samples: int = 20,
+                       default_delay: float = 3.0, window_size: int = 200):
+
+        self.primary_client = primary_client
+        # hedge against the same backend when no other one is configured
+        self.secondary_client = secondary_client or primary_client
+
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+
+        self.latencies = deque(maxlen=window_size)
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def record_latency(self, latency: float):
+        with self.lock:
+            self.latencies.append(latency)
+
+    def get_hedge_delay(self) -> float:
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return self.default_delay
+            latencies = sorted(self.latencies)
+
+        idx = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+        return latencies[idx]
+
+    def translate_chat_history(self, chat_history: list) -> list:
+        """Rebuilds primary-formatted messages with the secondary client's roles and keys"""
+
+        if self.secondary_client is self.primary_client:
+            return list(chat_history)
+
+        role_names = { role.value: role.name for role in self.primary_client.enums }
+
+        translated = []
+        for msg in chat_history:
+            role_name = role_names.get(msg.get("role"), "USER")
+            translated.append(
+                self.secondary_client.construct_prompt(
+                    prompt=msg.get("content", msg.get("text", "")),
+                    role=self.secondary_client.enums[role_name].value,
+                )
+            )
+
+        return translated
+
+    def copy_back_chat_history(self, chat_history: list, prompt: str, winner_chat_history: list,
+                                     from_secondary: bool):
+        """Gives the caller's chat_history the winner's prompt, as a direct call would have"""
+
+        if not from_secondary or self.secondary_client is self.primary_client:
+            chat_history[:] = winner_chat_history
+            return
+
+        # the winner's messages are in the secondary's format
+        chat_history.append(
+            self.primary_client.construct_prompt(prompt=prompt, role=self.primary_client.enums.USER.value)
+        )
+
+    def generate_text(self, prompt: str, chat_history: list=[], max_output_tokens: int=None,
+                            temperature: float = None):
+
+        hedge_delay = self.get_hedge_delay()
+        metrics.llm_hedge_delay_seconds.set(hedge_delay)
+
+        # each request gets its own copy: providers append the prompt to chat_history,
+        # and the loser keeps running (and may retry) after the caller got its answer
+        primary_chat_history = list(chat_history)
+        hedge_chat_history = self.translate_chat_history(chat_history)
+
+        started_at = time.monotonic()
+        primary_future = submit(
+            self.primary_client.generate_text,
+            prompt=prompt,
+            chat_history=primary_chat_history,
+            max_output_tokens=max_output_tokens,
+            temperature=temperature,
+        )
+        primary_future.add_done_callback(
+            lambda f: self.record_latency(time.monotonic() - started_at)
+        )
+
+        try:
+            answer = primary_future.result(timeout=hedge_delay)
+            self.copy_back_chat_history(chat_history, prompt, primary_chat_history, from_secondary=False)
+            return answer
+        except FuturesTimeoutError:
+            pass
+
+        metrics.llm_hedge_fired_total.inc()
+        hedge_future = submit(
+            self.secondary_client.generate_text,
+            prompt=prompt,
+            chat_history=hedge_chat_history,
+            max_output_tokens=max_output_tokens,
+            temperature=temperature,
+        )
+
+        pending = {primary_future, hedge_future}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future.exception() is not None or not future.result():
+                    continue
+
+                # running threads can't be interrupted, the loser's result is dropped
+                for loser in pending:
+                    loser.cancel()
+
+                if future is hedge_future:
+                    metrics.llm_hedge_won_total.inc()
+                    self.copy_back_chat_history(chat_history, prompt, hedge_chat_history, from_secondary=True)
+                else:
+                    self.copy_back_chat_history(chat_history, prompt, primary_chat_history, from_secondary=False)
+
+                return future.result()
+
+        # both failed, surface the primary outcome as if hedging was off
+        self.logger.error("Both primary and hedged generation requests failed")
+        answer = primary_future.result()
+        self.copy_back_chat_history(chat_history, prompt, primary_chat_history, from_secondary=False)
+        return answer
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import List
 
 class LLMInterface(ABC):
 
@@ -16,7 +17,7 @@ class LLMInterface(ABC):
         pass
 
     @abstractmethod
-    def embed_text(self, text: str, document_type: str = None):
+    def embed_text(self, texts: List[str], document_type: str = None):
         pass
 
     @abstractmethod
@@ -1,27 +1,67 @@
 
 from .LLMEnums import LLMEnums
-from .providers import OpenAIProvider, CoHereProvider
+from .LLMRateLimiter import LLMRateLimiter, RateLimitedProvider
 
 class LLMProviderFactory:
     def __init__(self, config: dict):
         self.config = config
 
+        # one limiter per factory, so generation and embedding clients share model budgets
+        self.rate_limiter = None
+        if self.config.LLM_RATE_LIMIT_ENABLED:
+            self.rate_limiter = LLMRateLimiter(
+                requests_per_minute=self.config.LLM_REQUESTS_PER_MINUTE,
+                tokens_per_minute=self.config.LLM_TOKENS_PER_MINUTE,
+                initial_concurrency=self.config.LLM_INITIAL_CONCURRENCY,
+                min_concurrency=self.config.LLM_MIN_CONCURRENCY,
+                max_concurrency=self.config.LLM_MAX_CONCURRENCY,
+                max_retries=self.config.LLM_MAX_RETRIES,
+                retry_base_delay=self.config.LLM_RETRY_BASE_DELAY,
+                retry_max_delay=self.config.LLM_RETRY_MAX_DELAY,
+            )
+
     def create(self, provider: str):
+        llm_provider = self.create_provider(provider=provider)
+
+        if llm_provider and self.rate_limiter:
+            return RateLimitedProvider(provider=llm_provider, rate_limiter=self.rate_limiter)
+
+        return llm_provider
+
+    def create_provider(self, provider: str):
         if provider == LLMEnums.OPENAI.value:
+            from .providers.OpenAIProvider import OpenAIProvider
             return OpenAIProvider(
                 api_key = self.config.OPENAI_API_KEY,
                 api_url = self.config.OPENAI_API_URL,
                 default_input_max_characters=self.config.INPUT_DAFAULT_MAX_CHARACTERS,
                 default_generation_max_output_tokens=self.config.GENERATION_DAFAULT_MAX_TOKENS,
-                default_generation_temperature=self.config.GENERATION_DAFAULT_TEMPERATURE
+                default_generation_temperature=self.config.GENERATION_DAFAULT_TEMPERATURE,
+                max_retries=0 if self.rate_limiter else 2,
             )
 
         if provider == LLMEnums.COHERE.value:
+            from .providers.CoHereProvider import CoHereProvider
             return CoHereProvider(
                 api_key = self.config.COHERE_API_KEY,
                 default_input_max_characters=self.config.INPUT_DAFAULT_MAX_CHARACTERS,
                 default_generation_max_output_tokens=self.config.GENERATION_DAFAULT_MAX_TOKENS,
-                default_generation_temperature=self.config.GENERATION_DAFAULT_TEMPERATURE
+                default_generation_temperature=self.config.GENERATION_DAFAULT_TEMPERATURE,
+                max_retries=0 if self.rate_limiter else 2,
+            )
+
+        if provider == LLMEnums.FAKE.value:
+            from .providers.FakeProvider import FakeProvider
+            return FakeProvider(
+                default_input_max_characters=self.config.INPUT_DAFAULT_MAX_CHARACTERS,
+                default_generation_max_output_tokens=self.config.GENERATION_DAFAULT_MAX_TOKENS,
+                default_generation_temperature=self.config.GENERATION_DAFAULT_TEMPERATURE,
+                generation_latency_ms=self.config.FAKE_LLM_GENERATION_LATENCY_MS,
+                embedding_latency_ms=self.config.FAKE_LLM_EMBEDDING_LATENCY_MS,
+                latency_jitter=self.config.FAKE_LLM_LATENCY_JITTER,
+                error_rate=self.config.FAKE_LLM_ERROR_RATE,
+                throttle_rate=self.config.FAKE_LLM_THROTTLE_RATE,
+                seed=self.config.FAKE_LLM_SEED,
             )
 
         return None
@@ -0,0 +1,309 @@
+from .LLMInterface import LLMInterface
+from helpers import metrics
+from email.utils import parsedate_to_datetime
+from typing import List
+import datetime
+import threading
+import logging
+import random
+import time
+import sys
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# SDK connection and timeout errors that don't derive from the builtin ones
+# (openai.APITimeoutError is an APIConnectionError, cohere raises httpx's)
+RETRYABLE_SDK_ERRORS = (("openai", "APIConnectionError"), ("httpx", "TransportError"))
+
+def estimate_tokens(text: str) -> int:
+    # rough provider-agnostic estimate, good enough for budgeting tokens/min
+    return max(1, len(text or "") // 4)
+
+def get_error_status_code(error: Exception):
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code
+
+def is_connection_error(error: Exception) -> bool:
+    error_types = [ ConnectionError, TimeoutError ]
+    for module_name, class_name in RETRYABLE_SDK_ERRORS:
+        # an SDK's errors can only be raised once it is imported
+        module = sys.modules.get(module_name)
+        if module is not None and hasattr(module, class_name):
+            error_types.append(getattr(module, class_name))
+
+    return isinstance(error, tuple(error_types))
+
+def get_error_retry_after(error: Exception):
+    """Reads Retry-After (seconds or HTTP date) from the error response headers"""
+
+    headers = getattr(getattr(error, "response", None), "headers", None) \
+              or getattr(error, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+        now = datetime.datetime.now(tz=retry_at.tzinfo)
+        return max(0.0, (retry_at - now).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Per-minute token bucket; reserve() returns how long the caller has to wait"""
+
+    def __init__(self, capacity_per_minute: int):
+        self.capacity = float(capacity_per_minute)
+        self.refill_rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        amount = min(float(amount), self.capacity)
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+            self.updated_at = now
+
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+
+            return -self.tokens / self.refill_rate
+
+
+class AIMDLimiter:
+    """Additive-increase / multiplicative-decrease cap on concurrent calls"""
+
+    def __init__(self, initial_limit: int, min_limit: int, max_limit: int,
+                       decrease_factor: float = 0.5):
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.decrease_factor = decrease_factor
+
+        self.inflight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.inflight >= int(self.limit):
+                self.condition.wait()
+            self.inflight += 1
+
+    def release(self):
+        with self.condition:
+            self.inflight -= 1
+            self.condition.notify_all()
+
+    def on_success(self):
+        with self.condition:
+            # +1 slot per "round" of limit successful calls
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+    def on_throttled(self):
+        with self.condition:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+
+class ModelRateLimiter:
+
+    def __init__(self, model_id: str, requests_per_minute: int, tokens_per_minute: int,
+                       initial_concurrency: int, min_concurrency: int, max_concurrency: int):
+
+        self.model_id = model_id
+        self.requests_bucket = TokenBucket(requests_per_minute)
+        self.tokens_bucket = TokenBucket(tokens_per_minute)
+        self.concurrency = AIMDLimiter(
+            initial_limit=initial_concurrency,
+            min_limit=min_concurrency,
+            max_limit=max_concurrency,
+        )
+
+        # set from Retry-After, every caller on this model waits until then
+        self.paused_until = 0.0
+
+        metrics.llm_rate_limit_requests_per_minute.labels(model=model_id).set(requests_per_minute)
+        metrics.llm_rate_limit_tokens_per_minute.labels(model=model_id).set(tokens_per_minute)
+        self.report()
+
+    def report(self):
+        metrics.llm_rate_limit_concurrency.labels(model=self.model_id).set(self.concurrency.limit)
+        metrics.llm_rate_limit_inflight.labels(model=self.model_id).set(self.concurrency.inflight)
+
+    def wait_for_capacity(self, tokens: int):
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+
+        wait = max(
+            self.requests_bucket.reserve(1),
+            self.tokens_bucket.reserve(tokens),
+        )
+        if wait > 0:
+            time.sleep(wait)
+
+        self.concurrency.acquire()
+        self.report()
+
+    def release(self, throttled: bool = False, retry_after: float = None):
+        if throttled:
+            self.concurrency.on_throttled()
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        else:
+            self.concurrency.on_success()
+
+        self.concurrency.release()
+        self.report()
+
+
+class LLMRateLimiter:
+    """Shared client-side limiter keyed by model id, with jittered retries"""
+
+    def __init__(self, requests_per_minute: int = 500,
+                       tokens_per_minute: int = 200000,
+                       initial_concurrency: int = 4,
+                       min_concurrency: int = 1,
+                       max_concurrency: int = 32,
+                       max_retries: int = 5,
+                       retry_base_delay: float = 0.5,
+                       retry_max_delay: float = 30.0):
+
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+        self.model_limiters = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def get_model_limiter(self, model_id: str) -> ModelRateLimiter:
+        with self.lock:
+            if model_id not in self.model_limiters:
+                self.model_limiters[model_id] = ModelRateLimiter(
+                    model_id=model_id,
+                    requests_per_minute=self.requests_per_minute,
+                    tokens_per_minute=self.tokens_per_minute,
+                    initial_concurrency=self.initial_concurrency,
+                    min_concurrency=self.min_concurrency,
+                    max_concurrency=self.max_concurrency,
+                )
+            return self.model_limiters[model_id]
+
+    def get_backoff_delay(self, attempt: int, retry_after: float = None) -> float:
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.retry_base_delay)
+
+        # full jitter
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+
+    def call(self, model_id: str, tokens: int, func, *args, **kwargs):
+        model_limiter = self.get_model_limiter(model_id=str(model_id))
+
+        attempt = 0
+        while True:
+            model_limiter.wait_for_capacity(tokens=tokens)
+
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                status_code = get_error_status_code(e)
+                throttled = status_code == 429
+                retry_after = get_error_retry_after(e) if throttled else None
+
+                model_limiter.release(throttled=throttled, retry_after=retry_after)
+
+                if throttled:
+                    metrics.llm_rate_limited_total.labels(model=model_limiter.model_id).inc()
+
+                retryable = status_code in RETRYABLE_STATUS_CODES or is_connection_error(e)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+
+                delay = self.get_backoff_delay(attempt=attempt, retry_after=retry_after)
+                self.logger.warning(f"Retrying {model_id} call in {delay:.2f}s after error: {e}")
+                metrics.llm_retries_total.labels(model=model_limiter.model_id).inc()
+
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            model_limiter.release()
+            return result
+
+
+class RateLimitedProvider(LLMInterface):
+    """Wraps an LLMInterface provider so every call goes through the shared LLMRateLimiter"""
+
+    def __init__(self, provider: LLMInterface, rate_limiter: LLMRateLimiter):
+        self.provider = provider
+        self.rate_limiter = rate_limiter
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+    def set_generation_model(self, model_id: str):
+        self.provider.set_generation_model(model_id=model_id)
+
+    def set_embedding_model(self, model_id: str, embedding_size: int):
+        self.provider.set_embedding_model(model_id=model_id, embedding_size=embedding_size)
+
+    def generate_text(self, prompt: str, chat_history: list=[], max_output_tokens: int=None,
+                            temperature: float = None):
+
+        max_output_tokens = max_output_tokens if max_output_tokens else self.provider.default_generation_max_output_tokens
+        tokens = estimate_tokens(prompt) + max_output_tokens + sum(
+            estimate_tokens(str(msg)) for msg in chat_history
+        )
+
+        # providers may append the prompt to chat_history, undo it before a retry
+        history_size = len(chat_history)
+
+        def generate():
+            del chat_history[history_size:]
+            return self.provider.generate_text(
+                prompt=prompt,
+                chat_history=chat_history,
+                max_output_tokens=max_output_tokens,
+                temperature=temperature,
+            )
+
+        return self.rate_limiter.call(self.provider.generation_model_id, tokens, generate)
+
+    def embed_text(self, texts: List[str], document_type: str = None):
+        tokens = sum(estimate_tokens(text) for text in texts)
+
+        return self.rate_limiter.call(
+            self.provider.embedding_model_id, tokens,
+            self.provider.embed_text, texts=texts, document_type=document_type,
+        )
+
+    def construct_prompt(self, prompt: str, role: str):
+        return self.provider.construct_prompt(prompt=prompt, role=role)
@@ -0,0 +1,58 @@
+from functools import lru_cache
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+ARABIC_CHARS_REGEX = re.compile(r"[؀-ۿݐ-ݿࢠ-ࣿﭐ-﷿ﹰ-﻿]")
+
+class EstimatedTokenizer:
+    """
+    Offline fallback when no real tokenizer is available. BPE vocabularies
+    split Arabic far more aggressively than English, so Arabic characters
+    are counted at ~2.5 chars/token and everything else at ~4 chars/token.
+    """
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+
+        arabic_chars = len(ARABIC_CHARS_REGEX.findall(text))
+        other_chars = len(text) - arabic_chars
+
+        return int(arabic_chars / 2.5 + other_chars / 4) + 1
+
+
+class TiktokenTokenizer:
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=16)
+def get_tokenizer(model_id: str = None):
+    """Returns a cached tokenizer for model_id, falling back to an estimate"""
+
+    try:
+        import tiktoken
+    except ImportError:
+        return EstimatedTokenizer()
+
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model_id or "")
+        except KeyError:
+            # non-OpenAI models, closest general purpose encoding
+            encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # encodings are downloaded on first use, may fail offline
+        logger.warning(f"Falling back to estimated token counts for {model_id}: {e}")
+        return EstimatedTokenizer()
+
+    return TiktokenTokenizer(encoding=encoding)
@@ -1,6 +1,7 @@
 from typing import List
 from ..LLMInterface import LLMInterface
-from ..LLMEnums import CoHereEnums, DocumentTypeEnum
+from ..LLMEnums import CoHereEnums, DocumentTypeEnum, LLMEnums
+from helpers.metrics import track_stage, count_tokens
 import cohere
 import logging
 
@@ -9,7 +10,8 @@ class CoHereProvider(LLMInterface):
     def __init__(self, api_key: str,
                        default_input_max_characters: int=1000,
                        default_generation_max_output_tokens: int=1000,
-                       default_generation_temperature: float=0.1):
+                       default_generation_temperature: float=0.1,
+                       max_retries: int=0):
         
         self.api_key = api_key
 
@@ -23,6 +25,8 @@ class CoHereProvider(LLMInterface):
         self.embedding_size = None
 
         self.client = cohere.Client(api_key=self.api_key)
+        # per request in this SDK, 0 when wrapped by the LLMRateLimiter
+        self.request_options = { "max_retries": max_retries }
 
         self.enums = CoHereEnums
         self.logger = logging.getLogger(__name__)
@@ -34,6 +38,10 @@ class CoHereProvider(LLMInterface):
         self.embedding_model_id = model_id
         self.embedding_size = embedding_size
 
+    def get_billed_units(self, response):
+        meta = getattr(response, "meta", None)
+        return getattr(meta, "billed_units", None)
+
     def process_text(self, text: str):
         return text[:self.default_input_max_characters].strip()
 
@@ -51,13 +59,21 @@ class CoHereProvider(LLMInterface):
         max_output_tokens = max_output_tokens if max_output_tokens else self.default_generation_max_output_tokens
         temperature = temperature if temperature else self.default_generation_temperature
 
-        response = self.client.chat(
-            model = self.generation_model_id,
-            chat_history = chat_history,
-            message = self.process_text(prompt),
-            temperature = temperature,
-            max_tokens = max_output_tokens
-        )
+        with track_stage("generate", backend=LLMEnums.COHERE.value):
+            response = self.client.chat(
+                model = self.generation_model_id,
+                chat_history = chat_history,
+                message = self.process_text(prompt),
+                temperature = temperature,
+                max_tokens = max_output_tokens,
+                request_options = self.request_options,
+            )
+
+        billed_units = self.get_billed_units(response)
+        if billed_units:
+            count_tokens(tokens_in=billed_units.input_tokens,
+                         tokens_out=billed_units.output_tokens,
+                         backend=LLMEnums.COHERE.value)
 
         if not response or not response.text:
             self.logger.error("Error while generating text with CoHere")
@@ -78,12 +94,18 @@ class CoHereProvider(LLMInterface):
         if document_type == DocumentTypeEnum.QUERY:
             input_type = CoHereEnums.QUERY
 
-        response = self.client.embed(
-            model = self.embedding_model_id,
-            texts = texts,
-            input_type = input_type,
-            embedding_types=['float'],
-        )
+        with track_stage("embed", backend=LLMEnums.COHERE.value):
+            response = self.client.embed(
+                model = self.embedding_model_id,
+                texts = texts,
+                input_type = input_type,
+                embedding_types=['float'],
+                request_options=self.request_options,
+            )
+
+        billed_units = self.get_billed_units(response)
+        if billed_units:
+            count_tokens(tokens_in=billed_units.input_tokens, backend=LLMEnums.COHERE.value)
 
         if not response or not response.embeddings or not response.embeddings.float:
             self.logger.error("Error while embedding text with CoHere")
@@ -0,0 +1,149 @@
+from typing import List
+from ..LLMInterface import LLMInterface
+from ..LLMEnums import OpenAIEnums, LLMEnums
+from helpers.metrics import track_stage, count_tokens
+import hashlib
+import logging
+import random
+import math
+import time
+import re
+
+WORD_REGEX = re.compile(r"\w+", re.UNICODE)
+
+class FakeProviderError(Exception):
+    """Mimics an HTTP error from a provider SDK, so retries and rate limiting kick in"""
+
+    def __init__(self, status_code: int, retry_after: float = None):
+        super().__init__(f"Fake provider error {status_code}")
+        self.status_code = status_code
+        self.headers = { "retry-after": str(retry_after) } if retry_after else {}
+
+
+class FakeProvider(LLMInterface):
+    """
+    Offline provider for load tests. Embeddings are deterministic hashed
+    bag-of-words vectors (texts sharing words get similar vectors), generation
+    returns a canned answer after a simulated latency, and a configurable share
+    of calls fails with 429 or 503.
+    """
+
+    def __init__(self, default_input_max_characters: int=1000,
+                       default_generation_max_output_tokens: int=1000,
+                       default_generation_temperature: float=0.1,
+                       generation_latency_ms: float=800, embedding_latency_ms: float=50,
+                       latency_jitter: float=0.3, error_rate: float=0.0, throttle_rate: float=0.0,
+                       seed: int=0):
+
+        self.default_input_max_characters = default_input_max_characters
+        self.default_generation_max_output_tokens = default_generation_max_output_tokens
+        self.default_generation_temperature = default_generation_temperature
+
+        self.generation_latency_ms = generation_latency_ms
+        self.embedding_latency_ms = embedding_latency_ms
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+
+        self.generation_model_id = None
+
+        self.embedding_model_id = None
+        self.embedding_size = None
+
+        self.random = random.Random(seed)
+
+        self.enums = OpenAIEnums
+        self.logger = logging.getLogger(__name__)
+
+    def set_generation_model(self, model_id: str):
+        self.generation_model_id = model_id
+
+    def set_embedding_model(self, model_id: str, embedding_size: int):
+        self.embedding_model_id = model_id
+        self.embedding_size = embedding_size
+
+    def process_text(self, text: str):
+        return text[:self.default_input_max_characters].strip()
+
+    def simulate_call(self, latency_ms: float):
+        """Sleeps for a log-normally jittered latency, then maybe raises"""
+
+        if latency_ms > 0:
+            sigma = self.latency_jitter
+            # mean of the log-normal stays at latency_ms
+            latency = latency_ms * self.random.lognormvariate(-sigma * sigma / 2, sigma) if sigma > 0 else latency_ms
+            time.sleep(latency / 1000)
+
+        draw = self.random.random()
+        if draw < self.throttle_rate:
+            raise FakeProviderError(status_code=429, retry_after=1)
+        if draw < self.throttle_rate + self.error_rate:
+            raise FakeProviderError(status_code=503)
+
+    def generate_text(self, prompt: str, chat_history: list=[], max_output_tokens: int=None,
+                            temperature: float = None):
+
+        if not self.generation_model_id:
+            self.logger.error("Generation model for Fake provider was not set")
+            return None
+
+        max_output_tokens = max_output_tokens if max_output_tokens else self.default_generation_max_output_tokens
+        max_output_words = min(max_output_tokens or 50, 50)
+
+        chat_history.append(
+            self.construct_prompt(prompt=prompt, role=OpenAIEnums.USER.value)
+        )
+
+        with track_stage("generate", backend=LLMEnums.FAKE.value):
+            self.simulate_call(latency_ms=self.generation_latency_ms)
+
+        # canned answer, deterministic for a given prompt
+        words = WORD_REGEX.findall(prompt)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        answer = f"Fake answer {digest}: " + " ".join(words[-max_output_words:])
+
+        count_tokens(tokens_in=sum(len(msg["content"]) for msg in chat_history) // 4,
+                     tokens_out=len(answer) // 4,
+                     backend=LLMEnums.FAKE.value)
+
+        return answer
+
+    def hash_word(self, word: str):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=16).digest()
+        # 4 (index, sign) pairs per word
+        return [
+            (int.from_bytes(digest[i:i + 4], "little") % self.embedding_size,
+             1.0 if digest[i] & 1 else -1.0)
+            for i in range(0, 16, 4)
+        ]
+
+    def embed_single(self, text: str) -> list:
+        vector = [0.0] * self.embedding_size
+
+        words = WORD_REGEX.findall(text.lower()) or [text]
+        for word in words:
+            for index, sign in self.hash_word(word):
+                vector[index] += sign
+
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [ value / norm for value in vector ]
+
+    def embed_text(self, texts: List[str], document_type: str = None):
+
+        if not self.embedding_model_id or not self.embedding_size:
+            self.logger.error("Embedding model for Fake provider was not set")
+            return None
+
+        with track_stage("embed", backend=LLMEnums.FAKE.value):
+            self.simulate_call(latency_ms=self.embedding_latency_ms)
+            vectors = [ self.embed_single(text=text) for text in texts ]
+
+        count_tokens(tokens_in=sum(len(text) for text in texts) // 4, backend=LLMEnums.FAKE.value)
+
+        return vectors
+
+    def construct_prompt(self, prompt: str, role: str):
+        return {
+            "role": role,
+            "content": prompt,
+        }
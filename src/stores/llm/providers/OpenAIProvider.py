@@ -1,5 +1,7 @@
+from typing import List
 from ..LLMInterface import LLMInterface
-from ..LLMEnums import OpenAIEnums
+from ..LLMEnums import OpenAIEnums, LLMEnums
+from helpers.metrics import track_stage, count_tokens
 from openai import OpenAI
 import logging
 
@@ -8,7 +10,8 @@ class OpenAIProvider(LLMInterface):
     def __init__(self, api_key: str, api_url: str=None,
                        default_input_max_characters: int=1000,
                        default_generation_max_output_tokens: int=1000,
-                       default_generation_temperature: float=0.1):
+                       default_generation_temperature: float=0.1,
+                       max_retries: int=2):
         
         self.api_key = api_key
         self.api_url = api_url
@@ -22,9 +25,11 @@ class OpenAIProvider(LLMInterface):
         self.embedding_model_id = None
         self.embedding_size = None
 
+        # 0 when wrapped by the LLMRateLimiter, which must see every 429 itself
         self.client = OpenAI(
             api_key = self.api_key,
-            base_url = self.api_url if self.api_url and len(self.api_url) else None
+            base_url = self.api_url if self.api_url and len(self.api_url) else None,
+            max_retries = max_retries,
         )
 
         self.enums = OpenAIEnums
@@ -58,12 +63,18 @@ class OpenAIProvider(LLMInterface):
             self.construct_prompt(prompt=prompt, role=OpenAIEnums.USER.value)
         )
 
-        response = self.client.chat.completions.create(
-            model = self.generation_model_id,
-            messages = chat_history,
-            max_tokens = max_output_tokens,
-            temperature = temperature
-        )
+        with track_stage("generate", backend=LLMEnums.OPENAI.value):
+            response = self.client.chat.completions.create(
+                model = self.generation_model_id,
+                messages = chat_history,
+                max_tokens = max_output_tokens,
+                temperature = temperature
+            )
+
+        if response and response.usage:
+            count_tokens(tokens_in=response.usage.prompt_tokens,
+                         tokens_out=response.usage.completion_tokens,
+                         backend=LLMEnums.OPENAI.value)
 
         if not response or not response.choices or len(response.choices) == 0 or not response.choices[0].message:
             self.logger.error("Error while generating text with OpenAI")
@@ -72,7 +83,7 @@ class OpenAIProvider(LLMInterface):
         return response.choices[0].message.content
 
 
-    def embed_text(self, text: str, document_type: str = None):
+    def embed_text(self, texts: List[str], document_type: str = None):
         
         if not self.client:
             self.logger.error("OpenAI client was not set")
@@ -82,16 +93,20 @@ class OpenAIProvider(LLMInterface):
             self.logger.error("Embedding model for OpenAI was not set")
             return None
         
-        response = self.client.embeddings.create(
-            model = self.embedding_model_id,
-            input = text,
-        )
+        with track_stage("embed", backend=LLMEnums.OPENAI.value):
+            response = self.client.embeddings.create(
+                model = self.embedding_model_id,
+                input = texts,
+            )
+
+        if response and response.usage:
+            count_tokens(tokens_in=response.usage.prompt_tokens, backend=LLMEnums.OPENAI.value)
 
         if not response or not response.data or len(response.data) == 0 or not response.data[0].embedding:
             self.logger.error("Error while embedding text with OpenAI")
             return None
 
-        return response.data[0].embedding
+        return [ rec.embedding for rec in response.data ]
 
     def construct_prompt(self, prompt: str, role: str):
         return {
@@ -1,2 +1 @@
-from .CoHereProvider import CoHereProvider
-from .OpenAIProvider import OpenAIProvider
+# providers import their SDKs (openai, cohere), LLMProviderFactory imports the one it creates
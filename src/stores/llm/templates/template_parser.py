@@ -1,4 +1,5 @@
 import os
+from helpers.metrics import track_stage
 
 class TemplateParser:
 
@@ -40,4 +41,5 @@ class TemplateParser:
             return None
         
         key_attribute = getattr(module, key)
-        return key_attribute.substitute(vars)
+        with track_stage("template_render"):
+            return key_attribute.substitute(vars)
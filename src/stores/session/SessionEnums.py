@@ -0,0 +1,5 @@
+from enum import Enum
+
+class EntityExtractionEnum(Enum):
+    SYNC = "sync"
+    BACKGROUND = "background"
@@ -0,0 +1,213 @@
+from collections import OrderedDict, deque
+import datetime
+import threading
+import asyncio
+import logging
+import time
+import uuid
+
+class SessionStore:
+    """
+    In-memory LRU of per-session chat state (a ring buffer of the last messages,
+    session entities and rewritten queries) with TTL expiry. When a session_model
+    is given, changed sessions are written behind to Postgres and sessions missing
+    from memory are loaded back from it.
+
+    With write_through (several workers or replicas sharing the sessions) the
+    memory copy can't be trusted: sessions are always loaded from Postgres and
+    saved as soon as a request changes them.
+    """
+
+    def __init__(self, max_sessions: int = 10000, max_messages: int = 5,
+                       ttl_seconds: int = 86400, session_model=None,
+                       write_through: bool = False):
+
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.session_model = session_model
+        self.write_through = write_through and session_model is not None
+
+        self.sessions = OrderedDict()
+        # session_id -> serialized session, waiting for the next flush
+        self.dirty_sessions = {}
+
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def create_session_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def new_session(self, data: dict = None) -> dict:
+        data = data or {}
+        return {
+            "messages": deque(data.get("messages", []), maxlen=self.max_messages),
+            "entities": list(data.get("entities", [])),
+            "rewritten_queries": deque(data.get("rewritten_queries", []), maxlen=self.max_messages),
+            "updated_at": data.get("updated_at", time.time()),
+        }
+
+    def serialize_session(self, session: dict) -> dict:
+        return {
+            "messages": list(session["messages"]),
+            "entities": list(session["entities"]),
+            "rewritten_queries": list(session["rewritten_queries"]),
+            "updated_at": session["updated_at"],
+        }
+
+    def is_expired(self, session: dict) -> bool:
+        return time.time() - session["updated_at"] > self.ttl_seconds
+
+    def put_session(self, session_id: str, session: dict):
+        # caller holds the lock
+        self.sessions[session_id] = session
+        self.sessions.move_to_end(session_id)
+        if len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+    def touch_session(self, session_id: str, session: dict):
+        # caller holds the lock
+        session["updated_at"] = time.time()
+        if self.session_model:
+            self.dirty_sessions[session_id] = self.serialize_session(session)
+
+    def get_session(self, session_id: str) -> dict:
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+
+            if self.is_expired(session):
+                del self.sessions[session_id]
+                return None
+
+            self.sessions.move_to_end(session_id)
+            return session
+
+    def get_or_create_session(self, session_id: str) -> dict:
+        session = self.get_session(session_id=session_id)
+        if session is not None:
+            return session
+
+        with self.lock:
+            session = self.new_session()
+            self.put_session(session_id=session_id, session=session)
+            return session
+
+    async def load_session(self, session_id: str) -> dict:
+        """Returns the session from memory, falling back to Postgres when persistence is on"""
+
+        session = self.get_session(session_id=session_id)
+        if not self.session_model or (session is not None and not self.write_through):
+            return session
+
+        with self.lock:
+            if session_id in self.dirty_sessions:
+                # changed here and not saved yet, newer than the stored copy
+                return session
+
+        try:
+            record = await self.session_model.get_session(session_id=session_id)
+        except Exception as e:
+            self.logger.error(f"Error while loading chat session: {e}")
+            return None
+
+        if record is None:
+            return session
+
+        loaded_session = self.new_session(data=record.session_data)
+        if self.is_expired(loaded_session):
+            return None
+
+        with self.lock:
+            # a concurrent request may have created or changed it meanwhile
+            if session_id in self.sessions and (not self.write_through or session_id in self.dirty_sessions):
+                return self.sessions[session_id]
+            self.put_session(session_id=session_id, session=loaded_session)
+
+        return loaded_session
+
+    async def save_session(self, session_id: str):
+        """Writes a changed session right away in write_through mode, a no-op otherwise"""
+
+        if not self.write_through:
+            return
+
+        with self.lock:
+            session_data = self.dirty_sessions.pop(session_id, None)
+
+        if session_data is None:
+            return
+
+        try:
+            await self.session_model.upsert_sessions(sessions={ session_id: session_data })
+        except Exception as e:
+            self.logger.error(f"Error while saving chat session: {e}")
+            with self.lock:
+                # left to the write-behind flush
+                self.dirty_sessions.setdefault(session_id, session_data)
+
+    def get_chat_history(self, session_id: str) -> list:
+        session = self.get_session(session_id=session_id)
+        if session is None:
+            return None
+
+        with self.lock:
+            return [
+                { "role": role, "content": content }
+                for role, content in session["messages"]
+            ]
+
+    def get_entities(self, session_id: str) -> list:
+        session = self.get_session(session_id=session_id)
+        if session is None:
+            return None
+
+        with self.lock:
+            return list(session["entities"])
+
+    def set_entities(self, session_id: str, entities: list):
+        session = self.get_or_create_session(session_id=session_id)
+
+        with self.lock:
+            session["entities"] = list(entities or [])
+            self.touch_session(session_id=session_id, session=session)
+
+    def append_turn(self, session_id: str, query: str, answer: str, rewritten_query: str = None):
+        session = self.get_or_create_session(session_id=session_id)
+
+        with self.lock:
+            session["messages"].append(("user", query))
+            session["messages"].append(("assistant", answer))
+            if rewritten_query:
+                session["rewritten_queries"].append(rewritten_query)
+            self.touch_session(session_id=session_id, session=session)
+
+    async def flush(self):
+        """Writes changed sessions to Postgres and drops expired ones there"""
+
+        if not self.session_model:
+            return 0
+
+        with self.lock:
+            dirty_sessions, self.dirty_sessions = self.dirty_sessions, {}
+
+        try:
+            written = await self.session_model.upsert_sessions(sessions=dirty_sessions)
+            await self.session_model.delete_expired_sessions(
+                updated_before=datetime.datetime.now(tz=datetime.timezone.utc)
+                               - datetime.timedelta(seconds=self.ttl_seconds)
+            )
+        except Exception as e:
+            self.logger.error(f"Error while flushing chat sessions: {e}")
+            with self.lock:
+                # keep newer in-memory writes, retry the rest on the next flush
+                self.dirty_sessions = { **dirty_sessions, **self.dirty_sessions }
+            return 0
+
+        return written
+
+    async def run_write_behind(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
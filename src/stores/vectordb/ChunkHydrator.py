@@ -0,0 +1,63 @@
+from helpers.cache import LRUCache
+from helpers.concurrency import run_on_event_loop
+from helpers.metrics import track_stage
+import logging
+
+class ChunkHydrator:
+    """
+    Fills in the texts of search results stored with lean payloads (chunk ids
+    only): from an LRU cache first, then with one batched query for the rest.
+    Chunk texts never change under a chunk_id, so entries need no invalidation.
+    """
+
+    def __init__(self, chunk_model, cache_size: int = 20000, timeout: float = 10.0):
+        self.chunk_model = chunk_model
+        self.cache = LRUCache(max_size=cache_size, name="chunk_text")
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+
+    def get_texts(self, chunk_ids: list) -> dict:
+        texts = {}
+        missing_ids = []
+        for chunk_id in chunk_ids:
+            text = self.cache.get(chunk_id)
+            if text is None:
+                missing_ids.append(chunk_id)
+            else:
+                texts[chunk_id] = text
+
+        if missing_ids:
+            # controllers run in worker threads, the async session lives on the event loop
+            with track_stage("chunk_hydrate", backend="postgres"):
+                loaded = run_on_event_loop(
+                    self.chunk_model.get_chunks_texts(chunk_ids=missing_ids),
+                    timeout=self.timeout,
+                )
+
+            for chunk_id, text in loaded.items():
+                self.cache.put(chunk_id, text)
+                texts[chunk_id] = text
+
+        return texts
+
+    def hydrate(self, documents: list) -> list:
+        chunk_ids = list({ doc.chunk_id for doc in documents if not doc.text and doc.chunk_id is not None })
+        if not chunk_ids:
+            return documents
+
+        try:
+            texts = self.get_texts(chunk_ids=chunk_ids)
+        except Exception as e:
+            self.logger.error(f"Error while hydrating chunk texts: {e}")
+            texts = {}
+
+        hydrated = []
+        for doc in documents:
+            if not doc.text:
+                if doc.chunk_id is None or doc.chunk_id not in texts:
+                    # chunk deleted since it was indexed, or neither text nor chunk_id stored
+                    continue
+                doc = doc.model_copy(update={ "text": texts[doc.chunk_id] })
+            hydrated.append(doc)
+
+        return hydrated
@@ -6,3 +6,9 @@ class VectorDBEnums(Enum):
 class DistanceMethodEnums(Enum):
     COSINE = "cosine"
     DOT = "dot"
+
+class CompactProjectionEnums(Enum):
+    # leading dimensions, for Matryoshka embeddings (e.g. text-embedding-3-*)
+    TRUNCATE = "truncate"
+    # per collection PCA, for any embedding model
+    PCA = "pca"
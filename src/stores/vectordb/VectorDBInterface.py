@@ -12,6 +12,11 @@ class VectorDBInterface(ABC):
     def disconnect(self):
         pass
 
+    @abstractmethod
+    def warmup(self):
+        """Loads collections ahead of the first request, see /health/ready"""
+        pass
+
     @abstractmethod
     def is_collection_existed(self, collection_name: str) -> bool:
         pass
@@ -43,7 +48,9 @@ class VectorDBInterface(ABC):
     @abstractmethod
     def insert_many(self, collection_name: str, texts: list, 
                           vectors: list, metadata: list = None, 
-                          record_ids: list = None, batch_size: int = 50):
+                          record_ids: list = None, batch_size: int = 50,
+                          extra_payloads: list = None):
+        """extra_payloads: optional per-record fields stored next to text and metadata"""
         pass
 
     @abstractmethod
@@ -59,4 +66,23 @@ class VectorDBInterface(ABC):
     def delete_by_tags(self, collection_name: str, tags: List[str]) -> int:
         """Delete records that match any of the given tags. Returns count of deleted records."""
         pass
-    
\ No newline at end of file
+
+    @abstractmethod
+    def delete_by_asset_ids(self, collection_name: str, asset_ids: List[int]) -> bool:
+        """Delete the records of chunks of the given assets"""
+        pass
+
+    @abstractmethod
+    def get_tags_by_asset_ids(self, collection_name: str, asset_ids: List[int]) -> List[List[str]]:
+        """Distinct tag sets of the records of chunks of the given assets"""
+        pass
+
+    @abstractmethod
+    def fit_compact_projection(self, collection_name: str, method: str, sample_size: int = 20000):
+        """Rebuilds the compact vectors of a two-stage collection. Returns the count of updated records."""
+        pass
+
+    @abstractmethod
+    def evaluate_search(self, collection_name: str, num_queries: int = 100, limit: int = 10) -> dict:
+        """recall@limit and latency of two-stage search against exact search"""
+        pass
@@ -1,6 +1,6 @@
-from .providers import QdrantDBProvider
 from .VectorDBEnums import VectorDBEnums
 from controllers.BaseController import BaseController
+from helpers.compression import get_text_compressor
 
 class VectorDBProviderFactory:
     def __init__(self, config):
@@ -9,11 +9,20 @@ class VectorDBProviderFactory:
 
     def create(self, provider: str):
         if provider == VectorDBEnums.QDRANT.value:
+            from .providers.QdrantDBProvider import QdrantDBProvider
             db_path = self.base_controller.get_database_path(db_name=self.config.VECTOR_DB_PATH)
 
             return QdrantDBProvider(
                 db_path=db_path,
                 distance_method=self.config.VECTOR_DB_DISTANCE_METHOD,
+                lean_payload=self.config.VECTOR_DB_LEAN_PAYLOAD,
+                text_compressor=get_text_compressor(),
+                two_stage=self.config.VECTOR_DB_TWO_STAGE_ENABLED,
+                compact_size=self.config.VECTOR_DB_COMPACT_SIZE,
+                rescore_oversampling=self.config.VECTOR_DB_RESCORE_OVERSAMPLING,
+                url=self.config.VECTOR_DB_URL,
+                api_key=self.config.VECTOR_DB_API_KEY,
+                projection_refresh_interval=self.config.VECTOR_DB_PROJECTION_REFRESH_INTERVAL,
             )
         
         return None
@@ -0,0 +1,59 @@
+from .VectorDBEnums import CompactProjectionEnums
+import numpy as np
+import io
+
+class VectorProjection:
+    """
+    Maps full embeddings to the compact vectors searched in the first stage of
+    two-stage retrieval: their leading dimensions, or a PCA learned on a collection.
+    """
+
+    def __init__(self, method: str, size: int, mean: np.ndarray = None, components: np.ndarray = None):
+        self.method = method
+        self.size = size
+        self.mean = mean
+        # (size, embedding_size), rows are the principal axes
+        self.components = components
+
+    @classmethod
+    def truncation(cls, size: int):
+        return cls(method=CompactProjectionEnums.TRUNCATE.value, size=size)
+
+    @classmethod
+    def fit_pca(cls, vectors: np.ndarray, size: int):
+        if len(vectors) < size:
+            raise ValueError(f"PCA to {size} dimensions needs at least {size} vectors, got {len(vectors)}")
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        mean = vectors.mean(axis=0)
+        _, _, components = np.linalg.svd(vectors - mean, full_matrices=False)
+
+        return cls(method=CompactProjectionEnums.PCA.value, size=size,
+                   mean=mean, components=components[:size])
+
+    def project(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        if self.method == CompactProjectionEnums.PCA.value:
+            return (vectors - self.mean) @ self.components.T
+
+        return vectors[..., :self.size]
+
+    def to_bytes(self) -> bytes:
+        arrays = { "method": np.array(self.method), "size": np.array(self.size) }
+        if self.method == CompactProjectionEnums.PCA.value:
+            arrays.update(mean=self.mean, components=self.components)
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        with np.load(io.BytesIO(data)) as arrays:
+            return cls(
+                method=str(arrays["method"]),
+                size=int(arrays["size"]),
+                mean=arrays["mean"] if "mean" in arrays else None,
+                components=arrays["components"] if "components" in arrays else None,
+            )
@@ -1,17 +1,60 @@
 from qdrant_client import models, QdrantClient
 from ..VectorDBInterface import VectorDBInterface
-from ..VectorDBEnums import DistanceMethodEnums
+from ..VectorDBEnums import DistanceMethodEnums, VectorDBEnums, CompactProjectionEnums
+from ..VectorProjection import VectorProjection
+from helpers.metrics import track_stage
+import numpy as np
 import logging
+import random
+import base64
+import math
+import time
+import uuid
+import os
 from typing import List
 from models.db_schemes import RetrievedDocument
 
+# metadata fields kept in lean payloads, for filtering
+LEAN_METADATA_KEYS = ("tags", "tags_key")
+
+# named vectors of two-stage collections
+FULL_VECTOR = "full"
+COMPACT_VECTOR = "compact"
+
+# one vectorless point per two-stage collection holds its projection, so every
+# worker and replica sharing the Qdrant server uses the same one
+PROJECTIONS_COLLECTION = "compact_projections"
+
 class QdrantDBProvider(VectorDBInterface):
 
-    def __init__(self, db_path: str, distance_method: str):
+    def __init__(self, db_path: str, distance_method: str, lean_payload: bool = False,
+                       text_compressor=None, two_stage: bool = False,
+                       compact_size: int = 256, rescore_oversampling: float = 4.0,
+                       url: str = None, api_key: str = None,
+                       projection_refresh_interval: float = 60.0):
 
         self.client = None
         self.db_path = db_path
+        # a Qdrant server, shared by all workers. Local mode (db_path) locks the
+        # directory to a single process
+        self.url = url
+        self.api_key = api_key
         self.distance_method = None
+        # store ids and filter fields only, texts are hydrated from Postgres
+        self.lean_payload = lean_payload
+        # full payloads keep the text as a base64 zstd frame ("text_zst") when enabled
+        self.text_compressor = text_compressor
+
+        # new collections get a compact vector searched first, full vectors only rescore
+        self.two_stage = two_stage
+        self.compact_size = compact_size
+        self.rescore_oversampling = rescore_oversampling
+        # collection_name -> compact vector size, None for single-stage collections
+        self.compact_sizes = {}
+        # collection_name -> (checked at, version, VectorProjection). Other workers
+        # may refit a projection, its version is checked again after the interval
+        self.projections = {}
+        self.projection_refresh_interval = projection_refresh_interval
 
         if distance_method == DistanceMethodEnums.COSINE.value:
             self.distance_method = models.Distance.COSINE
@@ -21,11 +64,26 @@ class QdrantDBProvider(VectorDBInterface):
         self.logger = logging.getLogger(__name__)
 
     def connect(self):
+        if self.client is not None:
+            return
+
+        if self.url:
+            self.client = QdrantClient(url=self.url, api_key=self.api_key)
+            return
+
         self.client = QdrantClient(path=self.db_path)
 
     def disconnect(self):
         self.client = None
 
+    def warmup(self):
+        """Loads every collection (and its projection) ahead of the first search"""
+        for collection in self.client.get_collections().collections:
+            if collection.name == PROJECTIONS_COLLECTION:
+                continue
+            self.client.get_collection(collection_name=collection.name)
+            self.get_projection(collection.name)
+
     def is_collection_existed(self, collection_name: str) -> bool:
         return self.client.collection_exists(collection_name=collection_name)
     
@@ -35,7 +93,103 @@ class QdrantDBProvider(VectorDBInterface):
     def get_collection_info(self, collection_name: str) -> dict:
         return self.client.get_collection(collection_name=collection_name)
     
+    def get_compact_size(self, collection_name: str):
+        """Compact vector size of a two-stage collection, None otherwise. Layouts never change"""
+
+        if collection_name not in self.compact_sizes:
+            vectors = self.client.get_collection(collection_name=collection_name).config.params.vectors
+            self.compact_sizes[collection_name] = (
+                vectors[COMPACT_VECTOR].size if isinstance(vectors, dict) and COMPACT_VECTOR in vectors else None
+            )
+
+        return self.compact_sizes[collection_name]
+
+    def get_projection_point_id(self, collection_name: str) -> str:
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, collection_name))
+
+    def get_projection(self, collection_name: str):
+        compact_size = self.get_compact_size(collection_name)
+        if compact_size is None:
+            return None
+
+        cached = self.projections.get(collection_name)
+        now = time.monotonic()
+        if cached is not None and now - cached[0] < self.projection_refresh_interval:
+            return cached[2]
+
+        records = []
+        if self.client.collection_exists(collection_name=PROJECTIONS_COLLECTION):
+            records = self.client.retrieve(
+                collection_name=PROJECTIONS_COLLECTION,
+                ids=[ self.get_projection_point_id(collection_name) ],
+                with_payload=["version"],
+            )
+        version = records[0].payload["version"] if records else None
+
+        if cached is not None and cached[1] == version:
+            projection = cached[2]
+        elif version is None:
+            projection = self.load_legacy_projection(collection_name)
+            if projection is not None:
+                self.save_projection(collection_name, projection)
+                return projection
+            # leading dimensions until a PCA is fitted, see fit_compact_projection
+            projection = VectorProjection.truncation(size=compact_size)
+        else:
+            record = self.client.retrieve(
+                collection_name=PROJECTIONS_COLLECTION,
+                ids=[ self.get_projection_point_id(collection_name) ],
+                with_payload=True,
+            )[0]
+            version = record.payload["version"]
+            projection = VectorProjection.from_bytes(base64.b64decode(record.payload["projection"]))
+
+        self.projections[collection_name] = (now, version, projection)
+        return projection
+
+    def load_legacy_projection(self, collection_name: str):
+        """Projection fitted before they were stored in Qdrant, from {db_path}/projections"""
+
+        legacy_path = os.path.join(self.db_path, "projections", f"{collection_name}.npz")
+        if not os.path.exists(legacy_path):
+            return None
+
+        with open(legacy_path, "rb") as f:
+            return VectorProjection.from_bytes(f.read())
+
+    def save_projection(self, collection_name: str, projection: VectorProjection):
+
+        if not self.client.collection_exists(collection_name=PROJECTIONS_COLLECTION):
+            self.client.create_collection(collection_name=PROJECTIONS_COLLECTION, vectors_config={})
+
+        version = uuid.uuid4().hex
+        self.client.upsert(
+            collection_name=PROJECTIONS_COLLECTION,
+            points=[
+                models.PointStruct(
+                    id=self.get_projection_point_id(collection_name),
+                    vector={},
+                    payload={
+                        "collection_name": collection_name,
+                        "version": version,
+                        "projection": base64.b64encode(projection.to_bytes()).decode("ascii"),
+                    },
+                )
+            ],
+        )
+
+        self.projections[collection_name] = (time.monotonic(), version, projection)
+
     def delete_collection(self, collection_name: str):
+        self.compact_sizes.pop(collection_name, None)
+        self.projections.pop(collection_name, None)
+
+        if self.client.collection_exists(collection_name=PROJECTIONS_COLLECTION):
+            self.client.delete(
+                collection_name=PROJECTIONS_COLLECTION,
+                points_selector=models.PointIdsList(points=[ self.get_projection_point_id(collection_name) ]),
+            )
+
         if self.is_collection_existed(collection_name):
             return self.client.delete_collection(collection_name=collection_name)
         
@@ -46,17 +200,41 @@ class QdrantDBProvider(VectorDBInterface):
             _ = self.delete_collection(collection_name=collection_name)
         
         if not self.is_collection_existed(collection_name):
+            if not self.two_stage or self.compact_size >= embedding_size:
+                _ = self.client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=models.VectorParams(
+                        size=embedding_size,
+                        distance=self.distance_method
+                    )
+                )
+                return True
+
+            # compact vectors start as the leading dimensions, see get_projection
             _ = self.client.create_collection(
                 collection_name=collection_name,
-                vectors_config=models.VectorParams(
-                    size=embedding_size,
-                    distance=self.distance_method
-                )
+                vectors_config={
+                    # read for the rescored candidates only
+                    FULL_VECTOR: models.VectorParams(size=embedding_size, distance=self.distance_method,
+                                                     on_disk=True),
+                    COMPACT_VECTOR: models.VectorParams(size=self.compact_size, distance=self.distance_method),
+                },
             )
 
             return True
         
         return False
+
+    def build_vectors(self, collection_name: str, vectors: list) -> list:
+        projection = self.get_projection(collection_name)
+        if projection is None:
+            return vectors
+
+        compact_vectors = projection.project(vectors)
+        return [
+            { FULL_VECTOR: vector, COMPACT_VECTOR: compact_vector.tolist() }
+            for vector, compact_vector in zip(vectors, compact_vectors)
+        ]
     
     def insert_one(self, collection_name: str, text: str, vector: list,
                          metadata: dict = None, 
@@ -72,7 +250,7 @@ class QdrantDBProvider(VectorDBInterface):
                 records=[
                     models.Record(
                         id=[record_id],
-                        vector=vector,
+                        vector=self.build_vectors(collection_name, [vector])[0],
                         payload={
                             "text": text, "metadata": metadata
                         }
@@ -85,13 +263,47 @@ class QdrantDBProvider(VectorDBInterface):
 
         return True
     
+    def build_payload(self, text: str, metadata: dict, extra_payload: dict) -> dict:
+        if not self.lean_payload or "chunk_id" not in extra_payload:
+            if self.text_compressor is None or not self.text_compressor.enabled:
+                return { "text": text, "metadata": metadata, **extra_payload }
+
+            text_zst = base64.b64encode(self.text_compressor.compress(text)).decode("ascii")
+            return { "text_zst": text_zst, "metadata": metadata, **extra_payload }
+
+        return {
+            "metadata": { key: metadata[key] for key in LEAN_METADATA_KEYS if key in (metadata or {}) },
+            **extra_payload,
+        }
+
+    def get_payload_text(self, payload: dict) -> str:
+        if "text_zst" in payload:
+            return self.text_compressor.decompress(base64.b64decode(payload["text_zst"]))
+        return payload.get("text", "")
+
+    def to_retrieved_document(self, result) -> RetrievedDocument:
+        # lean payloads carry no text, NLPController hydrates it by chunk_id.
+        # Only the returned hits are decompressed. Point ids are derived from chunk
+        # uuids, never chunk ids: records pushed without one keep their payload text
+        return RetrievedDocument(**{
+            "score": result.score,
+            "text": self.get_payload_text(result.payload),
+            "chunk_id": result.payload.get("chunk_id"),
+            "asset_id": result.payload.get("asset_id"),
+            "chunk_order": result.payload.get("chunk_order"),
+        })
+
     def insert_many(self, collection_name: str, texts: list, 
                           vectors: list, metadata: list = None, 
-                          record_ids: list = None, batch_size: int = 50):
+                          record_ids: list = None, batch_size: int = 50,
+                          extra_payloads: list = None):
         
         if metadata is None:
             metadata = [None] * len(texts)
 
+        if extra_payloads is None:
+            extra_payloads = [{}] * len(texts)
+
         if record_ids is None:
             record_ids = list(range(0, len(texts)))
 
@@ -99,51 +311,118 @@ class QdrantDBProvider(VectorDBInterface):
             batch_end = i + batch_size
 
             batch_texts = texts[i:batch_end]
-            batch_vectors = vectors[i:batch_end]
+            batch_vectors = self.build_vectors(collection_name, vectors[i:batch_end])
             batch_metadata = metadata[i:batch_end]
             batch_record_ids = record_ids[i:batch_end]
+            batch_extra_payloads = extra_payloads[i:batch_end]
 
             batch_records = [
                 models.Record(
                     id=batch_record_ids[x],
                     vector=batch_vectors[x],
-                    payload={
-                        "text": batch_texts[x], "metadata": batch_metadata[x]
-                    }
+                    payload=self.build_payload(
+                        text=batch_texts[x], metadata=batch_metadata[x],
+                        extra_payload=batch_extra_payloads[x],
+                    )
                 )
 
                 for x in range(len(batch_texts))
             ]
 
             try:
-                _ = self.client.upload_records(
-                    collection_name=collection_name,
-                    records=batch_records,
-                )
+                with track_stage("vector_upsert", backend=VectorDBEnums.QDRANT.value):
+                    _ = self.client.upload_records(
+                        collection_name=collection_name,
+                        records=batch_records,
+                    )
             except Exception as e:
                 self.logger.error(f"Error while inserting batch: {e}")
                 return False
 
         return True
         
+    def rescore(self, candidates: list, vector: list, limit: int) -> list:
+        """Orders candidates by their full vectors, fetched with the first stage"""
+
+        if not candidates:
+            return candidates
+
+        full_vectors = np.array([ candidate.vector[FULL_VECTOR] for candidate in candidates ], dtype=np.float32)
+        query_vector = np.asarray(vector, dtype=np.float32)
+
+        if self.distance_method == models.Distance.COSINE:
+            full_vectors /= np.maximum(np.linalg.norm(full_vectors, axis=1, keepdims=True), 1e-12)
+            query_vector = query_vector / max(np.linalg.norm(query_vector), 1e-12)
+
+        scores = full_vectors @ query_vector
+
+        results = []
+        for idx in np.argsort(-scores)[:limit]:
+            candidate = candidates[idx]
+            candidate.score = float(scores[idx])
+            candidate.vector = None
+            results.append(candidate)
+
+        return results
+
+    def search_points(self, collection_name: str, vector: list, limit: int,
+                            query_filter=None, rescore: bool = True, exact: bool = False):
+        """
+        Single-stage collections are searched directly. Two-stage ones are searched
+        on the compact vectors for limit * rescore_oversampling candidates, which
+        are then rescored on their full vectors. exact skips the index and scores
+        every full vector, the ground truth of evaluate_search.
+        """
+
+        projection = self.get_projection(collection_name)
+
+        if exact:
+            with track_stage("vector_search", backend=VectorDBEnums.QDRANT.value):
+                return self.client.search(
+                    collection_name=collection_name,
+                    query_vector=vector if projection is None else models.NamedVector(name=FULL_VECTOR, vector=vector),
+                    limit=limit,
+                    query_filter=query_filter,
+                    search_params=models.SearchParams(exact=True),
+                )
+
+        if projection is None:
+            with track_stage("vector_search", backend=VectorDBEnums.QDRANT.value):
+                return self.client.search(
+                    collection_name=collection_name,
+                    query_vector=vector,
+                    limit=limit,
+                    query_filter=query_filter,
+                )
+
+        with track_stage("vector_search", backend=VectorDBEnums.QDRANT.value):
+            candidates = self.client.search(
+                collection_name=collection_name,
+                query_vector=models.NamedVector(name=COMPACT_VECTOR, vector=projection.project(vector).tolist()),
+                limit=max(limit, math.ceil(limit * self.rescore_oversampling)) if rescore else limit,
+                query_filter=query_filter,
+                with_vectors=[FULL_VECTOR] if rescore else False,
+            )
+
+        if not rescore:
+            return candidates
+
+        with track_stage("vector_rescore", backend=VectorDBEnums.QDRANT.value):
+            return self.rescore(candidates=candidates, vector=vector, limit=limit)
+
     def search_by_vector(self, collection_name: str, vector: list, limit: int = 5):
 
-        results = self.client.search(
+        results = self.search_points(
             collection_name=collection_name,
-            query_vector=vector,
+            vector=vector,
             limit=limit,
-            filter = {}
         )
 
         if not results or len(results) == 0:
             return None
         
         return [
-            RetrievedDocument(**{
-                "score": result.score,
-                "text": result.payload["text"],
-                "chunk_id":result.id
-            })
+            self.to_retrieved_document(result)
             for result in results
         ]
 
@@ -161,9 +440,9 @@ class QdrantDBProvider(VectorDBInterface):
                 ]
             )
 
-        results = self.client.search(
+        results = self.search_points(
             collection_name=collection_name,
-            query_vector=vector,
+            vector=vector,
             limit=limit,
             query_filter=query_filter
         )
@@ -172,14 +451,144 @@ class QdrantDBProvider(VectorDBInterface):
             return None
         
         return [
-            RetrievedDocument(**{
-                "score": result.score,
-                "text": result.payload["text"],
-                "chunk_id": result.id
-            })
+            self.to_retrieved_document(result)
             for result in results
         ]
 
+    def iter_full_vectors(self, collection_name: str, batch_size: int = 1000):
+        """Yields (ids, full vectors) of every point, batch by batch"""
+
+        two_stage = self.get_projection(collection_name) is not None
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=False,
+                with_vectors=[FULL_VECTOR] if two_stage else True,
+            )
+            if points:
+                yield (
+                    [ point.id for point in points ],
+                    np.array([
+                        point.vector[FULL_VECTOR] if two_stage else point.vector
+                        for point in points
+                    ], dtype=np.float32),
+                )
+            if offset is None:
+                break
+
+    def sample_full_vectors(self, collection_name: str, sample_size: int, seed: int = 0):
+        """Uniform sample of (ids, full vectors), one pass over the collection"""
+
+        rng = random.Random(seed)
+        sample_ids, sample_vectors = [], []
+        seen = 0
+
+        for ids, vectors in self.iter_full_vectors(collection_name=collection_name):
+            for point_id, vector in zip(ids, vectors):
+                seen += 1
+                if len(sample_ids) < sample_size:
+                    sample_ids.append(point_id)
+                    sample_vectors.append(vector)
+                    continue
+
+                # reservoir sampling
+                idx = rng.randrange(seen)
+                if idx < sample_size:
+                    sample_ids[idx], sample_vectors[idx] = point_id, vector
+
+        return sample_ids, np.array(sample_vectors, dtype=np.float32)
+
+    def fit_compact_projection(self, collection_name: str, method: str, sample_size: int = 20000):
+        """
+        Rebuilds the compact vectors of a two-stage collection with a PCA fitted on a
+        sample of its full vectors, or back to plain truncation. Returns the number of
+        points updated, False if the collection isn't two-stage or the fit fails.
+        """
+
+        projection = self.get_projection(collection_name)
+        if projection is None:
+            self.logger.error(f"Collection {collection_name} has no compact vectors")
+            return False
+
+        if method == CompactProjectionEnums.PCA.value:
+            _, vectors = self.sample_full_vectors(collection_name=collection_name, sample_size=sample_size)
+            try:
+                projection = VectorProjection.fit_pca(vectors=vectors, size=projection.size)
+            except ValueError as e:
+                self.logger.error(f"Error while fitting PCA for {collection_name}: {e}")
+                return False
+        else:
+            projection = VectorProjection.truncation(size=projection.size)
+
+        # points inserted meanwhile keep the previous projection until the next fit
+        updated_count = 0
+        for ids, vectors in self.iter_full_vectors(collection_name=collection_name):
+            compact_vectors = projection.project(vectors)
+            self.client.update_vectors(
+                collection_name=collection_name,
+                points=[
+                    models.PointVectors(id=point_id, vector={ COMPACT_VECTOR: compact_vector.tolist() })
+                    for point_id, compact_vector in zip(ids, compact_vectors)
+                ],
+            )
+            updated_count += len(ids)
+
+        self.save_projection(collection_name, projection)
+
+        return updated_count
+
+    def evaluate_search(self, collection_name: str, num_queries: int = 100, limit: int = 10):
+        """
+        recall@limit and latency of two-stage search against exact full-vector search.
+        Stored vectors serve as queries, the query point itself is left out of both.
+        """
+
+        projection = self.get_projection(collection_name)
+        if projection is None:
+            return None
+
+        query_ids, query_vectors = self.sample_full_vectors(collection_name=collection_name,
+                                                            sample_size=num_queries)
+        if not query_ids:
+            return None
+
+        def search_ids(vector, **kwargs):
+            started_at = time.perf_counter()
+            results = self.search_points(collection_name=collection_name, vector=vector, limit=limit + 1, **kwargs)
+            elapsed = time.perf_counter() - started_at
+            return [ result.id for result in results ], elapsed
+
+        recalls = { "two_stage": [], "compact_only": [] }
+        latencies = { "exact": [], "two_stage": [], "compact_only": [] }
+
+        for query_id, query_vector in zip(query_ids, query_vectors):
+            query_vector = query_vector.tolist()
+
+            expected_ids, elapsed = search_ids(query_vector, exact=True)
+            latencies["exact"].append(elapsed)
+            expected_ids = set([ point_id for point_id in expected_ids if point_id != query_id ][:limit])
+            if not expected_ids:
+                continue
+
+            for name, kwargs in (("two_stage", {}), ("compact_only", { "rescore": False })):
+                found_ids, elapsed = search_ids(query_vector, **kwargs)
+                latencies[name].append(elapsed)
+                found_ids = [ point_id for point_id in found_ids if point_id != query_id ][:limit]
+                recalls[name].append(len(expected_ids.intersection(found_ids)) / len(expected_ids))
+
+        return {
+            "queries": len(query_ids),
+            "limit": limit,
+            "projection": projection.method,
+            "compact_size": projection.size,
+            "rescore_oversampling": self.rescore_oversampling,
+            "recall": { name: round(float(np.mean(values)), 4) if values else None for name, values in recalls.items() },
+            "p50_ms": { name: round(float(np.median(values)) * 1000, 2) if values else None for name, values in latencies.items() },
+        }
+
     def delete_by_tags(self, collection_name: str, tags: list) -> int:
         """Delete records that have EXACTLY the same tags (exact match)"""
         
@@ -210,3 +619,60 @@ class QdrantDBProvider(VectorDBInterface):
         except Exception as e:
             self.logger.error(f"Error while deleting by tags: {e}")
             return 0
+
+    def delete_by_asset_ids(self, collection_name: str, asset_ids: list) -> bool:
+
+        if not self.is_collection_existed(collection_name) or not asset_ids:
+            return False
+
+        try:
+            self.client.delete(
+                collection_name=collection_name,
+                points_selector=models.FilterSelector(
+                    filter=models.Filter(
+                        must=[
+                            models.FieldCondition(
+                                key="asset_id",
+                                match=models.MatchAny(any=list(asset_ids))
+                            )
+                        ]
+                    )
+                )
+            )
+        except Exception as e:
+            self.logger.error(f"Error while deleting by asset ids: {e}")
+            return False
+
+        return True
+
+    def get_tags_by_asset_ids(self, collection_name: str, asset_ids: list) -> list:
+
+        if not self.is_collection_existed(collection_name) or not asset_ids:
+            return []
+
+        tag_sets = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection_name,
+                scroll_filter=models.Filter(
+                    must=[
+                        models.FieldCondition(
+                            key="asset_id",
+                            match=models.MatchAny(any=list(asset_ids))
+                        )
+                    ]
+                ),
+                limit=1000,
+                offset=offset,
+                with_payload=["metadata"],
+                with_vectors=False,
+            )
+            for point in points:
+                metadata = point.payload.get("metadata") or {}
+                if metadata.get("tags"):
+                    tag_sets[metadata.get("tags_key")] = metadata["tags"]
+            if offset is None:
+                break
+
+        return list(tag_sets.values())
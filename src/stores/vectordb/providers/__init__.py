@@ -1 +1 @@
-from .QdrantDBProvider import QdrantDBProvider
+# providers import their clients (qdrant_client), VectorDBProviderFactory imports the one it creates